@@ -0,0 +1,35 @@
+import math
+import time
+
+from db.dispatcher import LAST_WRITE_COOKIE, replica_set, request_committed
+from settings import DBConfig
+
+
+class ReadYourWritesMiddleware:
+    """
+    Sets LAST_WRITE_COOKIE on successful responses of requests that committed, so get_read_session keeps
+    that client on the primary for DB_READ_YOUR_WRITES seconds. Does nothing without replicas.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.enabled = bool(replica_set) and DBConfig.DB_READ_YOUR_WRITES > 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+        committed = []
+        token = request_committed.set(committed)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start" and committed and message["status"] < 400:
+                cookie = f"{LAST_WRITE_COOKIE}={time.time():.3f}; Max-Age={math.ceil(DBConfig.DB_READ_YOUR_WRITES)}; " \
+                         f"Path=/; HttpOnly; SameSite=Lax"
+                message = dict(message, headers=list(message.get("headers", [])) + [(b"set-cookie", cookie.encode())])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_committed.reset(token)
@@ -1,13 +1,22 @@
 import uvicorn
 from fastapi import FastAPI
 
-from db.dispatcher import init_db
+import db.jobs as jobs
+from app.consistency import ReadYourWritesMiddleware
+from app.metrics import MetricsMiddleware, instrument_engine
+from db.cache import invalidation_channel
+from db.dispatcher import engine, check_schema, replica_set
 from src.views.views import router
 from src.views.auth_views import auth_router
+from src.views.responses import ORJSONResponse
+from settings import DISPATCH_INTERVAL, DBConfig
+from src.views.security import password_service
 from fastapi.middleware.cors import CORSMiddleware
 
-app = FastAPI()
-
+app = FastAPI(default_response_class=ORJSONResponse)
+instrument_engine(engine)
+for replica in replica_set.replicas:
+    instrument_engine(replica.engine)
 
 app.add_middleware(
     CORSMiddleware,
@@ -16,13 +25,31 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(ReadYourWritesMiddleware)
+app.add_middleware(MetricsMiddleware)
 app.include_router(router)
 app.include_router(auth_router)
 
 
 @app.on_event("startup")
 async def on_startup():
-    await init_db()
+    await check_schema()
+    await invalidation_channel.start()
+    await jobs.resume_jobs()
+    if replica_set:
+        await replica_set.check()
+        jobs.start_periodic(DBConfig.DB_REPLICA_CHECK_INTERVAL, replica_set.check)
+    if DISPATCH_INTERVAL:
+        jobs.start_periodic(DISPATCH_INTERVAL, jobs.run_dispatch)
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    await jobs.stop_periodic()
+    await jobs.stop_jobs()
+    password_service.shutdown()
+    await invalidation_channel.stop()
+    await replica_set.dispose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,194 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+from typing import Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import event
+
+from settings import N_PLUS_ONE_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+def label_string(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ""
+    escaped = [(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for key, value in labels]
+    return "{" + ",".join(f'{key}="{value}"' for key, value in escaped) + "}"
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{self.name}_bucket{label_string(key + (('le', le),))} {cumulative}")
+                lines.append(f"{self.name}_sum{label_string(key)} {total}")
+                lines.append(f"{self.name}_count{label_string(key)} {count}")
+        return lines
+
+
+class CounterMetric:
+    def __init__(self, name: str, description: str):
+        self.name = name
+        self.description = description
+        self._values: Dict[tuple, float] = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            self._values[tuple(sorted(labels.items()))] += amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            lines.extend(f"{self.name}{label_string(key)} {value}" for key, value in sorted(self._values.items()))
+        return lines
+
+
+request_duration = Histogram("ecogram_http_request_duration_seconds", "Time from request to the last body chunk")
+request_queries = Histogram("ecogram_http_request_db_queries", "Database queries issued per request",
+                            QUERY_COUNT_BUCKETS)
+request_db_time = Histogram("ecogram_http_request_db_seconds", "Time spent in database queries per request")
+query_duration = Histogram("ecogram_db_query_duration_seconds", "Duration of single database queries")
+n_plus_one = CounterMetric("ecogram_n_plus_one_total", "Requests that repeated one statement too many times")
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time", "statements")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.statements = Counter()
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context._query_started = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - context._query_started
+    query_duration.observe(elapsed)
+    stats = current_request.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.db_time += elapsed
+        stats.statements[statement] += 1
+
+
+def instrument_engine(engine):
+    sync_engine = getattr(engine, "sync_engine", engine)
+    event.listen(sync_engine, "before_cursor_execute", before_cursor_execute)
+    event.listen(sync_engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    """
+    Plain ASGI middleware, so streamed responses are timed until their last chunk. Routes are labelled
+    with their path template, requests repeating one statement N_PLUS_ONE_THRESHOLD times are logged.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._route_paths: Dict[object, str] = {}
+
+    def route_path(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        path = self._route_paths.get(endpoint)
+        if path is None:
+            for route in scope["app"].routes:
+                self._route_paths[getattr(route, "endpoint", None)] = getattr(route, "path", None)
+            path = self._route_paths.get(endpoint) or "unmatched"
+        return path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            current_request.reset(token)
+            self.record(scope, stats, status_code, time.perf_counter() - started)
+
+    def record(self, scope, stats: RequestStats, status_code: int, elapsed: float):
+        route = self.route_path(scope)
+        request_duration.observe(elapsed, method=scope["method"], route=route, status=str(status_code))
+        request_queries.observe(stats.queries, route=route)
+        request_db_time.observe(stats.db_time, route=route)
+        if not stats.statements:
+            return
+        statement, repeats = stats.statements.most_common(1)[0]
+        if repeats >= N_PLUS_ONE_THRESHOLD:
+            n_plus_one.inc(route=route)
+            logger.warning(f"{scope['method']} {route} issued {stats.queries} queries, "
+                           f"{repeats} of them: {' '.join(statement.split())[:200]}")
+
+
+def render_metrics(gauges: Dict[str, dict], labelled_gauges: Dict[str, Dict[str, dict]]) -> str:
+    """
+    gauges: {"db_pool": {"checked_out": 1, ...}} gives ecogram_db_pool_checked_out 1,
+    labelled_gauges: {"cache": {"principal": {"hits": 3}}} gives ecogram_cache_hits{name="principal"} 3.
+    """
+    lines = []
+    for metric in (request_duration, request_queries, request_db_time, query_duration, n_plus_one):
+        lines.extend(metric.render())
+    for prefix, values in gauges.items():
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                lines.append(f"# TYPE ecogram_{prefix}_{key} gauge")
+                lines.append(f"ecogram_{prefix}_{key} {float(value)}")
+    for prefix, groups in labelled_gauges.items():
+        keys = sorted({key for values in groups.values() for key, value in values.items()
+                       if isinstance(value, (int, float))})
+        for key in keys:
+            lines.append(f"# TYPE ecogram_{prefix}_{key} gauge")
+            for name, values in sorted(groups.items()):
+                if isinstance(values.get(key), (int, float)):
+                    lines.append(f"ecogram_{prefix}_{key}{label_string((('name', name),))} {float(values[key])}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,77 @@
+import logging
+import os
+from typing import Tuple
+
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+from settings import DBConfig, REFERENCE_CACHE_NOTIFY
+
+logger = logging.getLogger(__name__)
+
+
+class Worker(UvicornWorker):
+    CONFIG_KWARGS = {"loop": "auto", "http": "auto"}
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def pool_limits(workers: int) -> Tuple[int, int]:
+    """
+    Splits the connections Postgres allows between workers, every worker gets pool_size + max_overflow
+    out of its share, capped by DBConfig. The LISTEN connection of the invalidation channel counts too.
+    """
+    budget = DBConfig.DB_MAX_CONNECTIONS - DBConfig.DB_RESERVED_CONNECTIONS
+    per_worker = budget // workers - (1 if REFERENCE_CACHE_NOTIFY else 0)
+    if per_worker < 1:
+        raise ValueError(f"{workers} workers do not fit into {budget} database connections")
+    pool_size = min(DBConfig.DB_POOL_SIZE, per_worker)
+    max_overflow = min(DBConfig.DB_MAX_OVERFLOW, per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+class Server(BaseApplication):
+    """
+    Gunicorn master supervising uvicorn workers. The app is imported in each worker after the fork,
+    so the engine is created with the pool limits set here.
+    """
+
+    def __init__(self, app_path: str, options: dict):
+        self.app_path = app_path
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if value is not None:
+                self.cfg.set(key, value)
+
+    def load(self):
+        from gunicorn.util import import_app
+        return import_app(self.app_path)
+
+
+def serve(host: str, port: int, workers: int, max_requests: int, max_requests_jitter: int, timeout: int,
+          graceful_timeout: int, keepalive: int, loop: str, http: str, reload: bool = False, pidfile: str = None):
+    DBConfig.DB_POOL_SIZE, DBConfig.DB_MAX_OVERFLOW = pool_limits(workers)
+    Worker.CONFIG_KWARGS = {"loop": loop, "http": http}
+    logger.info(f"serving on {host}:{port} with {workers} workers, "
+                f"pool {DBConfig.DB_POOL_SIZE}+{DBConfig.DB_MAX_OVERFLOW} connections each")
+    Server("app.main:app", {
+        "bind": f"{host}:{port}",
+        "workers": workers,
+        "worker_class": "app.server.Worker",
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests_jitter,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "keepalive": keepalive,
+        "reload": reload,
+        "pidfile": pidfile,
+        "preload_app": False,
+    }).run()
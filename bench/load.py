@@ -0,0 +1,258 @@
+import asyncio
+import logging
+import random
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+import httpx
+
+from db.seed import SEED_PASSWORD, SEED_USERNAME_PREFIX
+
+DEFAULT_MIX = "token=1,delivery_requests=4,create=2,point_thrash=3,achievements=3"
+PERCENTILES = (50, 95, 99)
+REQUEST_TIMEOUT = 30
+PAGE_LIMIT = 50
+# /metrics series giving the DB queries per request of each route
+DB_QUERIES_LINE = re.compile(r'^ecogram_http_request_db_queries_(sum|count)\{route="([^"]*)"\} (\S+)$')
+
+# one INFO line per request would cost the client more than the requests
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+class Dataset:
+    """
+    Ids, phones and coordinates the scenarios pick from, sampled through the API before the run.
+    """
+
+    def __init__(self):
+        self.users: List[dict] = []
+        self.couriers: List[str] = []
+        self.thrash_types: List[str] = []
+        self.statuses: List[str] = []
+        self.cities: List[str] = []
+        self.coordinates: List[list] = []
+
+    @classmethod
+    async def load(cls, client: httpx.AsyncClient, sample: int) -> "Dataset":
+        data = cls()
+        users = (await get_json(client, "GET", "/users", params={"limit": sample}))["items"]
+        data.users = [user for user in users if (user["username"] or "").startswith(SEED_USERNAME_PREFIX)]
+        couriers = (await get_json(client, "GET", "/couriers", params={"limit": sample}))["items"]
+        data.couriers = [courier["phone_number"] for courier in couriers]
+        data.thrash_types = [row["thrash_type"] for row in await reference_rows(client, "/thrash_types")]
+        data.statuses = [row["status_name"] for row in await reference_rows(client, "/statuses")]
+        data.cities = [row["city"] for row in await reference_rows(client, "/maps")]
+        points = (await get_json(client, "POST", "/map/points", json={"limit": sample}))["items"]
+        data.coordinates = [point["coordinates"] for point in points]
+        if not (data.users and data.couriers and data.thrash_types and data.coordinates):
+            raise ValueError("the database has no seeded users, couriers or map points, run manage.py seed first")
+        return data
+
+
+async def get_json(client: httpx.AsyncClient, method: str, path: str, **kwargs):
+    response = await client.request(method, path, **kwargs)
+    response.raise_for_status()
+    return response.json()
+
+
+async def reference_rows(client: httpx.AsyncClient, path: str) -> list:
+    # the reference routes wrap their rows in a single key
+    return next(iter((await get_json(client, "GET", path)).values()))
+
+
+def token(data: Dataset, rng: random.Random) -> dict:
+    return {"data": {"username": rng.choice(data.users)["phone_number"], "password": SEED_PASSWORD}}
+
+
+def delivery_requests(data: Dataset, rng: random.Random) -> dict:
+    filters = rng.choice([
+        {},
+        {"status_filter": rng.choice(data.statuses)},
+        {"courier_phone_number_filter": rng.choice(data.couriers)},
+        {"user_phone_number_filter": rng.choice(data.users)["phone_number"], "grouped": True},
+        {"thrash_type_filter": rng.choice(data.thrash_types),
+         "create_date_from": (datetime.utcnow() - timedelta(days=rng.randint(1, 60))).isoformat()},
+    ])
+    return {"json": dict(filters, limit=PAGE_LIMIT)}
+
+
+def create(data: Dataset, rng: random.Random) -> dict:
+    lat, lon = rng.choice(data.coordinates)
+    return {"json": {"courier_phone": rng.choice(data.couriers),
+                     "user_phone": rng.choice(data.users)["phone_number"],
+                     "address": f"Нагрузочная улица, {rng.randint(1, 500)}",
+                     "create_date": datetime.utcnow().isoformat(),
+                     "thrash_types": rng.sample(data.thrash_types, min(len(data.thrash_types), rng.randint(1, 3))),
+                     "price": round(rng.uniform(0, 1500), 2),
+                     "coordinates": [lat + rng.uniform(-0.01, 0.01), lon + rng.uniform(-0.01, 0.01)]}}
+
+
+def point_thrash(data: Dataset, rng: random.Random) -> dict:
+    coordinates = rng.choice(data.coordinates)
+    filters = rng.choice([
+        {"coordinates_filter": coordinates, "radius_filter": rng.choice([500, 1000, 3000])},
+        {"coordinates_filter": coordinates, "nearest_filter": 10},
+        {"city_filter": rng.choice(data.cities), "thrash_type_filter": rng.choice(data.thrash_types),
+         "limit": PAGE_LIMIT},
+    ])
+    return {"json": filters}
+
+
+def achievements(data: Dataset, rng: random.Random) -> dict:
+    return {"params": {"user_id": rng.choice(data.users)["id"]}}
+
+
+class Scenario(NamedTuple):
+    method: str
+    route: str
+    build: Callable[[Dataset, random.Random], dict]
+
+
+SCENARIOS: Dict[str, Scenario] = {
+    "token": Scenario("POST", "/auth/token", token),
+    "delivery_requests": Scenario("POST", "/delivery/requests", delivery_requests),
+    "create": Scenario("POST", "/delivery/requests/create", create),
+    "point_thrash": Scenario("POST", "/map/points/thrash", point_thrash),
+    "achievements": Scenario("GET", "/user/achievements", achievements),
+}
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    """
+    "token=1,create=2" gives {"token": 1.0, "create": 2.0}, the weights are relative.
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.strip().partition("=")
+        if name not in SCENARIOS:
+            raise ValueError(f"unknown scenario {name}, expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    if not any(weights.values()):
+        raise ValueError("the mix has no positive weight")
+    return weights
+
+
+async def db_queries(client: httpx.AsyncClient) -> Dict[str, List[float]]:
+    response = await client.get("/metrics")
+    response.raise_for_status()
+    totals: Dict[str, List[float]] = {}
+    for line in response.text.splitlines():
+        match = DB_QUERIES_LINE.match(line)
+        if match:
+            kind, route, value = match.groups()
+            totals.setdefault(route, [0.0, 0.0])[kind == "count"] = float(value)
+    return totals
+
+
+async def drive(client: httpx.AsyncClient, data: Dataset, mix: Dict[str, float], concurrency: int,
+                duration: float, seed: int, latencies: Optional[Dict[str, list]] = None,
+                errors: Optional[Counter] = None):
+    names = list(mix)
+    weights = [mix[name] for name in names]
+    deadline = time.perf_counter() + duration
+
+    async def worker(rng: random.Random):
+        while time.perf_counter() < deadline:
+            name = rng.choices(names, weights)[0]
+            scenario = SCENARIOS[name]
+            kwargs = scenario.build(data, rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(scenario.method, scenario.route, **kwargs)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            if latencies is not None:
+                latencies[name].append(time.perf_counter() - started)
+                if failed:
+                    errors[name] += 1
+
+    await asyncio.gather(*[worker(random.Random(seed * 1000 + i)) for i in range(concurrency)])
+
+
+def percentile(ordered: list, p: float) -> float:
+    return ordered[max(0, min(len(ordered) - 1, int(len(ordered) * p / 100 + 0.5) - 1))]
+
+
+def summary(latencies: list, errors: int, elapsed: float) -> dict:
+    ordered = sorted(latencies)
+    result = {"requests": len(ordered), "errors": errors, "rps": round(len(ordered) / elapsed, 1)}
+    if ordered:
+        result.update({f"p{p}": round(percentile(ordered, p) * 1000, 2) for p in PERCENTILES})
+        result["mean"] = round(sum(ordered) / len(ordered) * 1000, 2)
+        result["max"] = round(ordered[-1] * 1000, 2)
+    return result
+
+
+async def run(url: str, mix: Dict[str, float], concurrency: int, duration: float, warmup: float = 0,
+              sample: int = 1000, seed: int = 0) -> dict:
+    """
+    Drives the mix against a running server for duration seconds with concurrency clients. Latencies are
+    in milliseconds; db_queries comes from the server's /metrics and is exact only with a single worker.
+    """
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=REQUEST_TIMEOUT) as client:
+        data = await Dataset.load(client, sample)
+        if warmup:
+            await drive(client, data, mix, concurrency, warmup, seed + 1)
+        latencies = {name: [] for name in mix}
+        errors = Counter()
+        before = await db_queries(client)
+        started = time.perf_counter()
+        await drive(client, data, mix, concurrency, duration, seed, latencies, errors)
+        elapsed = time.perf_counter() - started
+        after = await db_queries(client)
+
+    scenarios = {}
+    for name in mix:
+        scenarios[name] = summary(latencies[name], errors[name], elapsed)
+        route = SCENARIOS[name].route
+        queries, count = [a - b for a, b in zip(after.get(route, [0.0, 0.0]), before.get(route, [0.0, 0.0]))]
+        if count:
+            scenarios[name]["db_queries"] = round(queries / count, 2)
+    return {"created_at": datetime.utcnow().isoformat(timespec="seconds"), "url": url,
+            "config": {"mix": mix, "concurrency": concurrency, "duration": duration, "seed": seed},
+            "total": summary([value for values in latencies.values() for value in values],
+                             sum(errors.values()), elapsed),
+            "scenarios": scenarios}
+
+
+# metric -> True when a higher value is worse
+COMPARED = {"p50": True, "p95": True, "p99": True, "rps": False, "db_queries": True}
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """
+    Every compared metric of every scenario present in both runs, flagged when it got worse by more
+    than tolerance (0.1 is 10%).
+    """
+    rows = []
+    for name, current in result["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric, higher_is_worse in COMPARED.items():
+            if metric not in current or not previous.get(metric):
+                continue
+            change = current[metric] / previous[metric] - 1
+            regressed = change > tolerance if higher_is_worse else change < -tolerance
+            rows.append({"scenario": name, "metric": metric, "baseline": previous[metric],
+                         "current": current[metric], "change": round(change * 100, 1), "regressed": regressed})
+    return rows
+
+
+def format_report(result: dict, comparison: List[dict]) -> str:
+    columns = ["requests", "errors", "rps"] + [f"p{p}" for p in PERCENTILES] + ["max", "db_queries"]
+    lines = [f"{'scenario':<20}" + "".join(f"{column:>12}" for column in columns)]
+    for name, values in list(result["scenarios"].items()) + [("total", result["total"])]:
+        lines.append(f"{name:<20}" + "".join(f"{values.get(column, '-'):>12}" for column in columns))
+    if comparison:
+        lines.append("")
+        lines.append(f"{'scenario':<20}{'metric':>12}{'baseline':>12}{'current':>12}{'change %':>12}")
+        for row in comparison:
+            lines.append(f"{row['scenario']:<20}{row['metric']:>12}{row['baseline']:>12}{row['current']:>12}"
+                         f"{row['change']:>12}{'  REGRESSION' if row['regressed'] else ''}")
+    return "\n".join(lines)
@@ -0,0 +1,32 @@
+import re
+
+# common abbreviations are expanded so "ул. Ленина, д. 5" and "улица Ленина 5" share one key
+ABBREVIATIONS = {
+    "ул": "улица",
+    "пр": "проспект",
+    "пр-т": "проспект",
+    "просп": "проспект",
+    "пр-д": "проезд",
+    "пер": "переулок",
+    "пл": "площадь",
+    "наб": "набережная",
+    "ш": "шоссе",
+    "б-р": "бульвар",
+    "бул": "бульвар",
+    "к": "корпус",
+    "корп": "корпус",
+    "стр": "строение",
+    "кв": "квартира",
+    "г": "город",
+    "обл": "область",
+    "st": "street",
+    "ave": "avenue",
+    "rd": "road",
+}
+FILLER_WORDS = {"д", "дом"}
+SEPARATORS = re.compile(r"[\s.,;:\"'«»()#№]+")
+
+
+def normalise_address(address: str) -> str:
+    tokens = SEPARATORS.split(address.lower().replace("ё", "е"))
+    return " ".join(ABBREVIATIONS.get(token, token) for token in tokens if token and token not in FILLER_WORDS)
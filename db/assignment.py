@@ -0,0 +1,109 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from db.spatial import EARTH_RADIUS
+from settings import DISPATCH_HUNGARIAN_MAX_CELLS
+
+
+def distance_matrix(origins: Sequence[Sequence[float]], targets: Sequence[Sequence[float]]) -> np.ndarray:
+    """
+    Great-circle metres between every (lat, lon) origin and target, shape (len(origins), len(targets)).
+    """
+    origins = np.radians(np.asarray(origins, dtype=float).reshape(-1, 2))
+    targets = np.radians(np.asarray(targets, dtype=float).reshape(-1, 2))
+    lat1, lon1 = origins[:, 0:1], origins[:, 1:2]
+    lat2, lon2 = targets[:, 0], targets[:, 1]
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def hungarian(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Minimum cost matching of every row of an n x m matrix with n <= m, shortest augmenting paths
+    with potentials; the column scan of each step is vectorised.
+    """
+    n, m = cost.shape
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    p = np.zeros(m + 1, dtype=int)
+    way = np.zeros(m + 1, dtype=int)
+    for i in range(1, n + 1):
+        p[0] = i
+        j0 = 0
+        minv = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+        while True:
+            used[j0] = True
+            i0 = p[j0]
+            free = ~used[1:]
+            reduced = cost[i0 - 1] - u[i0] - v[1:]
+            improved = free & (reduced < minv[1:])
+            minv[1:][improved] = reduced[improved]
+            way[1:][improved] = j0
+            candidates = np.where(free, minv[1:], np.inf)
+            j1 = int(np.argmin(candidates)) + 1
+            delta = candidates[j1 - 1]
+            u[p[used]] += delta
+            v[used] -= delta
+            minv[1:][free] -= delta
+            j0 = j1
+            if p[j0] == 0:
+                break
+        while j0:
+            j1 = way[j0]
+            p[j0] = p[j1]
+            j0 = j1
+    return [(int(p[j]) - 1, j - 1) for j in range(1, m + 1) if p[j]]
+
+
+def greedy(cost: np.ndarray, capacities: Sequence[int]) -> List[Tuple[int, int]]:
+    """
+    Shortest remaining pair first until every row is matched or every column is full.
+    """
+    n, m = cost.shape
+    remaining = np.asarray(capacities, dtype=int).copy()
+    matched = np.zeros(n, dtype=bool)
+    pairs = []
+    for flat in np.argsort(cost, axis=None, kind="stable"):
+        row, column = divmod(int(flat), m)
+        if matched[row] or remaining[column] <= 0:
+            continue
+        matched[row] = True
+        remaining[column] -= 1
+        pairs.append((row, column))
+        if len(pairs) == n or not remaining.any():
+            break
+    return pairs
+
+
+def assign(cost: np.ndarray, capacities: Sequence[int]) -> Tuple[str, List[Tuple[int, int]]]:
+    """
+    Matches requests (rows) to couriers (columns), courier j taking at most capacities[j] requests,
+    minimising the total cost. Couriers are expanded into one column per capacity slot for the Hungarian
+    solver; above DISPATCH_HUNGARIAN_MAX_CELLS the greedy solver is used. Returns (method, pairs).
+    """
+    n, m = cost.shape
+    capacities = np.minimum(np.asarray(capacities, dtype=int), n)
+    slots = int(capacities.sum())
+    if not n or not slots:
+        return "none", []
+    if n * slots > DISPATCH_HUNGARIAN_MAX_CELLS:
+        return "greedy", greedy(cost, capacities)
+    owners = np.repeat(np.arange(m), capacities)
+    expanded = cost[:, owners]
+    if n <= slots:
+        pairs = [(row, int(owners[slot])) for row, slot in hungarian(expanded)]
+    else:
+        pairs = [(row, int(owners[slot])) for slot, row in hungarian(expanded.T)]
+    return "hungarian", sorted(pairs)
+
+
+def solve(origins: Sequence[Sequence[float]], targets: Sequence[Sequence[float]],
+          capacities: Sequence[int]) -> Tuple[np.ndarray, str, List[Tuple[int, int]]]:
+    """
+    distance_matrix() and assign() in one call, for running off the event loop. Returns (cost, method, pairs).
+    """
+    cost = distance_matrix(origins, targets)
+    method, pairs = assign(cost, capacities)
+    return cost, method, pairs
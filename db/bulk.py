@@ -0,0 +1,206 @@
+import logging
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import any_, cast, delete, func, literal, or_, select, update
+from sqlalchemy.dialects.postgresql import ARRAY, insert
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from settings import BULK_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class BulkResult(NamedTuple):
+    succeeded: List[dict]
+    failed: List[dict]
+
+
+def chunked(items: Sequence, size: int = BULK_BATCH_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def any_of(column, values: Iterable):
+    return column == any_(literal(list(values), ARRAY(column.type)))
+
+
+def failure(item: Any, error: str) -> dict:
+    return {"item": item.dict() if isinstance(item, SQLModel) else item, "error": error}
+
+
+def returned_columns(table):
+    return [column for column in table.c if column.name != "password"]
+
+
+def unnest_rows(table, rows: List[dict], keys: List[str], name: str = "v"):
+    """
+    Turns a list of dicts into `SELECT unnest(CAST(:a AS type[])) AS a, ...` so a whole batch
+    travels as one array parameter per column.
+    """
+    return select(*[
+        func.unnest(cast(literal([row.get(key) for row in rows], ARRAY(table.c[key].type)),
+                         ARRAY(table.c[key].type))).label(key)
+        for key in keys
+    ]).subquery(name)
+
+
+async def reserve_ids(session: AsyncSession, table, count: int) -> List[int]:
+    sequence = func.pg_get_serial_sequence(table.name, "id")
+    res = await session.execute(select(func.nextval(sequence)).select_from(func.generate_series(1, count)))
+    return list(res.scalars().all())
+
+
+async def copy_records(session: AsyncSession, table, columns: List[str], records: List[tuple]):
+    """
+    COPY FROM STDIN through the asyncpg connection of the session, inside its current transaction.
+    """
+    if not records:
+        return
+    connection = await session.connection()
+    raw = await connection.get_raw_connection()
+    await raw.driver_connection.copy_records_to_table(table.name, records=records, columns=columns)
+
+
+async def update_from_rows(session: AsyncSession, table, rows: List[dict], keys: List[str],
+                           keep_existing: bool = True) -> List[dict]:
+    """
+    UPDATE table SET col = COALESCE(v.col, table.col) FROM unnest(...) AS v WHERE table.id = v.id RETURNING table.*.
+    `keys` must include "id"; with keep_existing a NULL in a row leaves the stored value untouched.
+    """
+    if not rows:
+        return []
+    values = unnest_rows(table, rows, keys)
+    assignments = {
+        key: func.coalesce(values.c[key], table.c[key]) if keep_existing else values.c[key]
+        for key in keys if key != "id"
+    }
+    stmt = update(table).where(table.c.id == values.c.id).values(assignments).returning(*returned_columns(table))
+    res = await session.execute(stmt)
+    return [dict(row._mapping) for row in res.all()]
+
+
+async def detach_dependents(session: AsyncSession, table, ids: List[int]):
+    """
+    Mirrors what the ORM did on session.delete(): link table rows pointing at the deleted ids are removed,
+    plain foreign keys are set to NULL.
+    """
+    for other in SQLModel.metadata.sorted_tables:
+        for fk in other.foreign_keys:
+            if fk.column is not table.c.id:
+                continue
+            condition = any_of(fk.parent, ids)
+            if fk.parent.primary_key:
+                await session.execute(delete(other).where(condition))
+            else:
+                await session.execute(update(other).where(condition).values({fk.parent.name: None}))
+
+
+async def delete_by_ids(session: AsyncSession, table, ids: List[int]) -> List[dict]:
+    if not ids:
+        return []
+    await detach_dependents(session, table, ids)
+    res = await session.execute(delete(table).where(any_of(table.c.id, ids)).returning(*returned_columns(table)))
+    return [dict(row._mapping) for row in res.all()]
+
+
+async def create_named(session: AsyncSession, model, column, names: List[str]) -> Optional[BulkResult]:
+    table = model.__table__
+    succeeded, failed = [], []
+    seen = set()
+    unique = []
+    for name in names:
+        if name in seen:
+            failed.append(failure(name, "duplicate in request"))
+            continue
+        seen.add(name)
+        unique.append(name)
+    try:
+        for batch in chunked(unique):
+            res = await session.execute(select(table.c[column.key]).where(any_of(table.c[column.key], batch)))
+            existing = set(res.scalars().all())
+            failed.extend(failure(name, "already exists") for name in batch if name in existing)
+            to_insert = [{column.key: name} for name in batch if name not in existing]
+            if not to_insert:
+                continue
+            stmt = insert(table).values(to_insert).on_conflict_do_nothing().returning(*returned_columns(table))
+            res = await session.execute(stmt)
+            created = [dict(row._mapping) for row in res.all()]
+            created_names = {row[column.key] for row in created}
+            failed.extend(failure(row[column.key], "already exists")
+                          for row in to_insert if row[column.key] not in created_names)
+            succeeded.extend(created)
+        await session.commit()
+        return BulkResult(succeeded, failed)
+    except Exception as e:
+        logger.error(f"create_named {table.name} exception {e}")
+        await session.rollback()
+        return None
+
+
+async def resolve_ids(session: AsyncSession, table, keys: Dict[str, Iterable]) -> Dict[str, dict]:
+    """
+    Resolves every lookup value of a batch with one query, e.g. {"id": [...], "phone_number": [...]}
+    gives {"id": {id: id}, "phone_number": {phone: id}}.
+    """
+    keys = {key: list(dict.fromkeys(value for value in values if value)) for key, values in keys.items()}
+    resolved = {key: {} for key in keys}
+    conditions = [any_of(table.c[key], values) for key, values in keys.items() if values]
+    if not conditions:
+        return resolved
+    res = await session.execute(select(table.c.id, *[table.c[key] for key in keys]).where(or_(*conditions)))
+    for row in res.all():
+        for key in keys:
+            resolved[key][row._mapping[table.c[key]]] = row.id
+    return resolved
+
+
+async def update_named(session: AsyncSession, model, column,
+                       items: List[Tuple[Any, Optional[int], Optional[str], str]]) -> Optional[BulkResult]:
+    """
+    items are (original item, old id, old name, new name); the old name wins over the old id as before.
+    """
+    table = model.__table__
+    succeeded, failed = [], []
+    try:
+        for batch in chunked(items):
+            resolved = await resolve_ids(session, table, {"id": [item[1] for item in batch],
+                                                          column.key: [item[2] for item in batch]})
+            rows = {}
+            for item, old_id, old_name, new_name in batch:
+                target = resolved[column.key].get(old_name) if old_name else resolved["id"].get(old_id)
+                if target is None:
+                    failed.append(failure(item, "not found"))
+                    continue
+                rows[target] = {"id": target, column.key: new_name}
+            succeeded.extend(await update_from_rows(session, table, list(rows.values()), ["id", column.key]))
+        await session.commit()
+        return BulkResult(succeeded, failed)
+    except Exception as e:
+        logger.error(f"update_named {table.name} exception {e}")
+        await session.rollback()
+        return None
+
+
+async def delete_named(session: AsyncSession, model, column,
+                       items: List[Tuple[Any, Optional[int], Optional[str]]]) -> Optional[BulkResult]:
+    table = model.__table__
+    succeeded, failed = [], []
+    try:
+        for batch in chunked(items):
+            resolved = await resolve_ids(session, table, {"id": [item[1] for item in batch],
+                                                          column.key: [item[2] for item in batch]})
+            targets = []
+            for item, item_id, name in batch:
+                target = resolved[column.key].get(name) if name else resolved["id"].get(item_id)
+                if target is None:
+                    failed.append(failure(item, "not found"))
+                    continue
+                targets.append(target)
+            succeeded.extend(await delete_by_ids(session, table, list(dict.fromkeys(targets))))
+        await session.commit()
+        return BulkResult(succeeded, failed)
+    except Exception as e:
+        logger.error(f"delete_named {table.name} exception {e}")
+        await session.rollback()
+        return None
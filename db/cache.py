@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, defaultdict
+from functools import partial
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import asyncpg
+from sqlalchemy import text
+from sqlmodel import select
+
+from db.dispatcher import engine, async_session
+from db.models.sql_models import Role, Status, ThrashType, Map, Achievement, User
+from settings import PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL, ACHIEVEMENT_CATALOGUE_TTL, REFERENCE_CACHE_TTL, \
+    REFERENCE_CACHE_NOTIFY, REFERENCE_CACHE_CHANNEL, SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL, ADDRESS_CACHE_SIZE, \
+    ADDRESS_CACHE_TTL, RESPONSE_CACHE_SIZE, FILTER_STATEMENT_CACHE_SIZE, DBConfig
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class LRUCache:
+    """
+    Bounded LRU with a per-entry expiry. Entries live for ttl seconds unless set() is given an earlier expires_at.
+    """
+
+    def __init__(self, maxsize: int, ttl: Optional[float] = None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            item = self._data.get(key, _MISSING)
+            if item is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.time():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any, expires_at: Optional[float] = None):
+        if self.ttl is not None:
+            ttl_expiry = time.time() + self.ttl
+            expires_at = ttl_expiry if expires_at is None else min(expires_at, ttl_expiry)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def invalidate(self, *keys: Hashable):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> dict:
+        return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+achievement_cache = LRUCache(1, ACHIEVEMENT_CATALOGUE_TTL)
+search_cache = LRUCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+# normalised address -> [lat, lon], None for addresses known to have no coordinates
+address_cache = LRUCache(ADDRESS_CACHE_SIZE, ADDRESS_CACHE_TTL)
+# (builder, bitmask of the set filters, shape) -> select with the filter values as bound parameters
+statement_cache = LRUCache(FILTER_STATEMENT_CACHE_SIZE)
+
+
+class ReferenceCache:
+    """
+    Read-through copy of a small dictionary table as id -> row and name -> row maps, reloaded as a whole
+    when invalidated or older than ttl. Rows are detached copies: read them and link by id, never attach them.
+    Reloads always read the primary: a lagging replica would put the rows an invalidation just dropped
+    back into the cache for ttl seconds.
+    """
+
+    def __init__(self, model, name_field: str, ttl: float = REFERENCE_CACHE_TTL):
+        self.model = model
+        self.name = model.__tablename__
+        self.name_field = name_field
+        self.ttl = ttl
+        self.by_id: dict = {}
+        self.by_name: dict = {}
+        self.loaded_at: Optional[float] = None
+        self.generation = 0
+        self.hits = 0
+        self.loads = 0
+        self._lock: Optional[asyncio.Lock] = None
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    def invalidate(self):
+        self.generation += 1
+        self.loaded_at = None
+
+    async def ensure_loaded(self):
+        if not self.is_stale():
+            self.hits += 1
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.is_stale():
+                self.hits += 1
+                return
+            generation = self.generation
+            async with async_session() as session:
+                res = await session.execute(select(*self.model.__table__.c).order_by(self.model.id))
+                rows = [self.model(**row._mapping) for row in res.all()]
+            self.by_id = {row.id: row for row in rows}
+            self.by_name = {getattr(row, self.name_field): row for row in rows}
+            self.loads += 1
+            # an invalidation that raced with the select leaves the cache stale so the next read reloads
+            if generation == self.generation:
+                self.loaded_at = time.monotonic()
+            logger.debug(f"{self.name} cache loaded with {len(rows)} rows")
+
+    async def lookup(self, row_id: Optional[int] = None, name: Optional[str] = None) -> list:
+        await self.ensure_loaded()
+        if name:
+            row = self.by_name.get(name)
+        elif row_id:
+            row = self.by_id.get(row_id)
+        else:
+            return list(self.by_id.values())
+        return [row] if row else []
+
+    def stats(self) -> dict:
+        return {"size": len(self.by_id), "hits": self.hits, "loads": self.loads}
+
+
+class InvalidationChannel:
+    """
+    Fans cache invalidations out by name: locally to the subscribed callbacks and, with REFERENCE_CACHE_NOTIFY,
+    to the other workers through pg_notify on a dedicated LISTEN connection. A "table:key" name reaches the
+    subscribe_keys() callbacks of table with key, for caches that drop or reload a single entry.
+    """
+
+    def __init__(self, channel: str, enabled: bool = REFERENCE_CACHE_NOTIFY):
+        self.channel = channel
+        self.enabled = enabled
+        # tags the notifications of this process, which already dispatched them locally
+        self.origin = uuid.uuid4().hex
+        self.subscribers: Dict[str, List[Callable[[], Any]]] = defaultdict(list)
+        self.key_subscribers: Dict[str, List[Callable[[str], Any]]] = defaultdict(list)
+        self._conn: Optional[asyncpg.Connection] = None
+
+    def subscribe(self, name: str, callback: Callable[[], Any]):
+        self.subscribers[name].append(callback)
+
+    def subscribe_keys(self, name: str, callback: Callable[[str], Any]):
+        self.key_subscribers[name].append(callback)
+
+    def _dispatch(self, name: str):
+        table, keyed, key = name.partition(":")
+        if keyed:
+            for callback in self.key_subscribers.get(table, []):
+                callback(key)
+            return
+        for callback in self.subscribers.get(name, []):
+            callback()
+
+    def _on_notify(self, connection, pid, channel, payload):
+        origin, _, name = payload.partition(" ")
+        if origin == self.origin:
+            return
+        logger.debug(f"invalidation {name} from backend {pid}")
+        self._dispatch(name)
+
+    def _on_terminate(self, connection):
+        if connection is not self._conn:
+            return
+        # notifications may have been missed, drop everything and rely on the ttl from now on
+        logger.error(f"invalidation channel {self.channel} connection lost")
+        self._conn = None
+        for name in list(self.subscribers):
+            self._dispatch(name)
+
+    async def start(self):
+        if not self.enabled or self._conn is not None:
+            return
+        try:
+            self._conn = await asyncpg.connect(user=DBConfig.DB_USER, password=DBConfig.DB_PASSWORD,
+                                               host=DBConfig.DB_HOST, port=int(DBConfig.DB_PORT),
+                                               database=DBConfig.DB_DATABASE)
+            self._conn.add_termination_listener(self._on_terminate)
+            await self._conn.add_listener(self.channel, self._on_notify)
+        except Exception as e:
+            logger.error(f"invalidation channel start exception {e}")
+            self._conn = None
+
+    async def stop(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        try:
+            await conn.remove_listener(self.channel, self._on_notify)
+            await conn.close()
+        except Exception as e:
+            logger.error(f"invalidation channel stop exception {e}")
+
+    async def publish(self, *names: str):
+        if not self.enabled or not names:
+            return
+        try:
+            async with engine.connect() as conn:
+                for name in names:
+                    await conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                       {"channel": self.channel, "payload": f"{self.origin} {name}"})
+                await conn.commit()
+        except Exception as e:
+            logger.error(f"invalidation channel publish exception {e}")
+
+    async def invalidate(self, *names: str):
+        for name in names:
+            self._dispatch(name)
+        await self.publish(*names)
+
+
+role_cache = ReferenceCache(Role, "name")
+status_cache = ReferenceCache(Status, "status_name")
+thrash_type_cache = ReferenceCache(ThrashType, "thrash_type")
+map_cache = ReferenceCache(Map, "city")
+reference_caches = [role_cache, status_cache, thrash_type_cache, map_cache]
+
+invalidation_channel = InvalidationChannel(REFERENCE_CACHE_CHANNEL)
+for reference_cache in reference_caches:
+    invalidation_channel.subscribe(reference_cache.name, reference_cache.invalidate)
+
+# principals are keyed by phone number and carry the role id, deleting a role detaches its users
+invalidation_channel.subscribe_keys(User.__tablename__, principal_cache.invalidate)
+invalidation_channel.subscribe(User.__tablename__, principal_cache.clear)
+invalidation_channel.subscribe(Role.__tablename__, principal_cache.clear)
+
+
+def principal_invalidation(phone: str) -> str:
+    return f"{User.__tablename__}:{phone}"
+
+
+class TableVersions:
+    """
+    Local per-table counters bumped on every invalidation, used to key cached responses.
+    """
+
+    def __init__(self):
+        self._versions: Dict[str, int] = defaultdict(int)
+
+    def bump(self, name: str):
+        self._versions[name] += 1
+
+    def get(self, *names: str) -> tuple:
+        return tuple(self._versions[name] for name in names)
+
+
+table_versions = TableVersions()
+# serialized responses of the reference routes, keyed by route, query and table versions
+response_cache = LRUCache(RESPONSE_CACHE_SIZE, REFERENCE_CACHE_TTL)
+
+invalidation_channel.subscribe(Achievement.__tablename__, achievement_cache.clear)
+for name in [cache.name for cache in reference_caches] + [Achievement.__tablename__]:
+    invalidation_channel.subscribe(name, partial(table_versions.bump, name))
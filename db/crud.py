@@ -1,8 +1,14 @@
+import asyncio
 import logging
+from datetime import datetime, timezone
+from itertools import islice
 from typing import List, Optional
 
 from fastapi import HTTPException, status
-from sqlmodel import select
+from pydantic import ValidationError
+from sqlalchemy import bindparam, delete, false, func, literal, true, tuple_, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert as pg_insert
+from sqlmodel import select, SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from db.models.base_models import UserAchievementUpdate, RoleUpdate, RoleDelete, RoleCreate, ThrashTypeCreate, \
@@ -10,31 +16,207 @@ from db.models.base_models import UserAchievementUpdate, RoleUpdate, RoleDelete,
     CourierCreate, UserCreate, UserGet, UserDelete, UserUpdate, CourierGet, CourierUpdate, CourierDelete, \
     MapPointCreate, MapPointGet, MapPointUpdate, MapPointDelete, AchievementCreate, AchievementUpdate, \
     AchievementDelete, PointThrashGet, DeliveryRequestGet, DeliveryRequestUpdate, DeliveryRequestDelete, \
-    DeliveryRequestCreate
+    DeliveryRequestCreate, AddressCoordinatesCreate
 from db.models.sql_models import User, Achievement, Role, UserAchievementLink, ThrashType, Status, Map, Courier, MapPoint, \
-    PointThrashLink, DeliveryRequest, DeliveryThrashLink
+    PointThrashLink, DeliveryRequest, DeliveryThrashLink, AddressCoordinates
+from db import assignment, bulk, pagination, search
+from db.addresses import normalise_address
+from db.dispatcher import async_session
+from db.cache import achievement_cache, principal_invalidation, invalidation_channel, role_cache, status_cache, \
+    thrash_type_cache, map_cache, search_cache, address_cache, statement_cache
+from db.spatial import map_points_index, point_invalidation
+from settings import GEO_PAGE_SIZE, STREAM_BATCH_SIZE, ACHIEVEMENT_BACKFILL_CHUNK, ACHIEVEMENTS_SPARSE, \
+    SEARCH_PAGE_SIZE, PAGE_SIZE_MAX, INGEST_BATCH_SIZE, INGEST_MAX_ERRORS, DISPATCH_COURIER_CAPACITY
 
 logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+COURIER_UPDATE_KEYS = ["id", "phone_number", "username", "name", "surname", "birthday", "salary", "delivery_count",
+                       "latitude", "longitude"]
+NEW_REQUEST_STATUS = "в ожидании"
+ADDRESS_SOURCE_OPERATOR = "operator"
+ADDRESS_SOURCE_MAP_POINT = "map_point"
+DISPATCH_LOCK_ID = 190219
+DELIVERY_REQUEST_UPDATE_KEYS = ["id", "address", "create_date", "status_id", "id_courier", "id_user", "price"]
+
+USER_KEYS = [(User.id, "id")]
+COURIER_KEYS = [(Courier.id, "id")]
+MAP_POINT_KEYS = [(MapPoint.id, "id")]
+POINT_THRASH_KEYS = [(MapPoint.id, "point_id"), (func.coalesce(ThrashType.id, 0), "thrash_type_id")]
+DELIVERY_REQUEST_KEYS = [(DeliveryRequest.id, "id"), (func.coalesce(ThrashType.id, 0), "thrash_type_id")]
+DELIVERY_REQUEST_GROUPED_KEYS = [(DeliveryRequest.id, "id")]
+# filters the spatial index applies itself, see get_nearby()
+NEARBY_INDEX_FILTERS = {"thrash_type_filter", "map_id", "city_filter"}
+
+# (value name, condition on its bound parameter), the position is the bit of the condition in the statement key
+USER_FILTERS = [
+    ("name_filter", lambda value: User.name == value),
+    ("last_name_filter", lambda value: User.surname == value),
+    ("birthday_filter_from", lambda value: User.birthday >= value),
+    ("birthday_filter_to", lambda value: User.birthday <= value),
+    ("role_filter", lambda value: Role.name == value),
+]
+COURIER_FILTERS = [
+    ("name_filter", lambda value: Courier.name == value),
+    ("last_name_filter", lambda value: Courier.surname == value),
+    ("delivery_count_from", lambda value: Courier.delivery_count >= value),
+    ("delivery_count_to", lambda value: Courier.delivery_count <= value),
+    ("salary_from", lambda value: Courier.salary >= value),
+    ("salary_to", lambda value: Courier.salary <= value),
+    ("birthday_from", lambda value: Courier.birthday >= value),
+    ("birthday_to", lambda value: Courier.birthday <= value),
+]
+MAP_POINT_FILTERS = [
+    ("phone_filter", lambda value: MapPoint.phone_number == value),
+    ("email_filter", lambda value: MapPoint.email == value),
+    ("title_filter", lambda value: MapPoint.title == value),
+    ("website_filter", lambda value: MapPoint.website == value),
+    ("address_filter", lambda value: MapPoint.address == value),
+    ("thrash_type_filter", lambda value: MapPoint.accepted_thrash.any(ThrashType.thrash_type == value)),
+    ("map_id", lambda value: MapPoint.id_map == value),
+    ("coordinates_filter", lambda value: MapPoint.coordinates == value),
+]
+POINT_THRASH_FILTERS = [
+    ("point_id_filter", lambda value: MapPoint.id == value),
+    ("thrash_type_filter", lambda value: ThrashType.thrash_type == value),
+    ("title_filter", lambda value: MapPoint.title == value),
+    ("phone_number_filter", lambda value: MapPoint.phone_number == value),
+    ("email_filter", lambda value: MapPoint.email == value),
+    ("address_filter", lambda value: MapPoint.address == value),
+    ("website_filter", lambda value: MapPoint.website == value),
+    ("city_filter", lambda value: Map.city == value),
+    ("coordinates_filter", lambda value: MapPoint.coordinates == value),
+]
+DELIVERY_REQUEST_FILTERS = [
+    ("id_filter", lambda value: DeliveryRequest.id == value),
+    ("create_date_from", lambda value: DeliveryRequest.create_date >= value),
+    ("create_date_to", lambda value: DeliveryRequest.create_date <= value),
+    ("thrash_type_filter", lambda value: ThrashType.thrash_type == value),
+    ("grouped_thrash_type_filter",
+     lambda value: DeliveryRequest.thrash_types.any(ThrashType.thrash_type == value)),
+    ("status_filter", lambda value: Status.status_name == value),
+    ("courier_name_filter", lambda value: Courier.name == value),
+    ("courier_surname_filter", lambda value: Courier.surname == value),
+    ("courier_phone_number_filter", lambda value: Courier.phone_number == value),
+    ("user_name_filter", lambda value: User.name == value),
+    ("user_surname_filter", lambda value: User.surname == value),
+    ("user_username_filter", lambda value: User.username == value),
+    ("user_phone_number_filter", lambda value: User.phone_number == value),
+]
+
+
+def row_dict(row) -> dict:
+    if isinstance(row, SQLModel):
+        return row.dict()
+    if isinstance(row[0], SQLModel):
+        return dict(row[0].dict(), **dict(list(row._mapping.items())[1:]))
+    return dict(row._mapping)
+
+
+async def stream_rows(session: AsyncSession, sql, params: Optional[dict] = None):
+    """
+    The response has already started when a row fails, so the error is re-raised after the rollback:
+    the server then aborts the connection and the client sees a broken stream instead of a short one.
+    """
+    try:
+        result = await session.stream(sql, params)
+        async for partition in result.partitions(STREAM_BATCH_SIZE):
+            for row in partition:
+                yield row_dict(row)
+    except Exception as e:
+        logger.error(f"stream_rows exception {e}")
+        await session.rollback()
+        raise
+
+
+def cached_statement(key: tuple, build):
+    sql = statement_cache.get(key)
+    if sql is None:
+        sql = build()
+        statement_cache.set(key, sql)
+    return sql
+
+
+def filter_values(filters, conditions: list) -> dict:
+    return {name: getattr(filters, name, None) for name, _ in conditions}
+
+
+def filter_statement(name: str, build, conditions: list, values: dict, *shape):
+    """
+    build() narrowed by the conditions whose value is set, the values left as bound parameters. The statement
+    is cached by name, the bitmask of the set conditions and shape, so each combination of filters is built
+    once and its SQL, never changing with the values, is compiled once and prepared once per connection.
+    Returns (key, sql, params).
+    """
+    mask = 0
+    params = {}
+    for bit, (field, _) in enumerate(conditions):
+        if values.get(field):
+            mask |= 1 << bit
+            params[field] = values[field]
+
+    def build_filtered():
+        sql = build()
+        for bit, (field, condition) in enumerate(conditions):
+            if mask & 1 << bit:
+                sql = sql.where(condition(bindparam(field)))
+        return sql
+
+    key = (name, mask) + shape
+    return key, cached_statement(key, build_filtered), params
+
+
+async def fetch_rows(session: AsyncSession, sql, keys, filters, params: Optional[dict] = None,
+                     key: Optional[tuple] = None):
+    """
+    key is the statement_cache key of sql, the keyset paged variants of sql are cached next to it.
+    """
+    params = dict(params or {})
+    if not filters.stream and not pagination.is_paged(filters):
+        res = await session.exec(sql, params=params)
+        return res.all()
+    limit = pagination.page_size(filters) if filters.limit or not filters.stream else None
+    after, limited = bool(filters.after), limit is not None
+    if key is None:
+        sql = pagination.keyset(sql, keys, after, limited)
+    else:
+        sql = cached_statement(key + ("keyset", after, limited), lambda: pagination.keyset(sql, keys, after, limited))
+    if filters.stream:
+        params.update(pagination.keyset_params(keys, filters.after, limit))
+        return stream_rows(session, sql, params)
+    params.update(pagination.keyset_params(keys, filters.after, limit + 1))
+    res = await session.exec(sql, params=params)
+    return pagination.page(res.all(), keys, limit)
+
+
+async def fetch_ranked(session: AsyncSession, sql, rank, order_by: list, filters, kind: str,
+                       params: Optional[dict] = None):
+    """
+    Search results, best rank first and paged by limit/offset. Popular queries are answered from search_cache,
+    which the writes of the searched tables clear.
+    """
+    key = (kind, filters.json())
+    rows = search_cache.get(key)
+    if rows is not None:
+        return rows
+    limit = min(filters.limit or SEARCH_PAGE_SIZE, PAGE_SIZE_MAX)
+    sql = sql.add_columns(rank.label("rank")).order_by(rank.desc(), *order_by).limit(limit).offset(filters.offset)
+    res = await session.execute(sql, params)
+    rows = [row_dict(row) for row in res.all()]
+    search_cache.set(key, rows)
+    return rows
+
 
 async def get_users(session: AsyncSession, filters: UserGet):
     try:
-        sql = select(User.id, User.phone_number, User.username, User.name, User.surname, User.birthday,
-                     Role.name.label("role")).outerjoin(Role)
         if filters.id_filter or filters.username_filter or filters.phone_filter:
             return await get_user(session, filters.id_filter, filters.username_filter, filters.phone_filter)
-        if filters.name_filter:
-            sql = sql.where(User.name == filters.name_filter)
-        if filters.last_name_filter:
-            sql = sql.where(User.surname == filters.last_name_filter)
-        if filters.birthday_filter_from:
-            sql = sql.where(User.birthday >= filters.birthday_filter_from)
-        if filters.birthday_filter_to:
-            sql = sql.where(User.birthday >= filters.birthday_filter_to)
-        if filters.role_filter:
-            role = await get_role(session, role_name_filter=filters.role_filter)
-        res = await session.exec(sql)
-        return res.all()
+        key, sql, params = filter_statement(
+            "users", lambda: select(User.id, User.phone_number, User.username, User.name, User.surname,
+                                    User.birthday, Role.name.label("role")).outerjoin(Role),
+            USER_FILTERS, filter_values(filters, USER_FILTERS))
+        return await fetch_rows(session, sql, USER_KEYS, filters, params, key)
     except Exception as e:
         logger.error(f"get_users exception {e}")
         await session.rollback()
@@ -43,6 +225,7 @@ async def get_users(session: AsyncSession, filters: UserGet):
 
 async def update_user(session: AsyncSession, users: List[UserUpdate]):
     updated_users = []
+    touched_phones = []
     for user in users:
         try:
             if user.phone_number_old:
@@ -53,6 +236,7 @@ async def update_user(session: AsyncSession, users: List[UserUpdate]):
                 user_to_update = await get_user(session, username=user.username)
             else:
                 continue
+            touched_phones.extend([user_to_update.phone_number, user.phone_number_new])
             if user.phone_number_old and user.phone_number_new:
                 user_to_update.phone_number = user.phone_number_new
             if user.username and user.username_new:
@@ -66,7 +250,7 @@ async def update_user(session: AsyncSession, users: List[UserUpdate]):
             if user.role:
                 role = await get_role(session, role_name_filter=user.role)
                 if role:
-                    user_to_update.role = role[0]
+                    user_to_update.role_id = role[0].id
             session.add(user_to_update)
             updated_users.append(user_to_update)
         except Exception as e:
@@ -74,23 +258,40 @@ async def update_user(session: AsyncSession, users: List[UserUpdate]):
             await session.rollback()
             return
     await session.commit()
+    await invalidation_channel.invalidate(*[principal_invalidation(phone) for phone in touched_phones if phone])
     return updated_users
 
 
 async def delete_user(session: AsyncSession, users: List[UserDelete]):
-    deleted_users = []
-    for user in users:
-        try:
-            if not user.id and not user.username and not user.phone:
-                return None
-            user_to_delete = await get_user(session, user.id, user.username, user.phone)
-            await session.delete(user_to_delete)
-            deleted_users.append(user_to_delete)
-        except Exception as e:
-            logger.error(f"delete_map exception {e}")
-            await session.rollback()
-    await session.commit()
-    return deleted_users
+    if any(not user.id and not user.username and not user.phone for user in users):
+        return None
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(users):
+            resolved = await bulk.resolve_ids(session, User.__table__,
+                                              {"id": [user.id for user in batch],
+                                               "username": [user.username for user in batch],
+                                               "phone_number": [user.phone for user in batch]})
+            targets = []
+            for user in batch:
+                if user.id:
+                    target = resolved["id"].get(user.id)
+                elif user.username:
+                    target = resolved["username"].get(user.username)
+                else:
+                    target = resolved["phone_number"].get(user.phone)
+                if target is None:
+                    failed.append(bulk.failure(user, "not found"))
+                    continue
+                targets.append(target)
+            succeeded.extend(await bulk.delete_by_ids(session, User.__table__, list(dict.fromkeys(targets))))
+        await session.commit()
+    except Exception as e:
+        logger.error(f"delete_user exception {e}")
+        await session.rollback()
+        return
+    await invalidation_channel.invalidate(*[principal_invalidation(user["phone_number"]) for user in succeeded])
+    return bulk.BulkResult(succeeded, failed)
 
 
 async def get_user(session: AsyncSession, user_id: int = None, username: str = None, phone: str = None) -> User:
@@ -124,16 +325,44 @@ async def create_user_achievements(session: AsyncSession, phone_number):
     await session.refresh(user)
 
 
+async def get_achievement_catalogue() -> List[dict]:
+    """
+    Cached catalogue, reloaded from the primary like the reference caches.
+    """
+    catalogue = achievement_cache.get("all")
+    if catalogue is None:
+        async with async_session() as session:
+            res = await session.exec(select(Achievement.id, Achievement.title, Achievement.description)
+                                     .order_by(Achievement.id))
+            catalogue = [dict(row._mapping) for row in res.all()]
+        achievement_cache.set("all", catalogue)
+    return catalogue
+
+
+async def get_user_achievement_links(session: AsyncSession, user_id: int):
+    sql = select(UserAchievementLink.achievement_id, UserAchievementLink.unlock_date, UserAchievementLink.unlocked) \
+        .where(UserAchievementLink.user_id == user_id)
+    res = await session.exec(sql)
+    return res.all()
+
+
 async def get_users_achievements(session: AsyncSession, user_id: int = None):
+    """
+    Every catalogue achievement for the user; those without a stored link row are reported locked,
+    which is what sparse mode relies on.
+    """
     try:
         if not user_id:
             return
-        sql = select(Achievement.id, Achievement.title, Achievement.description, UserAchievementLink.unlock_date,
-                     UserAchievementLink.unlocked) \
-            .join(Achievement, UserAchievementLink.achievement_id == Achievement.id) \
-            .where(UserAchievementLink.user_id == user_id)
-        res = await session.exec(sql)
-        return res.all()
+        catalogue = await get_achievement_catalogue()
+        links = {link.achievement_id: link for link in await get_user_achievement_links(session, user_id)}
+        achievements = []
+        for achievement in catalogue:
+            link = links.get(achievement["id"])
+            achievements.append(dict(achievement,
+                                     unlock_date=link.unlock_date if link else None,
+                                     unlocked=link.unlocked if link else False))
+        return achievements
     except Exception as e:
         logger.error(f'get_users_achievements exception {e}')
         await session.rollback()
@@ -141,9 +370,11 @@ async def get_users_achievements(session: AsyncSession, user_id: int = None):
 
 
 async def sync_users_achievements(session: AsyncSession, user_id: int):
+    if ACHIEVEMENTS_SPARSE:
+        return None
     synced = []
     try:
-        user_ach = await get_users_achievements(session, user_id)
+        user_ach = await get_user_achievement_links(session, user_id)
         all_ach = await get_achievements(session)
         logger.debug(f"sync user_ach: {user_ach}")
         ids = set([ach[0] for ach in user_ach])
@@ -163,6 +394,8 @@ async def sync_users_achievements(session: AsyncSession, user_id: int):
 
 
 async def update_users_achievements(session: AsyncSession, update_data: List[UserAchievementUpdate]):
+    if ACHIEVEMENTS_SPARSE:
+        return await store_users_achievements(session, update_data)
     updated = []
     try:
         for item in update_data:
@@ -184,6 +417,39 @@ async def update_users_achievements(session: AsyncSession, update_data: List[Use
         logger.debug(f"updating achievements exception {e}")
 
 
+async def store_users_achievements(session: AsyncSession, update_data: List[UserAchievementUpdate]):
+    """
+    Sparse mode: unlocked achievements are upserted, locked ones lose their link row.
+    """
+    links = UserAchievementLink.__table__
+    updated = []
+    try:
+        for batch in bulk.chunked(update_data):
+            unlocked = {(item.user_id, item.achievement_id): item for item in batch if item.unlocked}
+            locked = [item for item in batch if not item.unlocked]
+            if unlocked:
+                stmt = pg_insert(links).values([{"user_id": item.user_id, "achievement_id": item.achievement_id,
+                                                 "unlocked": True, "unlock_date": item.unlock_date}
+                                                for item in unlocked.values()])
+                stmt = stmt.on_conflict_do_update(index_elements=[links.c.user_id, links.c.achievement_id],
+                                                  set_={"unlocked": stmt.excluded.unlocked,
+                                                        "unlock_date": stmt.excluded.unlock_date})
+                res = await session.execute(stmt.returning(*links.c))
+                updated.extend(dict(row._mapping) for row in res.all())
+            if locked:
+                res = await session.execute(
+                    delete(links)
+                    .where(tuple_(links.c.user_id, links.c.achievement_id)
+                           .in_([(item.user_id, item.achievement_id) for item in locked]))
+                    .returning(*links.c))
+                updated.extend(dict(row._mapping) for row in res.all())
+        await session.commit()
+        return updated
+    except Exception as e:
+        await session.rollback()
+        logger.debug(f"storing achievements exception {e}")
+
+
 async def create_user(session: AsyncSession, user_data: UserCreate):
     logger.debug(f"user_data {user_data}")
     user_data = user_data.dict(exclude_unset=True, exclude_none=True)
@@ -192,20 +458,22 @@ async def create_user(session: AsyncSession, user_data: UserCreate):
         user = User()
         if user_data.get("role"):
             role = await get_role(session, role_name_filter=user_data["role"])
-            user.role = role[0]
+            user.role_id = role[0].id
         else:
             role = await get_role(session, role_name_filter="basic_user")
-            if not role:
-                role = await create_role(session, ['basic_user'])
-            role = role[0]
-            user.role = role
+            if role:
+                user.role_id = role[0].id
+            else:
+                created = await create_role(session, [RoleCreate(name="basic_user")])
+                user.role_id = created.succeeded[0]["id"]
         for key, value in user_data.items():
             setattr(user, key, value)
 
         session.add(user)
         await session.commit()
-        await session.refresh(user)
-        await create_user_achievements(session, user.phone_number)
+        if not ACHIEVEMENTS_SPARSE:
+            await session.refresh(user)
+            await create_user_achievements(session, user.phone_number)
         return user
     except Exception as e:
         logger.debug(f"create_user exception {e}")
@@ -215,13 +483,7 @@ async def create_user(session: AsyncSession, user_data: UserCreate):
 
 async def get_role(session: AsyncSession, role_id_filter: Optional[int] = None, role_name_filter: Optional[str] = None):
     try:
-        role_select = select(Role)
-        if role_name_filter:
-            role_select = role_select.where(Role.name == role_name_filter)
-        elif role_id_filter:
-            role_select = role_select.where(Role.id == role_id_filter)
-        roles = await session.exec(role_select)
-        return roles.all()
+        return await role_cache.lookup(role_id_filter, role_name_filter)
     except Exception as e:
         logger.debug(f"get_role exception {e}")
         await session.rollback()
@@ -229,72 +491,31 @@ async def get_role(session: AsyncSession, role_id_filter: Optional[int] = None,
 
 
 async def create_role(session: AsyncSession, roles: List[RoleCreate]):
-    created_roles = []
     logger.debug(f"roles passed: {roles}")
-    for role in roles:
-        try:
-            if await get_role(session, role_name_filter=role.name):
-                return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{role.name} already exists")
-            db_role = Role(name=role.name)
-            session.add(db_role)
-            created_roles.append(db_role)
-        except Exception as e:
-            logger.error(f"create_role exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return created_roles
+    created = await bulk.create_named(session, Role, Role.name, [role.name for role in roles])
+    await invalidation_channel.invalidate(role_cache.name)
+    return created
 
 
 async def update_role(session: AsyncSession, roles: List[RoleUpdate]):
-    updated_roles = []
-    for role in roles:
-        try:
-            selection = Role.name == role.old_name if role.old_name else Role.id == role.old_id
-            role_to_update = select(Role).where(selection)
-            res = await session.exec(role_to_update)
-            res = res.one()
-            res.name = role.new_name
-            session.add(res)
-            updated_roles.append(res)
-        except Exception as e:
-            logger.error(f"update_role exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return updated_roles
+    updated = await bulk.update_named(session, Role, Role.name,
+                                      [(role, role.old_id, role.old_name, role.new_name) for role in roles])
+    await invalidation_channel.invalidate(role_cache.name)
+    return updated
 
 
 async def delete_role(session: AsyncSession, roles: List[RoleDelete]):
-    deleted_roles = []
-    for role in roles:
-        try:
-            if not role.name and not role.id:
-                return None
-            selection = Role.name == role.name if role.name else Role.id == role.id
-            role_to_delete = select(Role).where(selection)
-            res = await session.exec(role_to_delete)
-            res = res.one()
-            await session.delete(res)
-            deleted_roles.append(res)
-        except Exception as e:
-            logger.error(f"delete_role exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return deleted_roles
+    if any(not role.name and not role.id for role in roles):
+        return None
+    deleted = await bulk.delete_named(session, Role, Role.name, [(role, role.id, role.name) for role in roles])
+    await invalidation_channel.invalidate(role_cache.name)
+    return deleted
 
 
 async def get_thrash_type(session: AsyncSession,
                           thrash_type_id_filter: Optional[int] = None, thrash_type_name_filter: Optional[str] = None):
     try:
-        thrash_type_select = select(ThrashType)
-        if thrash_type_name_filter:
-            thrash_type_select = thrash_type_select.where(ThrashType.thrash_type == thrash_type_name_filter)
-        elif thrash_type_id_filter:
-            thrash_type_select = thrash_type_select.where(ThrashType.id == thrash_type_id_filter)
-        types = await session.exec(thrash_type_select)
-        return types.all()
+        return await thrash_type_cache.lookup(thrash_type_id_filter, thrash_type_name_filter)
     except Exception as e:
         logger.debug(f"get_thrash_type exception {e}")
         await session.rollback()
@@ -302,74 +523,34 @@ async def get_thrash_type(session: AsyncSession,
 
 
 async def create_thrash_type(session: AsyncSession, thrash_types: List[ThrashTypeCreate]):
-    created_types = []
     logger.debug(f"thrash_types passed: {thrash_types}")
-    for thrash_type in thrash_types:
-        try:
-            if await get_thrash_type(session, thrash_type_name_filter=thrash_type.thrash_type):
-                return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{thrash_type.thrash_type} already exists")
-            db_thrash_type = ThrashType(thrash_type=thrash_type.thrash_type)
-            session.add(db_thrash_type)
-            created_types.append(db_thrash_type)
-        except Exception as e:
-            logger.error(f"create_thrash_type exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return created_types
+    created = await bulk.create_named(session, ThrashType, ThrashType.thrash_type,
+                                      [thrash_type.thrash_type for thrash_type in thrash_types])
+    await invalidation_channel.invalidate(thrash_type_cache.name)
+    return created
 
 
 async def update_thrash_type(session: AsyncSession, types: List[ThrashTypeUpdate]):
-    updated_types = []
-    for thrash_type in types:
-        try:
-            selection = ThrashType.thrash_type == thrash_type.old_thrash_type \
-                if thrash_type.old_thrash_type else ThrashType.id == thrash_type.old_id
-            thrash_type_to_update = select(ThrashType).where(selection)
-            res = await session.exec(thrash_type_to_update)
-            res = res.one()
-            res.thrash_type = thrash_type.new_thrash_type
-            session.add(res)
-            updated_types.append(res)
-        except Exception as e:
-            logger.error(f"update_thrash_type exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return updated_types
+    updated = await bulk.update_named(session, ThrashType, ThrashType.thrash_type,
+                                      [(thrash_type, thrash_type.old_id, thrash_type.old_thrash_type,
+                                        thrash_type.new_thrash_type) for thrash_type in types])
+    await invalidation_channel.invalidate(thrash_type_cache.name)
+    return updated
 
 
 async def delete_thrash_type(session: AsyncSession, types: List[ThrashTypeDelete]):
-    deleted_thrash_types = []
-    for thrash_type in types:
-        try:
-            if not thrash_type.thrash_type and not thrash_type.id:
-                return None
-            selection = ThrashType.thrash_type == thrash_type.thrash_type \
-                if thrash_type.thrash_type else ThrashType.id == thrash_type.id
-            thrash_type_to_delete = select(ThrashType).where(selection)
-            res = await session.exec(thrash_type_to_delete)
-            res = res.one()
-            await session.delete(res)
-            deleted_thrash_types.append(res)
-        except Exception as e:
-            logger.error(f"delete_thrash_type exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return deleted_thrash_types
+    if any(not thrash_type.thrash_type and not thrash_type.id for thrash_type in types):
+        return None
+    deleted = await bulk.delete_named(session, ThrashType, ThrashType.thrash_type,
+                                      [(thrash_type, thrash_type.id, thrash_type.thrash_type) for thrash_type in types])
+    await invalidation_channel.invalidate(thrash_type_cache.name)
+    return deleted
 
 
 async def get_status(session: AsyncSession,
                      status_id_filter: Optional[int] = None, status_name_filter: Optional[str] = None):
     try:
-        status_select = select(Status)
-        if status_name_filter:
-            status_select = status_select.where(Status.status_name == status_name_filter)
-        elif status_id_filter:
-            status_select = status_select.where(Status.id == status_id_filter)
-        statuses = await session.exec(status_select)
-        return statuses.all()
+        return await status_cache.lookup(status_id_filter, status_name_filter)
     except Exception as e:
         logger.debug(f"get_status exception {e}")
         await session.rollback()
@@ -377,74 +558,37 @@ async def get_status(session: AsyncSession,
 
 
 async def create_status(session: AsyncSession, statuses: List[StatusCreate]):
-    created_statuses = []
     logger.debug(f"statuses passed: {statuses}")
-    for req_status in statuses:
-        try:
-            if await get_status(session, status_name_filter=req_status.status_name):
-                return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{req_status.status_name} already exists")
-            db_status = Status(status_name=req_status.status_name)
-            session.add(db_status)
-            created_statuses.append(db_status)
-        except Exception as e:
-            logger.error(f"create_status exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return created_statuses
+    created = await bulk.create_named(session, Status, Status.status_name,
+                                      [req_status.status_name for req_status in statuses])
+    await invalidation_channel.invalidate(status_cache.name)
+    return created
 
 
 async def update_status(session: AsyncSession, statuses: List[StatusUpdate]):
-    updated_statuses = []
-    for status in statuses:
-        try:
-            selection = Status.status_name == status.old_status \
-                if status.old_status else Status.id == status.old_id
-            status_to_update = select(Status).where(selection)
-            res = await session.exec(status_to_update)
-            res = res.one()
-            res.status_name = status.new_status
-            session.add(res)
-            updated_statuses.append(res)
-        except Exception as e:
-            logger.error(f"update_status exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return updated_statuses
+    updated = await bulk.update_named(session, Status, Status.status_name,
+                                      [(req_status, req_status.old_id, req_status.old_status, req_status.new_status)
+                                       for req_status in statuses])
+    await invalidation_channel.invalidate(status_cache.name)
+    return updated
 
 
 async def delete_status(session: AsyncSession, statuses: List[StatusDelete]):
-    deleted_statuses = []
-    for status in statuses:
-        try:
-            if not status.status_name and not status.id:
-                return None
-            selection = Status.status_name == status.status_name \
-                if status.status_name else Status.id == status.id
-            status_to_delete = select(Status).where(selection)
-            res = await session.exec(status_to_delete)
-            res = res.one()
-            await session.delete(res)
-            deleted_statuses.append(res)
-        except Exception as e:
-            logger.error(f"delete_status exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return deleted_statuses
+    if any(not req_status.status_name and not req_status.id for req_status in statuses):
+        return None
+    deleted = await bulk.delete_named(session, Status, Status.status_name,
+                                      [(req_status, req_status.id, req_status.status_name) for req_status in statuses])
+    await invalidation_channel.invalidate(status_cache.name)
+    return deleted
 
 
 async def get_map(session: AsyncSession,
                   map_id_filter: Optional[int] = None, map_city_filter: Optional[str] = None):
     try:
-        map_select = select(Map)
-        if map_city_filter:
-            map_select = map_select.where(Map.city == map_city_filter)
-        elif map_id_filter:
-            map_select = map_select.where(Map.id == map_id_filter)
-        maps = await session.exec(map_select)
-        return maps.one_or_none()
+        maps = await map_cache.lookup(map_id_filter, map_city_filter)
+        if not map_city_filter and not map_id_filter:
+            return maps
+        return maps[0] if maps else None
     except Exception as e:
         logger.debug(f"get_map exception {e}")
         await session.rollback()
@@ -452,62 +596,25 @@ async def get_map(session: AsyncSession,
 
 
 async def create_map(session: AsyncSession, maps: List[MapCreate]):
-    created_maps = []
     logger.debug(f"maps passed: {maps}")
-    for map in maps:
-        try:
-            if await get_map(session, map_city_filter=map.city):
-                return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"{map.city} already exists")
-            db_map = Map(city=map.city)
-            session.add(db_map)
-            created_maps.append(db_map)
-        except Exception as e:
-            logger.error(f"create_map exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return created_maps
+    created = await bulk.create_named(session, Map, Map.city, [map.city for map in maps])
+    await invalidation_channel.invalidate(map_cache.name)
+    return created
 
 
 async def update_map(session: AsyncSession, maps: List[MapUpdate]):
-    updated_maps = []
-    for map in maps:
-        try:
-            selection = Map.city == map.old_city \
-                if map.old_city else Map.id == map.old_id
-            map_to_update = select(Map).where(selection)
-            res = await session.exec(map_to_update)
-            res = res.one()
-            res.city = map.new_city
-            session.add(res)
-            updated_maps.append(res)
-        except Exception as e:
-            logger.error(f"update_map exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return updated_maps
+    updated = await bulk.update_named(session, Map, Map.city,
+                                      [(map, map.old_id, map.old_city, map.new_city) for map in maps])
+    await invalidation_channel.invalidate(map_cache.name)
+    return updated
 
 
 async def delete_map(session: AsyncSession, maps: List[MapDelete]):
-    deleted_maps = []
-    for map in maps:
-        try:
-            if not map.city and not map.id:
-                return None
-            selection = Map.city == map.city \
-                if map.city else Map.id == map.id
-            map_to_delete = select(Map).where(selection)
-            res = await session.exec(map_to_delete)
-            res = res.one()
-            await session.delete(res)
-            deleted_maps.append(res)
-        except Exception as e:
-            logger.error(f"delete_map exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return deleted_maps
+    if any(not map.city and not map.id for map in maps):
+        return None
+    deleted = await bulk.delete_named(session, Map, Map.city, [(map, map.id, map.city) for map in maps])
+    await invalidation_channel.invalidate(map_cache.name)
+    return deleted
 
 
 async def get_courier(session: AsyncSession, user_id: int = None, username: str = None, phone: str = None) -> Courier:
@@ -548,27 +655,11 @@ async def create_courier(session: AsyncSession, data: CourierCreate):
 
 async def get_couriers(session: AsyncSession, filters: CourierGet):
     try:
-        sql = select(Courier)
         if filters.id_filter or filters.username_filter or filters.phone_filter:
             return await get_courier(session, filters.id_filter, filters.username_filter, filters.phone_filter)
-        if filters.name_filter:
-            sql = sql.where(Courier.name == filters.name_filter)
-        if filters.last_name_filter:
-            sql = sql.where(Courier.surname == filters.last_name_filter)
-        if filters.delivery_count_from:
-            sql = sql.where(Courier.delivery_count >= filters.delivery_count_from)
-        if filters.delivery_count_to:
-            sql = sql.where(Courier.delivery_count >= filters.delivery_count_to)
-        if filters.salary_from:
-            sql = sql.where(Courier.salary >= filters.salary_from)
-        if filters.salary_to:
-            sql = sql.where(Courier.salary <= filters.salary_to)
-        if filters.birthday_from:
-            sql = sql.where(Courier.birthday >= filters.birthday_from)
-        if filters.birthday_to:
-            sql = sql.where(Courier.birthday <= filters.birthday_to)
-        res = await session.exec(sql)
-        return res.all()
+        key, sql, params = filter_statement("couriers", lambda: select(Courier), COURIER_FILTERS,
+                                            filter_values(filters, COURIER_FILTERS))
+        return await fetch_rows(session, sql, COURIER_KEYS, filters, params, key)
     except Exception as e:
         logger.error(f"get_couriers exception {e}")
         await session.rollback()
@@ -576,55 +667,67 @@ async def get_couriers(session: AsyncSession, filters: CourierGet):
 
 
 async def update_couriers(session: AsyncSession, couriers: List[CourierUpdate]):
-    updated_couriers = []
-    for courier in couriers:
-        try:
-            if not courier.phone_number and not courier.username:
-                continue
-            courier_to_update = await get_courier(session, phone=courier.phone_number)
-            if not courier_to_update:
-                courier_to_update = await get_courier(session, username=courier.username)
-                if not courier_to_update:
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(couriers):
+            resolved = await bulk.resolve_ids(session, Courier.__table__,
+                                              {"phone_number": [courier.phone_number for courier in batch],
+                                               "username": [courier.username for courier in batch]})
+            rows = {}
+            for courier in batch:
+                if not courier.phone_number and not courier.username:
+                    failed.append(bulk.failure(courier, "phone_number or username required"))
                     continue
-            if courier.phone_number:
-                courier_to_update.phone_number = courier.phone_number
-            if courier.username:
-                courier_to_update.username = courier.username
-            if courier.name:
-                courier_to_update.name = courier.name
-            if courier.surname:
-                courier_to_update.surname = courier.surname
-            if courier.birthday:
-                courier_to_update.birthday = courier.birthday
-            if courier.salary:
-                courier_to_update.salary = courier.salary
-            if courier.delivery_count:
-                courier_to_update.delivery_count = courier.delivery_count
-            session.add(courier_to_update)
-            updated_couriers.append(courier_to_update)
-        except Exception as e:
-            logger.error(f"update_couriers exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return updated_couriers
+                target = resolved["phone_number"].get(courier.phone_number) or \
+                    resolved["username"].get(courier.username)
+                if target is None:
+                    failed.append(bulk.failure(courier, "not found"))
+                    continue
+                rows[target] = {
+                    "id": target,
+                    "phone_number": courier.phone_number or None,
+                    "username": courier.username or None,
+                    "name": courier.name or None,
+                    "surname": courier.surname or None,
+                    "birthday": courier.birthday or None,
+                    "salary": courier.salary or None,
+                    "delivery_count": courier.delivery_count or None,
+                    "latitude": courier.latitude,
+                    "longitude": courier.longitude,
+                }
+            succeeded.extend(await bulk.update_from_rows(session, Courier.__table__, list(rows.values()),
+                                                         COURIER_UPDATE_KEYS))
+        await session.commit()
+        return bulk.BulkResult(succeeded, failed)
+    except Exception as e:
+        logger.error(f"update_couriers exception {e}")
+        await session.rollback()
+        return
 
 
 async def delete_courier(session: AsyncSession, couriers: List[CourierDelete]):
-    deleted_couriers = []
-    for courier in couriers:
-        try:
-            if not courier.id and not courier.phone:
-                return None
-            courier_to_delete = await get_courier(session, user_id=courier.id, phone=courier.phone)
-            await session.delete(courier_to_delete)
-            deleted_couriers.append(courier_to_delete)
-        except Exception as e:
-            logger.error(f"delete_courier exception {e}")
-            await session.rollback()
-            return
-    await session.commit()
-    return deleted_couriers
+    if any(not courier.id and not courier.phone for courier in couriers):
+        return None
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(couriers):
+            resolved = await bulk.resolve_ids(session, Courier.__table__,
+                                              {"id": [courier.id for courier in batch],
+                                               "phone_number": [courier.phone for courier in batch]})
+            targets = []
+            for courier in batch:
+                target = resolved["id"].get(courier.id) if courier.id else resolved["phone_number"].get(courier.phone)
+                if target is None:
+                    failed.append(bulk.failure(courier, "not found"))
+                    continue
+                targets.append(target)
+            succeeded.extend(await bulk.delete_by_ids(session, Courier.__table__, list(dict.fromkeys(targets))))
+        await session.commit()
+        return bulk.BulkResult(succeeded, failed)
+    except Exception as e:
+        logger.error(f"delete_courier exception {e}")
+        await session.rollback()
+        return
 
 
 async def get_map_point(session: AsyncSession, point_id: int = None) -> MapPoint:
@@ -646,25 +749,33 @@ async def create_map_point(session: AsyncSession, data: MapPointCreate):
     logger.debug(f"data {data}")
     try:
         map_point = MapPoint()
+        thrash_list = []
         for key, value in data.items():
             if key == "city":
                 city_map = await get_map(session, map_city_filter=value)
                 if city_map:
-                    map_point.map = city_map
+                    map_point.id_map = city_map.id
                 continue
             if key == "accepted_thrash":
-                thrash_list = []
                 for item in value:
                     thrash = await get_thrash_type(session, thrash_type_name_filter=item)
                     if thrash:
                         thrash_list.append(thrash[0])
-                map_point.accepted_thrash = thrash_list
                 continue
 
             setattr(map_point, key, value)
         session.add(map_point)
+        await session.flush()
+        session.add_all([PointThrashLink(thrash_type_id=thrash_id, map_point_id=map_point.id)
+                         for thrash_id in dict.fromkeys(thrash.id for thrash in thrash_list)])
+        await save_address_coordinates(session, [address_row(map_point.address, map_point.coordinates,
+                                                             ADDRESS_SOURCE_MAP_POINT)])
         await session.commit()
         await session.refresh(map_point)
+        map_points_index.insert(map_point.id, map_point.coordinates, map_point.id_map,
+                                [thrash.thrash_type for thrash in thrash_list])
+        await invalidation_channel.publish(point_invalidation(map_point.id))
+        search_cache.clear()
         return map_point
     except Exception as e:
         await session.rollback()
@@ -679,30 +790,80 @@ async def get_map_points(session: AsyncSession, filters: MapPointGet):
             sql = sql.where(MapPoint.id == filters.id_filter)
             res = await session.exec(sql)
             return res.one_or_none()
-        if filters.phone_filter:
-            sql = sql.where(MapPoint.phone_number == filters.phone_filter)
-        if filters.email_filter:
-            sql = sql.where(MapPoint.email == filters.email_filter)
-        if filters.title_filter:
-            sql = sql.where(MapPoint.title == filters.title_filter)
-        if filters.website_filter:
-            sql = sql.where(MapPoint.website == filters.website_filter)
-        if filters.address_filter:
-            sql = sql.where(MapPoint.address == filters.address_filter)
-        if filters.coordinates_filter:
-            sql = sql.where(MapPoint.coordinates == filters.coordinates_filter)
+        city_map = None
         if filters.city_map_filter:
             city_map = await get_map(session, map_city_filter=filters.city_map_filter)
-            if city_map:
-                sql = sql.where(MapPoint.map == city_map)
-        res = await session.exec(sql)
-        return res.all()
+        values = filter_values(filters, MAP_POINT_FILTERS)
+        values["map_id"] = city_map.id if city_map else None
+        values["coordinates_filter"] = list(filters.coordinates_filter) \
+            if filters.coordinates_filter and not is_geo_query(filters) else None
+        key, sql, params = filter_statement("map_points", lambda: select(MapPoint), MAP_POINT_FILTERS, values)
+        if filters.search_filter:
+            condition, rank = search.search_clause(filters.search_mode, filters.search_filter,
+                                                   search.MAP_POINT_TRIGRAM_COLUMNS, search.MAP_POINT_DOCUMENT)
+            sql = sql.where(condition)
+        if is_geo_query(filters):
+            return await get_nearby(session, sql, filters, filters.thrash_type_filter,
+                                    city_map.id if city_map else None, params)
+        if filters.search_filter:
+            return await fetch_ranked(session, sql, rank, [MapPoint.id], filters, "map_points", params)
+        return await fetch_rows(session, sql, MAP_POINT_KEYS, filters, params, key)
     except Exception as e:
         await session.rollback()
         logger.error(f"get_map_points exception {e}")
         return None
 
 
+def is_geo_query(filters) -> bool:
+    return bool(filters.coordinates_filter and (filters.radius_filter or filters.nearest_filter))
+
+
+async def nearby_rows(session: AsyncSession, sql, ids: List[int], params: Optional[dict]) -> dict:
+    if not ids:
+        return {}
+    res = await session.exec(sql.where(MapPoint.id.in_(ids)), params=params)
+    rows = {}
+    for row in res.all():
+        row = row_dict(row)
+        rows.setdefault(row.get("point_id", row.get("id")), []).append(row)
+    return rows
+
+
+async def get_nearby(session: AsyncSession, sql, filters, thrash_type: Optional[str] = None,
+                     map_id: Optional[int] = None, params: Optional[dict] = None):
+    """
+    Pages over the matching points nearest first; a point with several thrash types keeps all its rows.
+    The index applies the thrash type and map filters. Without any other filter only the ids of the page
+    are fetched, otherwise the walk goes on in growing batches until the page is full or the index is done.
+    """
+    await map_points_index.ensure_loaded()
+    lat, lon = filters.coordinates_filter
+    limit = min(filters.limit or GEO_PAGE_SIZE, PAGE_SIZE_MAX)
+    wanted = filters.offset + limit
+    if filters.nearest_filter:
+        wanted = min(wanted, filters.nearest_filter)
+    nearby = map_points_index.walk(lat, lon, thrash_type, map_id, filters.radius_filter)
+    if not set(params or ()) - NEARBY_INDEX_FILTERS and not getattr(filters, "search_filter", None):
+        page = list(islice(nearby, filters.offset, wanted))
+        rows = await nearby_rows(session, sql, [point_id for point_id, _ in page], params)
+    else:
+        found, rows = [], {}
+        while len(found) < wanted:
+            batch = list(islice(nearby, max(2 * (wanted - len(found)), GEO_PAGE_SIZE)))
+            if not batch:
+                break
+            batch_rows = await nearby_rows(session, sql, [point_id for point_id, _ in batch], params)
+            found.extend(item for item in batch if item[0] in batch_rows)
+            rows.update(batch_rows)
+        page = found[filters.offset:wanted]
+    result = []
+    for point_id, distance in page:
+        for row in rows.get(point_id, []):
+            row["distance"] = round(distance, 1)
+            result.append(row)
+    return result
+
+
 async def update_map_points(session: AsyncSession, map_points: List[MapPointUpdate]):
     updated_points = []
     for map_point in map_points:
@@ -725,11 +886,11 @@ async def update_map_points(session: AsyncSession, map_points: List[MapPointUpda
             if map_point.email:
                 point_to_update.email = map_point.email
             if map_point.coordinates:
-                point_to_update.coordinates = map_point.coordinates
+                point_to_update.coordinates = list(map_point.coordinates)
             if map_point.city:
                 map = await get_map(session, map_city_filter=map_point.city)
                 if map:
-                    point_to_update.map = map
+                    point_to_update.id_map = map.id
             if map_point.accepted_thrash:
                 thrash_list = []
                 for item in map_point.accepted_thrash:
@@ -738,30 +899,44 @@ async def update_map_points(session: AsyncSession, map_points: List[MapPointUpda
                         thrash_list.append(thrash[0])
                 map_point.accepted_thrash = thrash_list
             session.add(point_to_update)
+            if map_point.address or map_point.coordinates:
+                await save_address_coordinates(session, [address_row(point_to_update.address,
+                                                                     point_to_update.coordinates,
+                                                                     ADDRESS_SOURCE_MAP_POINT)])
             updated_points.append(point_to_update)
         except Exception as e:
             await session.rollback()
             logger.error(f"update_map_points exception {e}")
             return
     await session.commit()
+    for point in updated_points:
+        map_points_index.update(point.id, coordinates=point.coordinates, map_id=point.id_map)
+    await invalidation_channel.publish(*[point_invalidation(point.id) for point in updated_points])
+    search_cache.clear()
     return updated_points
 
 
 async def delete_map_points(session: AsyncSession, map_points: List[MapPointDelete]):
-    deleted_points = []
-    for map_point in map_points:
-        try:
-            if not map_point.id:
-                return None
-            point_to_delete = await get_map_point(session, point_id=map_point.id)
-            await session.delete(point_to_delete)
-            deleted_points.append(point_to_delete)
-        except Exception as e:
-            await session.rollback()
-            logger.error(f"delete_map_points exception {e}")
-            return
-    await session.commit()
-    return deleted_points
+    if any(not map_point.id for map_point in map_points):
+        return None
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(map_points):
+            resolved = await bulk.resolve_ids(session, MapPoint.__table__,
+                                              {"id": [map_point.id for map_point in batch]})
+            failed.extend(bulk.failure(map_point, "not found")
+                          for map_point in batch if map_point.id not in resolved["id"])
+            succeeded.extend(await bulk.delete_by_ids(session, MapPoint.__table__, list(resolved["id"])))
+        await session.commit()
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"delete_map_points exception {e}")
+        return
+    for point in succeeded:
+        map_points_index.remove(point["id"])
+    await invalidation_channel.publish(*[point_invalidation(point["id"]) for point in succeeded])
+    search_cache.clear()
+    return bulk.BulkResult(succeeded, failed)
 
 
 async def get_achievements(session: AsyncSession,
@@ -797,17 +972,45 @@ async def create_achievements(session: AsyncSession, achievements: List[Achievem
             await session.rollback()
             logger.error(f"create_achievement exception {e}")
     await session.commit()
-    try:
-        users = await get_users(session, filters=UserGet())
-        for user in users:
-            await sync_users_achievements(session, user_id=user.id)
-    except Exception as e:
-        await session.rollback()
-        logger.debug(f"error when updating users achievements {e}")
-        return
+    await invalidation_channel.invalidate(Achievement.__tablename__)
     return created
 
 
+async def backfill_users_achievements(session: AsyncSession, achievement_ids: List[int], progress=None):
+    """
+    Links every user to the given achievements in chunks of ACHIEVEMENT_BACKFILL_CHUNK users,
+    one INSERT ... SELECT ... ON CONFLICT DO NOTHING and one commit per chunk. The awaited
+    progress(done, total) runs in the chunk's transaction.
+    """
+    users = User.__table__
+    achievements = Achievement.__table__
+    links = UserAchievementLink.__table__
+    total = (await session.execute(select(func.count()).select_from(users))).scalar()
+    if progress:
+        await progress(0, total)
+    done = 0
+    after = 0
+    while True:
+        chunk = select(users.c.id).where(users.c.id > after).order_by(users.c.id) \
+            .limit(ACHIEVEMENT_BACKFILL_CHUNK).subquery()
+        res = await session.execute(select(func.max(chunk.c.id), func.count()).select_from(chunk))
+        upper, size = res.one()
+        if not size:
+            break
+        source = select(users.c.id, achievements.c.id, false()) \
+            .select_from(users.join(achievements, true())) \
+            .where(users.c.id > after, users.c.id <= upper, bulk.any_of(achievements.c.id, achievement_ids))
+        await session.execute(pg_insert(links)
+                              .from_select(["user_id", "achievement_id", "unlocked"], source)
+                              .on_conflict_do_nothing())
+        done += size
+        after = upper
+        if progress:
+            await progress(done, total)
+        await session.commit()
+    return done
+
+
 async def update_achievements(session: AsyncSession, achievements: List[AchievementUpdate]):
     updated = []
     for achievement in achievements:
@@ -829,6 +1032,7 @@ async def update_achievements(session: AsyncSession, achievements: List[Achievem
             await session.rollback()
             continue
     await session.commit()
+    await invalidation_channel.invalidate(Achievement.__tablename__)
     return updated
 
 
@@ -850,182 +1054,454 @@ async def delete_achievements(session: AsyncSession, achievements: List[Achievem
         except Exception as e:
             logger.error(f"delete_achievement exception {e}")
     await session.commit()
+    await invalidation_channel.invalidate(Achievement.__tablename__)
     return deleted_achievements
 
 
+def point_thrash_select():
+    return select(ThrashType.thrash_type, MapPoint.title, Map.city, MapPoint.email,
+                  MapPoint.address, MapPoint.phone_number, MapPoint.website, MapPoint.description,
+                  MapPoint.coordinates, MapPoint.id.label("point_id"), ThrashType.id.label("thrash_type_id")) \
+        .outerjoin_from(MapPoint, PointThrashLink).outerjoin(ThrashType).outerjoin(Map)
+
+
 async def get_point_thrash(session: AsyncSession, filters: PointThrashGet):
     try:
-        sql = select(ThrashType.thrash_type, MapPoint.title, Map.city, MapPoint.email,
-                     MapPoint.address, MapPoint.phone_number, MapPoint.website, MapPoint.description,
-                     MapPoint.coordinates) \
-            .outerjoin_from(MapPoint, PointThrashLink).outerjoin(ThrashType).outerjoin(Map)
-
-        if filters.point_id_filter:
-            sql = sql.where(MapPoint.id == filters.point_id_filter)
-        if filters.thrash_type_filter:
-            sql = sql.where(ThrashType.thrash_type == filters.thrash_type_filter)
-        if filters.title_filter:
-            sql = sql.where(MapPoint.title == filters.title_filter)
-        if filters.phone_number_filter:
-            sql = sql.where(MapPoint.phone_number == filters.phone_number_filter)
-        if filters.email_filter:
-            sql = sql.where(MapPoint.email == filters.email_filter)
-        if filters.address_filter:
-            sql = sql.where(MapPoint.address == filters.address_filter)
-        if filters.coordinates_filter:
-            sql = sql.where(MapPoint.coordinates == filters.coordinates_filter)
-        if filters.website_filter:
-            sql = sql.where(MapPoint.website == filters.website_filter)
-        if filters.city_filter:
-            sql = sql.where(Map.city == filters.city_filter)
-
-        res = await session.exec(sql)
-        return res.all()
+        values = filter_values(filters, POINT_THRASH_FILTERS)
+        values["coordinates_filter"] = list(filters.coordinates_filter) \
+            if filters.coordinates_filter and not is_geo_query(filters) else None
+        key, sql, params = filter_statement("point_thrash", point_thrash_select, POINT_THRASH_FILTERS, values)
+        if is_geo_query(filters):
+            city_map = await get_map(session, map_city_filter=filters.city_filter) if filters.city_filter else None
+            if filters.city_filter and not city_map:
+                return []
+            return await get_nearby(session, sql, filters, filters.thrash_type_filter,
+                                    city_map.id if city_map else None, params)
+        return await fetch_rows(session, sql, POINT_THRASH_KEYS, filters, params, key)
     except Exception as e:
         await session.rollback()
         logger.error(f"get_point_thrash exception {e}")
 
 
-async def get_delivery_requests(session: AsyncSession, filters: DeliveryRequestGet):
-    try:
-        sql = select(DeliveryRequest.id,
-                     DeliveryRequest.address.label("delivery_address"),
-                     DeliveryRequest.create_date,
-                     DeliveryRequest.price,
+def delivery_requests_select(grouped: bool):
+    if grouped:
+        thrash_columns = [func.array_remove(func.array_agg(aggregate_order_by(ThrashType.thrash_type,
+                                                                              ThrashType.thrash_type)),
+                                            None).label("thrash_types")]
+    else:
+        thrash_columns = [ThrashType.thrash_type, ThrashType.id.label("thrash_type_id")]
+    sql = select(DeliveryRequest.id,
+                 DeliveryRequest.address.label("delivery_address"),
+                 DeliveryRequest.create_date,
+                 DeliveryRequest.price,
 
-                     ThrashType.thrash_type,
+                 *thrash_columns,
 
-                     Status.status_name.label("status"),
+                 Status.status_name.label("status"),
 
-                     Courier.name.label("courier_name"),
-                     Courier.surname.label("courier_surname"),
-                     Courier.phone_number.label("courier_phone_number"),
+                 Courier.name.label("courier_name"),
+                 Courier.surname.label("courier_surname"),
+                 Courier.phone_number.label("courier_phone_number"),
 
-                     User.name.label("user_name"),
-                     User.surname.label("user_surname"),
-                     User.phone_number.label("user_phone_number"),
-                     User.username.label("user_username")) \
-            .outerjoin_from(DeliveryRequest, DeliveryThrashLink) \
-            .outerjoin(ThrashType).outerjoin(Courier).outerjoin(Status).outerjoin(User)
+                 User.name.label("user_name"),
+                 User.surname.label("user_surname"),
+                 User.phone_number.label("user_phone_number"),
+                 User.username.label("user_username")) \
+        .outerjoin_from(DeliveryRequest, DeliveryThrashLink) \
+        .outerjoin(ThrashType).outerjoin(Courier).outerjoin(Status).outerjoin(User)
+    if grouped:
+        sql = sql.group_by(DeliveryRequest.id, Status.id, Courier.id, User.id)
+    return sql
 
-        if filters.id_filter:
-            sql = sql.where(DeliveryRequest.id == filters.id_filter)
-        if filters.create_date_from:
-            sql = sql.where(DeliveryRequest.create_date >= filters.create_date_from)
-        if filters.create_date_to:
-            sql = sql.where(DeliveryRequest.create_date <= filters.create_date_to)
-
-        if filters.thrash_type_filter:
-            sql = sql.where(ThrashType.thrash_type == filters.thrash_type_filter)
-        if filters.status_filter:
-            sql = sql.where(Status.status_name == filters.status_filter)
-
-        if filters.courier_name_filter:
-            sql = sql.where(Courier.name == filters.courier_name_filter)
-        if filters.courier_surname_filter:
-            sql = sql.where(Courier.surname == filters.courier_surname_filter)
-        if filters.courier_phone_number_filter:
-            sql = sql.where(Courier.phone_number == filters.courier_phone_number_filter)
-
-        if filters.user_name_filter:
-            sql = sql.where(User.name == filters.user_name_filter)
-        if filters.user_surname_filter:
-            sql = sql.where(User.surname == filters.user_surname_filter)
-        if filters.user_username_filter:
-            sql = sql.where(User.username == filters.user_username_filter)
-        if filters.user_phone_number_filter:
-            sql = sql.where(User.phone_number == filters.user_phone_number_filter)
 
-        res = await session.exec(sql)
-        return res.all()
+async def get_delivery_requests(session: AsyncSession, filters: DeliveryRequestGet):
+    try:
+        values = filter_values(filters, DELIVERY_REQUEST_FILTERS)
+        if filters.grouped:
+            values["grouped_thrash_type_filter"] = values.pop("thrash_type_filter")
+        key, sql, params = filter_statement("delivery_requests", lambda: delivery_requests_select(filters.grouped),
+                                            DELIVERY_REQUEST_FILTERS, values, filters.grouped)
+        keys = DELIVERY_REQUEST_GROUPED_KEYS if filters.grouped else DELIVERY_REQUEST_KEYS
+        if filters.search_filter:
+            condition, rank = search.search_clause(filters.search_mode, filters.search_filter,
+                                                   search.DELIVERY_TRIGRAM_COLUMNS, search.DELIVERY_ADDRESS_DOCUMENT)
+            return await fetch_ranked(session, sql.where(condition), rank, [expression for expression, _ in keys],
+                                      filters, "delivery_requests", params)
+        return await fetch_rows(session, sql, keys, filters, params, key)
     except Exception as e:
         await session.rollback()
         logger.error(f"get_delivery_request exception {e}")
 
 
 async def update_delivery_requests(session: AsyncSession, del_requests: List[DeliveryRequestUpdate]):
-    updated_requests = []
-    for req in del_requests:
-        try:
-            if not req.id_req:
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(del_requests):
+            requests = await bulk.resolve_ids(session, DeliveryRequest.__table__,
+                                              {"id": [req.id_req for req in batch]})
+            statuses = await bulk.resolve_ids(session, Status.__table__,
+                                              {"status_name": [req.status for req in batch]})
+            couriers = await bulk.resolve_ids(session, Courier.__table__,
+                                              {"phone_number": [req.courier_phone for req in batch]})
+            users = await bulk.resolve_ids(session, User.__table__,
+                                           {"phone_number": [req.user_phone for req in batch]})
+            rows = {}
+            for req in batch:
+                target = requests["id"].get(req.id_req)
+                if target is None:
+                    failed.append(bulk.failure(req, "not found"))
+                    continue
+                rows[target] = {
+                    "id": target,
+                    "address": req.address or None,
+                    "create_date": req.create_date or None,
+                    "status_id": statuses["status_name"].get(req.status),
+                    "id_courier": couriers["phone_number"].get(req.courier_phone),
+                    "id_user": users["phone_number"].get(req.user_phone),
+                    "price": float(req.price) if req.price is not None else None,
+                }
+            succeeded.extend(await bulk.update_from_rows(session, DeliveryRequest.__table__, list(rows.values()),
+                                                         DELIVERY_REQUEST_UPDATE_KEYS))
+        await session.commit()
+        search_cache.clear()
+        return bulk.BulkResult(succeeded, failed)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"update_delivery_requests exception {e}")
+        return
+
+
+def naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def ingest_failure(report: dict, line_no: int, item, error: str):
+    report["failed_count"] += 1
+    if len(report["failed"]) < INGEST_MAX_ERRORS:
+        report["failed"].append({"line": line_no, "item": item, "error": error})
+
+
+async def ingest_delivery_request_batch(session: AsyncSession, batch: list, report: dict):
+    """
+    Two lookups for the phones of the whole batch, reference data from the caches, ids taken from the
+    sequence up front so the requests and their link rows both go in with COPY.
+    """
+    try:
+        couriers = (await bulk.resolve_ids(session, Courier.__table__,
+                                           {"phone_number": [request.courier_phone for _, _, request in batch]}))
+        users = (await bulk.resolve_ids(session, User.__table__,
+                                        {"phone_number": [request.user_phone for _, _, request in batch]}))
+        statuses = await status_cache.lookup(name=NEW_REQUEST_STATUS)
+        status_id = statuses[0].id if statuses else None
+        await thrash_type_cache.ensure_loaded()
+        thrash_types = thrash_type_cache.by_name
+        accepted = []
+        for line_no, item, request in batch:
+            courier_id = couriers["phone_number"].get(request.courier_phone)
+            if courier_id is None:
+                ingest_failure(report, line_no, item, "courier not found")
                 continue
-            req_to_update = select(DeliveryRequest).where(DeliveryRequest.id == req.id_req)
-            req_to_update = await session.exec(req_to_update)
-            req_to_update = req_to_update.one()
-            if not req_to_update:
+            unknown = [name for name in dict.fromkeys(request.thrash_types) if name not in thrash_types]
+            if unknown:
+                ingest_failure(report, line_no, item, f"unknown thrash types: {', '.join(unknown)}")
                 continue
-            if req.address:
-                req_to_update.address = req.address
-            if req.create_date:
-                req_to_update.create_date = req.create_date
-            if req.status:
-                status = await get_status(session, status_name_filter=req.status)
-                if status:
-                    req_to_update.status = status[0]
-            if req.courier_phone:
-                courier = await get_courier(session, phone=req.courier_phone)
-                if courier:
-                    req_to_update.req_courier = courier
-            if req.user_phone:
-                user = await get_user(session, phone=req.user_phone)
-                if user:
-                    req_to_update.req_user = user
-            if req.price is not None:
-                req_to_update.price = req.price
-
-            session.add(req_to_update)
-            updated_requests.append(req_to_update)
-        except Exception as e:
-            await session.rollback()
-            logger.error(f"update_delivery_requests exception {e}")
+            accepted.append((line_no, item, request, courier_id))
+        if not accepted:
             return
-    await session.commit()
-    return updated_requests
-
-
-async def delete_delivery_requests(session: AsyncSession, requests: List[DeliveryRequestDelete]):
-    deleted_requests = []
-    for req in requests:
-        try:
-            if not req.req_id:
+        known = await lookup_coordinates(session, [request.address for _, _, request, _ in accepted
+                                                   if not request.coordinates])
+        ids = await bulk.reserve_ids(session, DeliveryRequest.__table__, len(accepted))
+        requests, links = [], []
+        for request_id, (_, _, request, courier_id) in zip(ids, accepted):
+            requests.append((request_id, request.address, request.price or 0.0, naive_utc(request.create_date),
+                             list(request.coordinates) if request.coordinates else known.get(request.address),
+                             courier_id, users["phone_number"].get(request.user_phone), status_id))
+            # DeliveryThrashLink.thrash_type_id references the request and request_id the thrash type
+            links.extend((request_id, thrash_types[name].id) for name in dict.fromkeys(request.thrash_types))
+        await bulk.copy_records(session, DeliveryRequest.__table__,
+                                ["id", "address", "price", "create_date", "coordinates", "id_courier", "id_user",
+                                 "status_id"],
+                                requests)
+        await bulk.copy_records(session, DeliveryThrashLink.__table__, ["thrash_type_id", "request_id"], links)
+        await session.commit()
+        report["created"] += len(accepted)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"ingest_delivery_request_batch exception {e}")
+        for line_no, item, _ in batch:
+            ingest_failure(report, line_no, item, "batch not loaded")
+
+
+async def ingest_delivery_requests(session: AsyncSession, records) -> dict:
+    """
+    records yield (line number, parsed item or None, parse error or None). Rows are validated as they
+    arrive and loaded in INGEST_BATCH_SIZE batches, each committed on its own; the report lists failed lines.
+    """
+    report = {"created": 0, "failed_count": 0, "failed": []}
+    batch = []
+    try:
+        async for line_no, item, error in records:
+            if error is not None:
+                ingest_failure(report, line_no, item, error)
                 continue
-            sql = select(DeliveryRequest).where(DeliveryRequest.id == req.req_id)
-            res = await session.exec(sql)
-            res = res.one_or_none()
-            if not res:
+            try:
+                request = DeliveryRequestCreate.parse_obj(item)
+            except ValidationError as e:
+                ingest_failure(report, line_no, item, "; ".join(
+                    f"{'.'.join(str(loc) for loc in err['loc'])}: {err['msg']}" for err in e.errors()))
                 continue
-            await session.delete(res)
-            deleted_requests.append(res)
-        except Exception as e:
+            batch.append((line_no, item, request))
+            if len(batch) >= INGEST_BATCH_SIZE:
+                await ingest_delivery_request_batch(session, batch, report)
+                batch = []
+        if batch:
+            await ingest_delivery_request_batch(session, batch, report)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"ingest_delivery_requests exception {e}")
+        report["error"] = "ingestion interrupted, the lines after the last reported batch were not loaded"
+    if report["created"]:
+        search_cache.clear()
+    return report
+
+
+async def plan_dispatch(session: AsyncSession) -> Optional[dict]:
+    """
+    Assigns every pending request with coordinates to a courier with a known position, at most
+    DISPATCH_COURIER_CAPACITY requests each, minimising the total distance. Nothing is written.
+    """
+    try:
+        statuses = await status_cache.lookup(name=NEW_REQUEST_STATUS)
+        plan = {"method": "none", "requests": 0, "couriers": 0, "without_coordinates": 0,
+                "assignments": [], "unassigned": [], "total_distance": 0.0}
+        if not statuses:
+            return plan
+        res = await session.execute(select(DeliveryRequest.id, DeliveryRequest.coordinates, DeliveryRequest.id_courier)
+                                    .where(DeliveryRequest.status_id == statuses[0].id).order_by(DeliveryRequest.id))
+        requests = res.all()
+        located = [request for request in requests if request.coordinates and len(request.coordinates) >= 2]
+        res = await session.execute(select(Courier.id, Courier.latitude, Courier.longitude)
+                                    .where(Courier.latitude.isnot(None), Courier.longitude.isnot(None))
+                                    .order_by(Courier.id))
+        couriers = res.all()
+        plan.update(requests=len(located), couriers=len(couriers), without_coordinates=len(requests) - len(located))
+        if not located or not couriers:
+            plan["unassigned"] = [request.id for request in located]
+            return plan
+        # the solve is CPU bound, it runs on the default executor so the other requests keep being served
+        cost, plan["method"], pairs = await asyncio.get_running_loop().run_in_executor(
+            None, assignment.solve, [request.coordinates[:2] for request in located],
+            [(courier.latitude, courier.longitude) for courier in couriers],
+            [DISPATCH_COURIER_CAPACITY] * len(couriers))
+        assigned = set()
+        for row, column in pairs:
+            assigned.add(row)
+            plan["assignments"].append({"request_id": located[row].id, "courier_id": couriers[column].id,
+                                        "previous_courier_id": located[row].id_courier,
+                                        "distance": float(cost[row, column])})
+        plan["total_distance"] = sum(item["distance"] for item in plan["assignments"])
+        plan["unassigned"] = [request.id for row, request in enumerate(located) if row not in assigned]
+        return plan
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"plan_dispatch exception {e}")
+        return None
+
+
+async def apply_dispatch(session: AsyncSession) -> Optional[dict]:
+    """
+    Plans and moves the requests whose courier changed, under a transaction level advisory lock
+    so only one worker dispatches at a time. Requests that left the pending status meanwhile are kept.
+    """
+    try:
+        res = await session.execute(select(func.pg_try_advisory_xact_lock(DISPATCH_LOCK_ID)))
+        if not res.scalar():
             await session.rollback()
-            logger.error(f"delete_delivery_requests exception {e}")
-    await session.commit()
-    return deleted_requests
+            return {"applied": 0, "skipped": "another dispatch is running"}
+        plan = await plan_dispatch(session)
+        if plan is None:
+            return None
+        rows = [{"id": item["request_id"], "id_courier": item["courier_id"]} for item in plan["assignments"]
+                if item["courier_id"] != item["previous_courier_id"]]
+        applied = []
+        if rows:
+            table = DeliveryRequest.__table__
+            values = bulk.unnest_rows(table, rows, ["id", "id_courier"])
+            statuses = await status_cache.lookup(name=NEW_REQUEST_STATUS)
+            res = await session.execute(update(table)
+                                        .where(table.c.id == values.c.id, table.c.status_id == statuses[0].id)
+                                        .values(id_courier=values.c.id_courier).returning(table.c.id))
+            applied = res.scalars().all()
+        await session.commit()
+        if applied:
+            search_cache.clear()
+        plan["applied"] = len(applied)
+        return plan
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"apply_dispatch exception {e}")
+        return None
+
+
+async def delete_delivery_requests(session: AsyncSession, requests: List[DeliveryRequestDelete]):
+    succeeded, failed = [], []
+    try:
+        for batch in bulk.chunked(requests):
+            resolved = await bulk.resolve_ids(session, DeliveryRequest.__table__,
+                                              {"id": [req.req_id for req in batch]})
+            failed.extend(bulk.failure(req, "not found") for req in batch if req.req_id not in resolved["id"])
+            succeeded.extend(await bulk.delete_by_ids(session, DeliveryRequest.__table__, list(resolved["id"])))
+        await session.commit()
+        search_cache.clear()
+        return bulk.BulkResult(succeeded, failed)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"delete_delivery_requests exception {e}")
+
+
+def address_row(address: Optional[str], coordinates, source: str) -> Optional[dict]:
+    key = normalise_address(address or "")
+    if not key or not coordinates or len(coordinates) < 2:
+        return None
+    return {"address": key, "coordinates": [float(coordinates[0]), float(coordinates[1])], "source": source,
+            "updated_at": datetime.utcnow()}
+
+
+async def save_address_coordinates(session: AsyncSession, rows: List[dict]) -> List[dict]:
+    """
+    Upserts address_row() dicts without committing. Coordinates entered by an operator are never
+    overwritten by ones taken from map points.
+    """
+    rows = list({row["address"]: row for row in rows if row}.values())
+    if not rows:
+        return []
+    table = AddressCoordinates.__table__
+    saved = []
+    for batch in bulk.chunked(rows):
+        stmt = pg_insert(table).values(batch)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.address],
+            set_={"coordinates": stmt.excluded.coordinates, "source": stmt.excluded.source,
+                  "updated_at": stmt.excluded.updated_at},
+            where=(stmt.excluded.source == ADDRESS_SOURCE_OPERATOR) | (table.c.source != ADDRESS_SOURCE_OPERATOR))
+        res = await session.execute(stmt.returning(*table.c))
+        saved.extend(dict(row._mapping) for row in res.all())
+    address_cache.invalidate(*[row["address"] for row in rows])
+    return saved
+
+
+async def create_address_coordinates(session: AsyncSession, items: List[AddressCoordinatesCreate]):
+    try:
+        saved = await save_address_coordinates(
+            session, [address_row(item.address, item.coordinates, ADDRESS_SOURCE_OPERATOR) for item in items])
+        await session.commit()
+        return saved
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"create_address_coordinates exception {e}")
+        return None
+
+
+async def lookup_coordinates(session: AsyncSession, addresses: List[str]) -> dict:
+    """
+    address -> [lat, lon] or None, the LRU first and one query for everything it misses.
+    """
+    keys = {address: normalise_address(address or "") for address in addresses}
+    found = {}
+    missing = []
+    for key in dict.fromkeys(keys.values()):
+        coordinates = address_cache.get(key, _MISSING)
+        if coordinates is _MISSING:
+            missing.append(key)
+        else:
+            found[key] = coordinates
+    if missing:
+        table = AddressCoordinates.__table__
+        res = await session.execute(select(table.c.address, table.c.coordinates)
+                                    .where(bulk.any_of(table.c.address, missing)))
+        loaded = {row.address: row.coordinates for row in res.all()}
+        for key in missing:
+            found[key] = loaded.get(key)
+            address_cache.set(key, found[key])
+    return {address: found.get(key) for address, key in keys.items()}
+
+
+async def get_address_coordinates(session: AsyncSession, addresses: List[str]):
+    try:
+        return await lookup_coordinates(session, addresses)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"get_address_coordinates exception {e}")
+        return None
+
+
+async def sync_map_point_addresses(session: AsyncSession) -> Optional[int]:
+    try:
+        res = await session.execute(select(MapPoint.address, MapPoint.coordinates).where(MapPoint.address.isnot(None)))
+        rows = [address_row(row.address, row.coordinates, ADDRESS_SOURCE_MAP_POINT) for row in res.all()]
+        saved = await save_address_coordinates(session, rows)
+        await session.commit()
+        return len(saved)
+    except Exception as e:
+        await session.rollback()
+        logger.error(f"sync_map_point_addresses exception {e}")
+        return None
+
+
+def delivery_coordinates(request: DeliveryRequestCreate):
+    coordinates_type = DeliveryRequest.__table__.c.coordinates.type
+    if request.coordinates:
+        return literal(list(request.coordinates), coordinates_type)
+    key = normalise_address(request.address)
+    cached = address_cache.get(key, _MISSING)
+    if cached is not _MISSING:
+        return literal(cached, coordinates_type)
+    return select(AddressCoordinates.coordinates).where(AddressCoordinates.address == key).scalar_subquery()
 
 
 async def create_delivery_request(session: AsyncSession, request: DeliveryRequestCreate):
+    """
+    One statement: the courier and user are resolved by subqueries, the status and thrash types come from
+    the caches, the request is inserted with RETURNING and its link rows by a second data-modifying CTE.
+    None when the courier or any thrash type is unknown. create_date is stored as naive UTC and a missing
+    price as 0, like ingested requests.
+    """
     try:
-        user = await get_user(session, phone=request.user_phone)
-        courier = await get_courier(session, phone=request.courier_phone)
-        if not courier:
+        columns = DeliveryRequest.__table__.c
+        await thrash_type_cache.ensure_loaded()
+        thrash_types = [thrash_type_cache.by_name.get(name) for name in dict.fromkeys(request.thrash_types)]
+        if not all(thrash_types):
             return None
-        request_to_create = DeliveryRequest()
-        request_to_create.req_user = user
-        request_to_create.req_courier = courier
-        request_to_create.create_date = request.create_date
-        request_to_create.address = request.address
-        request_to_create.price = request.price
-        request_status = await get_status(session, status_name_filter="в ожидании")
-        if request_status is not None:
-            request_to_create.status = request_status[0]
-        for thrash_type in request.thrash_types:
-            thrash_obj = await get_thrash_type(session, thrash_type_name_filter=thrash_type)
-            if thrash_obj is not None:
-                request_to_create.thrash_types.append(thrash_obj[0])
-        session.add(request_to_create)
+        statuses = await status_cache.lookup(name=NEW_REQUEST_STATUS)
+        source = select(literal(request.address, columns.address.type),
+                        literal(request.price or 0.0, columns.price.type),
+                        literal(naive_utc(request.create_date), columns.create_date.type),
+                        delivery_coordinates(request), Courier.id,
+                        select(User.id).where(User.phone_number == request.user_phone).scalar_subquery(),
+                        literal(statuses[0].id if statuses else None, columns.status_id.type)) \
+            .where(Courier.phone_number == request.courier_phone)
+        created = pg_insert(DeliveryRequest) \
+            .from_select(["address", "price", "create_date", "coordinates", "id_courier", "id_user", "status_id"],
+                         source) \
+            .returning(*columns) \
+            .cte("created")
+        # DeliveryThrashLink.thrash_type_id references the request and request_id the thrash type
+        links = pg_insert(DeliveryThrashLink) \
+            .from_select(["thrash_type_id", "request_id"],
+                         select(created.c.id, ThrashType.id)
+                         .where(ThrashType.id.in_([thrash_type.id for thrash_type in thrash_types] or [None]))) \
+            .returning(DeliveryThrashLink.request_id) \
+            .cte("links")
+        res = await session.execute(select(*created.c, select(func.count()).select_from(links)
+                                           .scalar_subquery().label("thrash_links")))
+        row = res.first()
         await session.commit()
-        await session.refresh(request_to_create)
-        return request_to_create
+        if row is None:
+            return None
+        search_cache.clear()
+        return DeliveryRequest(**{column.name: row._mapping[column.name] for column in columns})
     except Exception as e:
         await session.rollback()
         logger.error(f"create_delivery_request exception {e}")
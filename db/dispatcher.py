@@ -1,14 +1,82 @@
-import databases
+import asyncio
+import itertools
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from typing import List, Optional
+
+from alembic.config import Config
+from alembic.script import ScriptDirectory
+from fastapi import Request
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
-from settings import DBConfig
+from settings import DBConfig, READINESS_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini")
+
+
+class PoolWaitStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.timeouts = 0
+
+    def record(self, wait: float, timed_out: bool = False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if timed_out:
+                self.timeouts += 1
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.monotonic()
+        timed_out = True
+        try:
+            conn = super()._do_get()
+            timed_out = False
+            return conn
+        finally:
+            pool_wait_stats.record(time.monotonic() - started, timed_out)
+
+
+def make_engine(url: str, poolclass=AsyncAdaptedQueuePool, server_settings: dict = None):
+    connect_args = {"prepared_statement_cache_size": DBConfig.DB_STATEMENT_CACHE_SIZE}
+    if server_settings:
+        connect_args["server_settings"] = server_settings
+    return create_async_engine(
+        url,
+        echo=DBConfig.DB_ECHO,
+        future=True,
+        poolclass=poolclass,
+        pool_size=DBConfig.DB_POOL_SIZE,
+        max_overflow=DBConfig.DB_MAX_OVERFLOW,
+        pool_timeout=DBConfig.DB_POOL_TIMEOUT,
+        pool_recycle=DBConfig.DB_POOL_RECYCLE,
+        pool_pre_ping=DBConfig.DB_POOL_PRE_PING,
+        connect_args=connect_args,
+    )
+
 
-database = databases.Database(DBConfig.DB_URL)
+engine = make_engine(DBConfig.DB_URL, poolclass=InstrumentedQueuePool)
 
-engine = create_async_engine(DBConfig.DB_URL, echo=True, future=True)
+async_session = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 
 async def init_db():
@@ -21,10 +89,182 @@ async def drop_db():
         await conn.run_sync(SQLModel.metadata.drop_all)
 
 
+class SchemaState:
+    def __init__(self):
+        self.ok = False
+        self.revisions = set()
+        self.heads = set()
+
+    def dict(self) -> dict:
+        return {"ok": self.ok, "revisions": sorted(self.revisions), "heads": sorted(self.heads)}
+
+
+schema_state = SchemaState()
+
+
+def migration_heads() -> set:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    return set(ScriptDirectory.from_config(config).get_heads())
+
+
+async def check_schema(timeout: float = READINESS_TIMEOUT) -> bool:
+    """
+    Compares alembic_version with the migration heads instead of running create_all on every boot,
+    the result is kept in schema_state so readiness probes do not repeat it once the schema is OK.
+    An unreachable database counts as not ready after timeout seconds.
+    """
+    if schema_state.ok:
+        return True
+    if not schema_state.heads:
+        schema_state.heads = migration_heads()
+
+    async def revisions():
+        async with engine.connect() as conn:
+            res = await conn.execute(text("SELECT version_num FROM alembic_version"))
+            return set(res.scalars().all())
+
+    try:
+        schema_state.revisions = await asyncio.wait_for(revisions(), timeout)
+    except Exception as e:
+        logger.error(f"check_schema exception {e!r}")
+        schema_state.revisions = set()
+    schema_state.ok = schema_state.revisions == schema_state.heads
+    if not schema_state.ok:
+        logger.error(f"database is at {sorted(schema_state.revisions)}, migrations head is "
+                     f"{sorted(schema_state.heads)}, run alembic upgrade head")
+    return schema_state.ok
+
+
+async def ping(timeout: float = READINESS_TIMEOUT):
+    async def select_one():
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    await asyncio.wait_for(select_one(), timeout)
+
+
 async def get_session() -> AsyncSession:
-    async_session = sessionmaker(
-        engine, class_=AsyncSession, expire_on_commit=False
-    )
     async with async_session() as session:
         yield session
 
+
+REPLICA_STATE = text(
+    "SELECT pg_is_in_recovery() AS in_recovery, "
+    "CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END AS lag"
+)
+
+
+class Replica:
+    def __init__(self, name: str, url: str):
+        self.name = name
+        self.engine = make_engine(url, server_settings={"default_transaction_read_only": "on"})
+        self.sessionmaker = sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.healthy = False
+        self.in_recovery: Optional[bool] = None
+        self.lag: Optional[float] = None
+        self.error: Optional[str] = None
+        self.checked_at: Optional[float] = None
+
+    async def check(self, timeout: float = READINESS_TIMEOUT):
+        try:
+            async def state():
+                async with self.engine.connect() as conn:
+                    return (await conn.execute(REPLICA_STATE)).one()
+
+            row = await asyncio.wait_for(state(), timeout)
+            self.in_recovery = row.in_recovery
+            self.lag = float(row.lag or 0)
+            self.error = None if self.lag <= DBConfig.DB_REPLICA_MAX_LAG else f"lag {self.lag:.1f}s"
+        except Exception as e:
+            self.error = repr(e)
+        if self.error is not None and (self.healthy or self.checked_at is None):
+            logger.warning(f"replica {self.name} is unhealthy: {self.error}")
+        elif self.error is None and not self.healthy:
+            logger.info(f"replica {self.name} is healthy")
+        self.healthy = self.error is None
+        self.checked_at = time.time()
+
+    def stats(self) -> dict:
+        return {"healthy": int(self.healthy), "lag": self.lag, "checked_at": self.checked_at}
+
+
+class ReplicaSet:
+    """
+    Round robin over the replicas that passed their last check: reachable within READINESS_TIMEOUT
+    and at most DB_REPLICA_MAX_LAG seconds behind. pick() returns None when there is none.
+    """
+
+    def __init__(self, urls: List[str]):
+        self.replicas = [Replica(f"replica{i}", url) for i, url in enumerate(urls)]
+        self._next = itertools.count()
+
+    def __bool__(self):
+        return bool(self.replicas)
+
+    def pick(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        return healthy[next(self._next) % len(healthy)]
+
+    async def check(self):
+        await asyncio.gather(*[replica.check() for replica in self.replicas])
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    def stats(self) -> dict:
+        return {replica.name: replica.stats() for replica in self.replicas}
+
+
+replica_set = ReplicaSet(DBConfig.DB_REPLICA_URLS)
+
+# set per request by ReadYourWritesMiddleware, True once a session committed during the request
+request_committed: ContextVar[Optional[list]] = ContextVar("request_committed", default=None)
+LAST_WRITE_COOKIE = "ecogram_last_write"
+
+
+@event.listens_for(Session, "after_commit")
+def mark_committed(session):
+    committed = request_committed.get()
+    if committed is not None:
+        committed.append(True)
+
+
+def reads_own_writes(request: Request) -> bool:
+    if not DBConfig.DB_READ_YOUR_WRITES:
+        return False
+    try:
+        wrote_at = float(request.cookies.get(LAST_WRITE_COOKIE) or 0)
+    except ValueError:
+        return False
+    return time.time() - wrote_at < DBConfig.DB_READ_YOUR_WRITES
+
+
+async def get_read_session(request: Request) -> AsyncSession:
+    """
+    Session for read-only routes: a healthy replica unless the client wrote within DB_READ_YOUR_WRITES
+    seconds, the primary otherwise. Replica connections run every transaction READ ONLY.
+    """
+    replica = replica_set.pick() if replica_set and not reads_own_writes(request) else None
+    async with (replica.sessionmaker if replica else async_session)() as session:
+        yield session
+
+
+def pool_status() -> dict:
+    pool = engine.sync_engine.pool
+    checkouts = pool_wait_stats.checkouts
+    return {
+        "pool_size": pool.size(),
+        "max_overflow": DBConfig.DB_MAX_OVERFLOW,
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(pool.overflow(), 0),
+        "checkouts": checkouts,
+        "timeouts": pool_wait_stats.timeouts,
+        "avg_wait_ms": round(pool_wait_stats.total_wait / checkouts * 1000, 3) if checkouts else 0.0,
+        "max_wait_ms": round(pool_wait_stats.max_wait * 1000, 3),
+    }
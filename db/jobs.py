@@ -0,0 +1,168 @@
+import asyncio
+import contextvars
+import logging
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import or_, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from db import crud
+from db.dispatcher import async_session
+from db.models.sql_models import Job
+from settings import JOB_STALE_AFTER
+
+logger = logging.getLogger(__name__)
+
+ACHIEVEMENTS_BACKFILL = "achievements_backfill"
+
+# job id -> task of the jobs this worker runs
+running: Dict[str, asyncio.Task] = {}
+
+
+def epoch(value: Optional[datetime]) -> Optional[float]:
+    # the columns hold naive UTC
+    return value.replace(tzinfo=timezone.utc).timestamp() if value else None
+
+
+def job_dict(job: Job) -> dict:
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "done": job.done,
+        "total": job.total,
+        "error": job.error,
+        "started_at": epoch(job.started_at),
+        "finished_at": epoch(job.finished_at),
+    }
+
+
+async def create_job(session: AsyncSession, kind: str, **params) -> Job:
+    job = Job(id=uuid.uuid4().hex, kind=kind, params=params, updated_at=datetime.utcnow())
+    session.add(job)
+    await session.commit()
+    return job
+
+
+async def get_job(session: AsyncSession, job_id: str) -> Optional[Job]:
+    return await session.get(Job, job_id)
+
+
+async def set_job(session: AsyncSession, job_id: str, **values):
+    await session.execute(update(Job).where(Job.id == job_id).values(updated_at=datetime.utcnow(), **values))
+
+
+async def run_achievements_backfill(job_id: str, achievement_ids: List[int]):
+    async with async_session() as session:
+        async def progress(done: int, total: int):
+            await set_job(session, job_id, done=done, total=total)
+
+        try:
+            await set_job(session, job_id, status="running", done=0, started_at=datetime.utcnow())
+            await session.commit()
+            await crud.backfill_users_achievements(session, achievement_ids, progress)
+            await set_job(session, job_id, status="done", finished_at=datetime.utcnow())
+            await session.commit()
+        except asyncio.CancelledError:
+            await session.rollback()
+            raise
+        except Exception as e:
+            logger.error(f"run_achievements_backfill exception {e}")
+            await session.rollback()
+            await set_job(session, job_id, status="failed", error=str(e), finished_at=datetime.utcnow())
+            await session.commit()
+
+
+RUNNERS = {ACHIEVEMENTS_BACKFILL: run_achievements_backfill}
+
+
+def start_job(job: Job):
+    """
+    Runs the job in a task of its own, outside the request that created it: the task starts from an empty
+    context, so its queries are not counted against the request's metrics.
+    """
+    coro = RUNNERS[job.kind](job.id, **job.params)
+    task = contextvars.Context().run(asyncio.create_task, coro)
+    running[job.id] = task
+    task.add_done_callback(lambda _: running.pop(job.id, None))
+
+
+async def resume_jobs():
+    """
+    Restarts the jobs left interrupted by a worker shutdown, and the ones whose worker died: pending or running
+    with no progress for JOB_STALE_AFTER seconds. The UPDATE claims them, so each is resumed by one worker.
+    The runners are idempotent and start over.
+    """
+    stale = datetime.utcnow() - timedelta(seconds=JOB_STALE_AFTER)
+    async with async_session() as session:
+        try:
+            res = await session.execute(
+                update(Job)
+                .where(Job.kind.in_(list(RUNNERS)),
+                       or_(Job.status == "interrupted",
+                           Job.status.in_(["pending", "running"]) & (Job.updated_at < stale)))
+                .values(status="pending", updated_at=datetime.utcnow())
+                .returning(Job.id, Job.kind, Job.params))
+            claimed = res.all()
+            await session.commit()
+        except Exception as e:
+            logger.error(f"resume_jobs exception {e}")
+            await session.rollback()
+            return
+    for job_id, kind, params in claimed:
+        logger.info(f"resuming {kind} job {job_id}")
+        start_job(Job(id=job_id, kind=kind, params=params))
+
+
+async def stop_jobs():
+    """
+    Cancels the jobs of this worker and marks them interrupted, so the next worker to start resumes them.
+    """
+    tasks = dict(running)
+    for task in tasks.values():
+        task.cancel()
+    await asyncio.gather(*tasks.values(), return_exceptions=True)
+    if not tasks:
+        return
+    async with async_session() as session:
+        try:
+            await session.execute(update(Job).where(Job.id.in_(list(tasks)), Job.status.in_(["pending", "running"]))
+                                  .values(status="interrupted", updated_at=datetime.utcnow()))
+            await session.commit()
+        except Exception as e:
+            logger.error(f"stop_jobs exception {e}")
+            await session.rollback()
+
+
+async def run_dispatch():
+    async with async_session() as session:
+        result = await crud.apply_dispatch(session)
+    if result and result.get("applied"):
+        logger.info(f"dispatch moved {result['applied']} requests, {len(result['unassigned'])} left unassigned")
+    return result
+
+
+periodic_tasks: List[asyncio.Task] = []
+
+
+async def run_periodically(interval: float, func):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await func()
+        except Exception as e:
+            logger.error(f"run_periodically {func.__name__} exception {e}")
+
+
+def start_periodic(interval: float, func):
+    periodic_tasks.append(asyncio.create_task(run_periodically(interval, func)))
+
+
+async def stop_periodic():
+    tasks = list(periodic_tasks)
+    periodic_tasks.clear()
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
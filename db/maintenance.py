@@ -0,0 +1,64 @@
+from typing import List
+
+from sqlalchemy import text
+
+from db.dispatcher import engine
+
+UNUSED_INDEXES = text("""
+    SELECT s.relname AS table_name, s.indexrelname AS index_name, s.idx_scan AS scans,
+           pg_size_pretty(pg_relation_size(s.indexrelid)) AS size
+    FROM pg_stat_user_indexes s
+    JOIN pg_index i ON i.indexrelid = s.indexrelid
+    WHERE s.idx_scan <= :max_scans AND NOT i.indisunique AND NOT i.indisprimary
+    ORDER BY pg_relation_size(s.indexrelid) DESC, s.relname, s.indexrelname
+""")
+
+SEQ_SCANNED_TABLES = text("""
+    SELECT relname AS table_name, seq_scan, seq_tup_read, coalesce(idx_scan, 0) AS idx_scan, n_live_tup AS live_rows
+    FROM pg_stat_user_tables
+    WHERE seq_scan > coalesce(idx_scan, 0) AND n_live_tup >= :min_rows
+    ORDER BY seq_tup_read DESC
+""")
+
+UNINDEXED_FOREIGN_KEYS = text("""
+    SELECT c.conrelid::regclass::text AS table_name, c.conname AS constraint_name,
+           array_to_string(array(SELECT a.attname FROM unnest(c.conkey) AS k(attnum)
+                                 JOIN pg_attribute a ON a.attrelid = c.conrelid AND a.attnum = k.attnum), ', ')
+               AS columns
+    FROM pg_constraint c
+    WHERE c.contype = 'f' AND NOT EXISTS (
+        SELECT 1 FROM pg_index i
+        WHERE i.indrelid = c.conrelid
+          AND (string_to_array(i.indkey::text, ' ')::int2[])[1:array_length(c.conkey, 1)] @> c.conkey
+          AND (string_to_array(i.indkey::text, ' ')::int2[])[1:array_length(c.conkey, 1)] <@ c.conkey
+    )
+    ORDER BY 1, 2
+""")
+
+STATS_RESET = text("SELECT stats_reset FROM pg_stat_database WHERE datname = current_database()")
+
+
+async def index_report(max_scans: int = 0, min_rows: int = 1000) -> dict:
+    """
+    Unused indexes come from pg_stat_user_indexes, so they are only meaningful after the stats
+    have covered a representative period of traffic (see stats_reset).
+    Missing ones are guessed from tables read mostly by sequential scans and from foreign keys
+    that no index starts with.
+    """
+    async with engine.connect() as conn:
+        stats_reset = (await conn.execute(STATS_RESET)).scalar()
+        unused = await conn.execute(UNUSED_INDEXES, {"max_scans": max_scans})
+        seq_scanned = await conn.execute(SEQ_SCANNED_TABLES, {"min_rows": min_rows})
+        foreign_keys = await conn.execute(UNINDEXED_FOREIGN_KEYS)
+        report = {
+            "stats_reset": stats_reset,
+            "unused": rows_of(unused),
+            "seq_scanned": rows_of(seq_scanned),
+            "unindexed_foreign_keys": rows_of(foreign_keys),
+        }
+    await engine.dispose()
+    return report
+
+
+def rows_of(result) -> List[dict]:
+    return [dict(row._mapping) for row in result.all()]
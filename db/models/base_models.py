@@ -1,5 +1,5 @@
 from datetime import datetime, date
-from typing import Optional, NamedTuple, List
+from typing import Optional, NamedTuple, List, Literal
 
 import pytz
 from phonenumbers import (
@@ -11,11 +11,17 @@ from phonenumbers import (
 from pydantic import validator, ValidationError
 from sqlmodel import SQLModel
 
-from src.views.security import get_password_hash
+from settings import SPATIAL_MAX_RADIUS
 
 utc = pytz.UTC
 
 
+def check_radius(cls, radius: Optional[float]):
+    if radius is not None and not 0 < radius <= SPATIAL_MAX_RADIUS:
+        raise ValueError(f"radius_filter must be more than 0 and at most {SPATIAL_MAX_RADIUS:g} metres")
+    return radius
+
+
 class Point(NamedTuple):
     x: float
     y: float
@@ -90,13 +96,16 @@ class UserAchievementUpdate(SQLModel):
     user_id: int
     achievement_id: int
     unlocked: bool = False
-    unlock_date: datetime
+    unlock_date: Optional[datetime] = None
 
-    @validator("unlock_date")
-    def unlock_date_validator(cls, date: datetime, values):
-        if values.get("unlocked"):
-            return date
-        raise ValidationError
+    @validator("unlock_date", always=True)
+    def unlock_date_validator(cls, date: Optional[datetime], values):
+        # unlocked=False locks the achievement again and clears the date
+        if not values.get("unlocked"):
+            return None
+        if date is None:
+            raise ValueError("unlock_date is required when unlocked")
+        return date
 
 
 class PersonBase(SQLModel):
@@ -126,7 +135,19 @@ class UserCreate(PersonBase):
     password: str
 
 
-class PersonGet(SQLModel):
+class PageGet(SQLModel):
+    limit: Optional[int] = None
+    after: Optional[str] = None
+    stream: bool = False
+
+
+class SearchGet(PageGet):
+    search_filter: Optional[str] = None
+    search_mode: Literal["auto", "prefix", "fuzzy", "fulltext"] = "auto"
+    offset: int = 0
+
+
+class PersonGet(PageGet):
     id_filter: Optional[int] = None
     phone_filter: Optional[str] = None
     username_filter: Optional[str] = None
@@ -230,6 +251,9 @@ class StatusDelete(SQLModel):
 class CourierBase(PersonBase):
     delivery_count: Optional[int] = None
     salary: Optional[float] = None
+    # last reported position, used to dispatch pending requests
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
 
 
 class CourierCreate(CourierBase):
@@ -237,10 +261,10 @@ class CourierCreate(CourierBase):
     password: str
 
     @validator("password")
-    def hash_password(cls, password):
+    def check_password(cls, password):
         if not password:
             raise ValidationError
-        return get_password_hash(password)
+        return password
 
 
 class CourierGet(PersonGet):
@@ -275,13 +299,22 @@ class DeliveryRequestCreate(SQLModel):
     address: str
     create_date: datetime
     thrash_types: List[str]
-    price: Optional[str] = 0.0
+    price: Optional[float] = 0.0
+    coordinates: Optional[Point] = None
 
     class Config:
         arbitrary_types_allowed = True
 
 
-class DeliveryRequestGet(SQLModel):
+class AddressCoordinatesCreate(SQLModel):
+    address: str
+    coordinates: Point
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class DeliveryRequestGet(SearchGet):
     id_filter: Optional[int] = None
     address_filter: Optional[str] = None
     create_date_from: Optional[datetime] = None
@@ -295,6 +328,7 @@ class DeliveryRequestGet(SQLModel):
     user_surname_filter: Optional[str] = None
     user_name_filter: Optional[str] = None
     user_username_filter: Optional[str] = None
+    grouped: bool = False
 
 
 class DeliveryRequestUpdate(SQLModel):
@@ -359,7 +393,7 @@ class MapPointBase(SQLModel):
         arbitrary_types_allowed = True
 
 
-class MapPointGet(SQLModel):
+class MapPointGet(SearchGet):
     id_filter: Optional[int] = None
     title_filter: Optional[str] = None
     address_filter: Optional[str] = None
@@ -367,9 +401,15 @@ class MapPointGet(SQLModel):
     email_filter: Optional[str] = None
     website_filter: Optional[str] = None
     coordinates_filter: Optional[Point] = None
+    # metres, at most SPATIAL_MAX_RADIUS; nearest_filter also only finds points within SPATIAL_MAX_RADIUS
+    radius_filter: Optional[float] = None
+    nearest_filter: Optional[int] = None
+    thrash_type_filter: Optional[str] = None
     city_map_filter: Optional[str] = None
     # accepted_thrash_filter: Optional[List[str]] = None
 
+    _check_radius = validator("radius_filter", allow_reuse=True)(check_radius)
+
 
 class MapPointCreate(MapPointBase):
     city: Optional[str] = None
@@ -389,7 +429,7 @@ class MapPointUpdate(MapPointBase):
     accepted_thrash: List[str] = None
 
 
-class PointThrashGet(SQLModel):
+class PointThrashGet(PageGet):
     point_id_filter: Optional[int] = None
     thrash_type_filter: Optional[str] = None
     title_filter: Optional[str] = None
@@ -399,3 +439,9 @@ class PointThrashGet(SQLModel):
     phone_number_filter: Optional[str] = None
     website_filter: Optional[str] = None
     coordinates_filter: Point = None
+    # metres, at most SPATIAL_MAX_RADIUS; nearest_filter also only finds points within SPATIAL_MAX_RADIUS
+    radius_filter: Optional[float] = None
+    nearest_filter: Optional[int] = None
+    offset: int = 0
+
+    _check_radius = validator("radius_filter", allow_reuse=True)(check_radius)
@@ -1,10 +1,13 @@
-from sqlalchemy import UniqueConstraint
+from sqlalchemy import UniqueConstraint, Column, Float, Index
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlmodel import Field, Relationship
 
 from db.models.base_models import *
 
 
 class UserAchievementLink(SQLModel, table=True):
+    __table_args__ = (Index("ix_userachievementlink_achievement_id", "achievement_id"),)
+
     user_id: Optional[int] = Field(default=None, foreign_key="user.id", primary_key=True)
     achievement_id: Optional[int] = Field(default=None, foreign_key="achievement.id", primary_key=True)
     unlock_date: Optional[datetime]
@@ -12,11 +15,15 @@ class UserAchievementLink(SQLModel, table=True):
 
 
 class DeliveryThrashLink(SQLModel, table=True):
+    __table_args__ = (Index("ix_deliverythrashlink_request_id", "request_id", "thrash_type_id"),)
+
     thrash_type_id: Optional[int] = Field(default=None, foreign_key="deliveryrequest.id", primary_key=True)
     request_id: Optional[int] = Field(default=None, foreign_key="thrashtype.id", primary_key=True)
 
 
 class PointThrashLink(SQLModel, table=True):
+    __table_args__ = (Index("ix_pointthrashlink_map_point_id", "map_point_id", "thrash_type_id"),)
+
     thrash_type_id: Optional[int] = Field(default=None, foreign_key="thrashtype.id", primary_key=True)
     map_point_id: Optional[int] = Field(default=None, foreign_key="mappoint.id", primary_key=True)
 
@@ -36,7 +43,13 @@ class Role(RoleBase, table=True):
 
 
 class User(UserBase, table=True):
-    __table_args__ = (UniqueConstraint("phone_number"), UniqueConstraint("username"),)
+    __table_args__ = (
+        UniqueConstraint("phone_number"),
+        UniqueConstraint("username"),
+        Index("ix_user_surname_name", "surname", "name"),
+        Index("ix_user_birthday", "birthday"),
+        Index("ix_user_role_id", "role_id"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     password: str
@@ -52,7 +65,14 @@ class User(UserBase, table=True):
 
 
 class Courier(CourierBase, table=True):
-    __table_args__ = (UniqueConstraint("phone_number"), UniqueConstraint("username"),)
+    __table_args__ = (
+        UniqueConstraint("phone_number"),
+        UniqueConstraint("username"),
+        Index("ix_courier_surname_name", "surname", "name"),
+        Index("ix_courier_birthday", "birthday"),
+        Index("ix_courier_salary", "salary"),
+        Index("ix_courier_delivery_count", "delivery_count"),
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     password: str
@@ -72,11 +92,20 @@ class ThrashType(ThrashTypeBase, table=True):
 
 
 class Status(StatusBase, table=True):
+    __table_args__ = (Index("ix_status_status_name", "status_name"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     request_statuses: List["DeliveryRequest"] = Relationship(back_populates="status")
 
 
 class DeliveryRequest(DeliveryRequestBase, table=True):
+    __table_args__ = (
+        Index("ix_deliveryrequest_create_date", "create_date"),
+        Index("ix_deliveryrequest_status_id_create_date", "status_id", "create_date"),
+        Index("ix_deliveryrequest_id_courier_create_date", "id_courier", "create_date"),
+        Index("ix_deliveryrequest_id_user_create_date", "id_user", "create_date"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
 
     id_courier: Optional[int] = Field(default=None, foreign_key="courier.id")
@@ -88,19 +117,65 @@ class DeliveryRequest(DeliveryRequestBase, table=True):
     status_id: Optional[int] = Field(default=None, foreign_key="status.id")
     status: Status = Relationship(back_populates="request_statuses")
 
+    coordinates: Optional[List[float]] = Field(default=None, sa_column=Column(ARRAY(Float), nullable=True))
+
     thrash_types: List[ThrashType] = Relationship(back_populates='requests_with_thrash_type',
                                                   link_model=DeliveryThrashLink)
 
 
 class Map(MapBase, table=True):
+    __table_args__ = (Index("ix_map_city", "city"),)
+
     id: Optional[int] = Field(default=None, primary_key=True)
     points: List["MapPoint"] = Relationship(back_populates="map")
 
 
 class MapPoint(MapPointBase, table=True):
+    __table_args__ = (
+        Index("ix_mappoint_id_map", "id_map"),
+        Index("ix_mappoint_title", "title"),
+        Index("ix_mappoint_address", "address"),
+        Index("ix_mappoint_phone_number", "phone_number"),
+        Index("ix_mappoint_email", "email"),
+        Index("ix_mappoint_website", "website"),
+    )
+
     id: Optional[int] = Field(default=None, primary_key=True)
+    coordinates: List[float] = Field(sa_column=Column(ARRAY(Float), nullable=False))
 
     id_map: Optional[int] = Field(default=None, foreign_key="map.id")
     map: Map = Relationship(back_populates="points")
 
     accepted_thrash: List[ThrashType] = Relationship(back_populates="map_points", link_model=PointThrashLink)
+
+
+class AddressCoordinates(SQLModel, table=True):
+    """
+    Known coordinates of delivery addresses, keyed by normalise_address(address).
+    """
+    __table_args__ = (UniqueConstraint("address"),)
+
+    id: Optional[int] = Field(default=None, primary_key=True)
+    address: str
+    coordinates: List[float] = Field(sa_column=Column(ARRAY(Float), nullable=False))
+    source: str = "operator"
+    updated_at: Optional[datetime] = None
+
+
+class Job(SQLModel, table=True):
+    """
+    Background jobs, kept in the database so every worker can report them and a restarted worker
+    can resume the ones it lost. params are the keyword arguments of the job's runner.
+    """
+    __table_args__ = (Index("ix_job_status_updated_at", "status", "updated_at"),)
+
+    id: str = Field(primary_key=True)
+    kind: str
+    status: str = "pending"
+    done: int = 0
+    total: Optional[int] = None
+    error: Optional[str] = None
+    params: dict = Field(default_factory=dict, sa_column=Column(JSONB, nullable=False))
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
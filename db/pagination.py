@@ -0,0 +1,72 @@
+import base64
+import json
+from typing import List, Optional, Tuple
+
+from sqlalchemy import Integer, bindparam, tuple_
+
+from db.models.base_models import PageGet
+from settings import PAGE_SIZE, PAGE_SIZE_MAX
+
+
+def encode_cursor(values: list) -> str:
+    return base64.urlsafe_b64encode(json.dumps(values, separators=(",", ":")).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> list:
+    padded = cursor + "=" * (-len(cursor) % 4)
+    values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list):
+        raise ValueError(f"malformed cursor {cursor}")
+    return values
+
+
+def is_paged(filters: PageGet) -> bool:
+    return filters.limit is not None or filters.after is not None
+
+
+def page_size(filters: PageGet) -> int:
+    return max(1, min(filters.limit or PAGE_SIZE, PAGE_SIZE_MAX))
+
+
+def keyset(sql, keys: List[Tuple], after: bool = False, limit: bool = False):
+    """
+    keys are (sql expression, row attribute) pairs, the expressions must be unique and NOT NULL together.
+    The cursor values and the limit are bound parameters, see keyset_params(), so one statement serves
+    every page.
+    """
+    expressions = [expression for expression, _ in keys]
+    if after:
+        values = [bindparam(f"after_{i}") for i in range(len(expressions))]
+        if len(expressions) == 1:
+            sql = sql.where(expressions[0] > values[0])
+        else:
+            sql = sql.where(tuple_(*expressions) > tuple_(*values))
+    sql = sql.order_by(*expressions)
+    if limit:
+        sql = sql.limit(bindparam("page_limit", type_=Integer))
+    return sql
+
+
+def keyset_params(keys: List[Tuple], after: Optional[str] = None, limit: Optional[int] = None) -> dict:
+    params = {}
+    if after:
+        values = decode_cursor(after)
+        if len(values) != len(keys):
+            raise ValueError(f"cursor {after} does not match this query")
+        params.update({f"after_{i}": value for i, value in enumerate(values)})
+    if limit is not None:
+        params["page_limit"] = limit
+    return params
+
+
+def cursor_of(row, keys: List[Tuple]) -> str:
+    return encode_cursor([getattr(row, name) or 0 for _, name in keys])
+
+
+def page(rows: list, keys: List[Tuple], limit: int) -> dict:
+    """
+    rows must have been fetched with limit + 1 to know whether there is a next page.
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"items": rows, "after": cursor_of(rows[-1], keys) if has_more and rows else None}
@@ -0,0 +1,51 @@
+from typing import Sequence, Tuple
+
+from sqlalchemy import func, literal_column, or_
+from sqlalchemy.dialects.postgresql import TSVECTOR
+
+from db.models.sql_models import DeliveryRequest, MapPoint
+
+# constants are rendered inline so the expressions match the indexes of migration 0002
+TS_CONFIG = literal_column("'russian'")
+EMPTY = literal_column("''")
+
+
+def ts_document(*weighted_columns) -> TSVECTOR:
+    document = None
+    for column, weight in weighted_columns:
+        vector = func.to_tsvector(TS_CONFIG, func.coalesce(column, EMPTY), type_=TSVECTOR)
+        if weight:
+            vector = func.setweight(vector, literal_column(f"'{weight}'"), type_=TSVECTOR)
+        document = vector if document is None else document.op("||")(vector)
+    return document
+
+
+MAP_POINT_DOCUMENT = ts_document((MapPoint.title, "A"), (MapPoint.description, "B"), (MapPoint.address, "C"))
+MAP_POINT_TRIGRAM_COLUMNS = (MapPoint.title, MapPoint.address)
+DELIVERY_ADDRESS_DOCUMENT = ts_document((DeliveryRequest.address, None))
+DELIVERY_TRIGRAM_COLUMNS = (DeliveryRequest.address,)
+
+
+def escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def search_clause(mode: str, text: str, trigram_columns: Sequence, document) -> Tuple:
+    """
+    Returns (where condition, rank) for one of the search modes:
+    prefix - ILIKE 'text%' on the trigram columns, fuzzy - pg_trgm similarity, fulltext - websearch tsquery,
+    auto - any of them, ranked by the best score.
+    """
+    similarity = func.greatest(*[func.similarity(column, text) for column in trigram_columns])
+    prefix = or_(*[column.ilike(escape_like(text) + "%", escape="\\") for column in trigram_columns])
+    fuzzy = or_(*[column.op("%")(text) for column in trigram_columns])
+    query = func.websearch_to_tsquery(TS_CONFIG, text)
+    fulltext = document.op("@@")(query)
+    text_rank = func.ts_rank_cd(document, query)
+    if mode == "prefix":
+        return prefix, similarity
+    if mode == "fuzzy":
+        return fuzzy, similarity
+    if mode == "fulltext":
+        return fulltext, text_rank
+    return or_(prefix, fuzzy, fulltext), func.greatest(similarity, text_rank)
@@ -0,0 +1,310 @@
+import asyncio
+import logging
+import random
+import time
+from bisect import bisect
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from itertools import accumulate
+from typing import Dict, Iterator, List, NamedTuple, Tuple
+
+import asyncpg
+from sqlmodel import SQLModel
+
+from db.models.sql_models import User, Courier, Role, Status, ThrashType, Map, MapPoint, PointThrashLink, \
+    DeliveryRequest, DeliveryThrashLink, Achievement, UserAchievementLink
+from settings import ACHIEVEMENTS_SPARSE, SEED_CHUNK_SIZE, DBConfig
+
+logger = logging.getLogger(__name__)
+
+# every seeded user and courier logs in with this password
+SEED_PASSWORD = "ecogram-seed"
+SEED_USERNAME_PREFIX = "seed_"
+USER_PHONE_BASE = 9000000000
+COURIER_PHONE_BASE = 9500000000
+POINT_PHONE_BASE = 9800000000
+
+# city -> latitude and longitude of the centre, default weight
+CITIES = {
+    "Москва": (55.7558, 37.6173, 13),
+    "Санкт-Петербург": (59.9343, 30.3351, 5.6),
+    "Новосибирск": (55.0084, 82.9357, 1.6),
+    "Екатеринбург": (56.8389, 60.6057, 1.5),
+    "Казань": (55.7963, 49.1088, 1.3),
+    "Нижний Новгород": (56.3269, 44.0059, 1.2),
+    "Красноярск": (56.0153, 92.8932, 1.2),
+    "Самара": (53.1959, 50.1002, 1.2),
+    "Краснодар": (45.0355, 38.9753, 1.1),
+    "Пермь": (58.0105, 56.2502, 1.0),
+}
+CITY_RADIUS_DEGREES = 0.12
+STREETS = ["улица Ленина", "проспект Мира", "улица Пушкина", "Садовая улица", "улица Гагарина",
+           "Центральная улица", "Молодежная улица", "Школьная улица", "Лесная улица", "Набережная улица"]
+FIRST_NAMES = ["Иван", "Анна", "Петр", "Мария", "Алексей", "Ольга", "Дмитрий", "Елена", "Сергей", "Наталья"]
+SURNAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов", "Новиков"]
+ROLES = ["basic_user", "admin"]
+THRASH_TYPES = ["Стекло", "Пластик", "Бумага", "Металл", "Батарейки", "Одежда", "Электроника", "Тетрапак"]
+# status and share of the delivery requests in it, the first one is NEW_REQUEST_STATUS
+STATUSES = [("в ожидании", 0.15), ("в работе", 0.1), ("выполнена", 0.65), ("отменена", 0.1)]
+REQUEST_DAYS = 365
+
+USER_COLUMNS = ["id", "phone_number", "username", "name", "surname", "birthday", "password", "role_id"]
+COURIER_COLUMNS = ["id", "phone_number", "username", "name", "surname", "birthday", "password", "role",
+                   "delivery_count", "salary", "latitude", "longitude"]
+MAP_POINT_COLUMNS = ["id", "title", "address", "phone_number", "email", "website", "description", "coordinates",
+                     "id_map"]
+DELIVERY_REQUEST_COLUMNS = ["id", "address", "price", "create_date", "id_courier", "id_user", "status_id",
+                            "coordinates"]
+ACHIEVEMENT_LINK_COLUMNS = ["user_id", "achievement_id", "unlock_date", "unlocked"]
+
+
+class SeedSizes(NamedTuple):
+    users: int
+    couriers: int
+    map_points: int
+    delivery_requests: int
+    achievements: int
+
+
+class SeedOptions(NamedTuple):
+    sizes: SeedSizes
+    seed: int
+    # (city, latitude, longitude, weight), the Map ids follow this order
+    cities: List[Tuple[str, float, float, float]]
+    # Zipf exponents of the requests per courier and per user, 0 is uniform
+    courier_skew: float
+    user_skew: float
+    unlocked_share: float
+    password: str
+    # requests and unlocks fall in the REQUEST_DAYS before this date
+    until: date
+
+
+class Chunk(NamedTuple):
+    kind: str
+    start: int
+    stop: int
+    options: SeedOptions
+
+
+def parse_cities(cities: str) -> List[Tuple[str, float, float, float]]:
+    """
+    "Москва=3,Казань=1" gives the two cities with those relative weights, an empty string every city of
+    CITIES with its default weight.
+    """
+    if not cities:
+        return [(city, lat, lon, weight) for city, (lat, lon, weight) in CITIES.items()]
+    parsed = []
+    for item in cities.split(","):
+        city, _, weight = item.strip().partition("=")
+        if city not in CITIES:
+            raise ValueError(f"unknown city {city}, expected one of {', '.join(CITIES)}")
+        lat, lon, default = CITIES[city]
+        parsed.append((city, lat, lon, float(weight) if weight else default))
+    return parsed
+
+
+def national_phone(number: int) -> str:
+    """
+    The stored format of a Russian mobile number, 9001234567 gives "8 (900) 123-45-67".
+    """
+    digits = str(number)
+    return f"8 ({digits[:3]}) {digits[3:6]}-{digits[6:8]}-{digits[8:]}"
+
+
+class Skewed:
+    """
+    Draws ids 1..count with probability proportional to 1 / id ** exponent.
+    """
+
+    def __init__(self, count: int, exponent: float):
+        self.cumulative = list(accumulate(1 / k ** exponent for k in range(1, count + 1)))
+
+    def pick(self, rng: random.Random) -> int:
+        return bisect(self.cumulative, rng.random() * self.cumulative[-1]) + 1
+
+
+class Generator:
+    """
+    Rows of one chunk. The random stream depends on the seed, the kind and the first id only, so a dataset
+    comes out the same whatever the number of parallel jobs.
+    """
+
+    def __init__(self, chunk: Chunk):
+        self.chunk = chunk
+        self.options = chunk.options
+        self.rng = random.Random(f"{chunk.options.seed}/{chunk.kind}/{chunk.start}")
+        self.city_weights = list(accumulate(weight for *_, weight in self.options.cities))
+        self.since = datetime.combine(self.options.until, datetime.min.time()) - timedelta(days=REQUEST_DAYS)
+
+    def city(self) -> int:
+        return self.rng.choices(range(len(self.options.cities)), cum_weights=self.city_weights)[0]
+
+    def near(self, city: int) -> list:
+        _, lat, lon, _ = self.options.cities[city]
+        return [round(lat + self.rng.uniform(-CITY_RADIUS_DEGREES, CITY_RADIUS_DEGREES), 6),
+                round(lon + self.rng.uniform(-CITY_RADIUS_DEGREES, CITY_RADIUS_DEGREES), 6)]
+
+    def address(self, city: int) -> str:
+        return f"{self.options.cities[city][0]}, {self.rng.choice(STREETS)}, {self.rng.randint(1, 150)}"
+
+    def thrash_types(self, most: int) -> list:
+        return self.rng.sample(range(1, len(THRASH_TYPES) + 1), self.rng.randint(1, most))
+
+    def users(self) -> Iterator[tuple]:
+        rng = self.rng
+        for i in range(self.chunk.start, self.chunk.stop):
+            yield (i, national_phone(USER_PHONE_BASE + i), f"{SEED_USERNAME_PREFIX}user_{i}",
+                   rng.choice(FIRST_NAMES), rng.choice(SURNAMES),
+                   date(1950, 1, 1) + timedelta(days=rng.randrange(20000)), self.options.password, 1)
+
+    def couriers(self) -> Iterator[tuple]:
+        rng = self.rng
+        for i in range(self.chunk.start, self.chunk.stop):
+            lat, lon = self.near(self.city())
+            yield (i, national_phone(COURIER_PHONE_BASE + i), f"{SEED_USERNAME_PREFIX}courier_{i}",
+                   rng.choice(FIRST_NAMES), rng.choice(SURNAMES),
+                   date(1970, 1, 1) + timedelta(days=rng.randrange(12000)), self.options.password, "courier",
+                   rng.randrange(2000), round(rng.uniform(30000, 120000), 2), lat, lon)
+
+    def map_points(self, links: list) -> Iterator[tuple]:
+        for i in range(self.chunk.start, self.chunk.stop):
+            city = self.city()
+            links.extend((thrash_type, i) for thrash_type in self.thrash_types(4))
+            yield (i, f"Пункт приема {i}", self.address(city), national_phone(POINT_PHONE_BASE + i),
+                   f"point{i}@example.com", None, None, self.near(city), city + 1)
+
+    def delivery_requests(self, links: list) -> Iterator[tuple]:
+        rng = self.rng
+        sizes = self.options.sizes
+        couriers = Skewed(sizes.couriers, self.options.courier_skew)
+        users = Skewed(sizes.users, self.options.user_skew)
+        statuses = list(range(1, len(STATUSES) + 1))
+        status_weights = list(accumulate(share for _, share in STATUSES))
+        for i in range(self.chunk.start, self.chunk.stop):
+            city = self.city()
+            # the link columns are swapped in the model: thrash_type_id holds the request
+            links.extend((i, thrash_type) for thrash_type in self.thrash_types(3))
+            yield (i, self.address(city), round(rng.uniform(0, 1500), 2),
+                   self.since + timedelta(seconds=rng.randrange(REQUEST_DAYS * 86400)),
+                   couriers.pick(rng), users.pick(rng), rng.choices(statuses, cum_weights=status_weights)[0],
+                   self.near(city))
+
+    def achievement_links(self) -> Iterator[tuple]:
+        rng = self.rng
+        for user_id in range(self.chunk.start, self.chunk.stop):
+            for achievement_id in range(1, self.options.sizes.achievements + 1):
+                if rng.random() < self.options.unlocked_share:
+                    unlock_date = self.since + timedelta(seconds=rng.randrange(REQUEST_DAYS * 86400))
+                    yield user_id, achievement_id, unlock_date, True
+                elif not ACHIEVEMENTS_SPARSE:
+                    yield user_id, achievement_id, None, False
+
+
+async def connect() -> asyncpg.Connection:
+    return await asyncpg.connect(user=DBConfig.DB_USER, password=DBConfig.DB_PASSWORD, host=DBConfig.DB_HOST,
+                                 port=int(DBConfig.DB_PORT), database=DBConfig.DB_DATABASE)
+
+
+async def copy(conn: asyncpg.Connection, model, columns: list, records) -> int:
+    result = await conn.copy_records_to_table(model.__tablename__, records=records, columns=columns)
+    return int(result.split()[-1])
+
+
+async def copy_chunk(chunk: Chunk) -> Dict[str, int]:
+    generator = Generator(chunk)
+    links = []
+    copied = {}
+    conn = await connect()
+    try:
+        async with conn.transaction():
+            if chunk.kind == "user":
+                copied["user"] = await copy(conn, User, USER_COLUMNS, generator.users())
+            elif chunk.kind == "courier":
+                copied["courier"] = await copy(conn, Courier, COURIER_COLUMNS, generator.couriers())
+            elif chunk.kind == "mappoint":
+                copied["mappoint"] = await copy(conn, MapPoint, MAP_POINT_COLUMNS, generator.map_points(links))
+                copied["pointthrashlink"] = await copy(conn, PointThrashLink, ["thrash_type_id", "map_point_id"],
+                                                       links)
+            elif chunk.kind == "deliveryrequest":
+                copied["deliveryrequest"] = await copy(conn, DeliveryRequest, DELIVERY_REQUEST_COLUMNS,
+                                                       generator.delivery_requests(links))
+                copied["deliverythrashlink"] = await copy(conn, DeliveryThrashLink,
+                                                          ["thrash_type_id", "request_id"], links)
+            elif chunk.kind == "userachievementlink":
+                copied["userachievementlink"] = await copy(conn, UserAchievementLink, ACHIEVEMENT_LINK_COLUMNS,
+                                                           generator.achievement_links())
+        return copied
+    finally:
+        await conn.close()
+
+
+def load_chunk(chunk: Chunk) -> Dict[str, int]:
+    """
+    Runs in a worker process: generates one chunk and copies it over a connection of its own.
+    """
+    started = time.monotonic()
+    copied = asyncio.run(copy_chunk(chunk))
+    logger.info(f"{chunk.kind} {chunk.start}-{chunk.stop - 1} copied in {time.monotonic() - started:.1f}s")
+    return copied
+
+
+def chunks(kind: str, count: int, options: SeedOptions, size: int) -> List[Chunk]:
+    return [Chunk(kind, start, min(start + size, count + 1), options) for start in range(1, count + 1, size)]
+
+
+async def seed(options: SeedOptions, truncate: bool = False, jobs: int = 1,
+               chunk_size: int = SEED_CHUNK_SIZE) -> Dict[str, int]:
+    """
+    Fills an empty database with synthetic rows, the same rows for the same options and chunk_size.
+    The dictionary tables are copied first, then users, couriers and map points, then delivery requests
+    and achievement links. The last two phases are split into chunks spread over jobs processes, each
+    chunk copied in its own transaction. Ids are assigned from 1, the sequences are moved past them at the end.
+    """
+    sizes = options.sizes
+    tables = SQLModel.metadata.sorted_tables
+    quoted = [f'"{table.name}"' for table in tables]
+    copied: Dict[str, int] = {}
+    conn = await connect()
+    try:
+        async with conn.transaction():
+            if truncate:
+                await conn.execute(f"TRUNCATE {', '.join(quoted)} RESTART IDENTITY CASCADE")
+            else:
+                for name in quoted:
+                    if await conn.fetchval(f"SELECT EXISTS (SELECT 1 FROM {name})"):
+                        raise ValueError(f"table {name} is not empty")
+            copied["role"] = await copy(conn, Role, ["id", "name"], enumerate(ROLES, 1))
+            copied["status"] = await copy(conn, Status, ["id", "status_name"],
+                                          enumerate([name for name, _ in STATUSES], 1))
+            copied["thrashtype"] = await copy(conn, ThrashType, ["id", "thrash_type"], enumerate(THRASH_TYPES, 1))
+            copied["map"] = await copy(conn, Map, ["id", "city"], enumerate([city for city, *_ in options.cities], 1))
+            copied["achievement"] = await copy(conn, Achievement, ["id", "title"],
+                                               ((i, f"Достижение {i}") for i in range(1, sizes.achievements + 1)))
+
+        # a chunk of achievement links covers chunk_size links rather than chunk_size users
+        per_user = max(1, sizes.achievements)
+        phases = [
+            chunks("user", sizes.users, options, chunk_size) + chunks("courier", sizes.couriers, options, chunk_size)
+            + chunks("mappoint", sizes.map_points, options, chunk_size),
+            (chunks("deliveryrequest", sizes.delivery_requests, options, chunk_size)
+             if sizes.users and sizes.couriers else [])
+            + (chunks("userachievementlink", sizes.users, options, max(1, chunk_size // per_user))
+               if sizes.achievements else []),
+        ]
+        loop = asyncio.get_running_loop()
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for phase in phases:
+                for result in await asyncio.gather(*[loop.run_in_executor(pool, load_chunk, chunk)
+                                                     for chunk in phase]):
+                    for table, count in result.items():
+                        copied[table] = copied.get(table, 0) + count
+
+        for table, name in zip(tables, quoted):
+            if "id" in table.c:
+                await conn.execute(f"SELECT setval(pg_get_serial_sequence('{name}', 'id'), "
+                                   f"(SELECT COALESCE(MAX(id), 0) + 1 FROM {name}), false)")
+        await conn.execute("ANALYZE")
+        return copied
+    finally:
+        await conn.close()
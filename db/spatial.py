@@ -0,0 +1,250 @@
+import asyncio
+import heapq
+import logging
+import math
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from sqlmodel import select
+
+from db.cache import invalidation_channel
+from db.dispatcher import async_session
+from db.models.sql_models import Map, MapPoint, PointThrashLink, ThrashType
+from settings import SPATIAL_INDEX_CELL_DEGREES, SPATIAL_INDEX_TTL, SPATIAL_MAX_RADIUS
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS = 6371008.8
+METRES_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+
+
+def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS * math.asin(min(1.0, math.sqrt(a)))
+
+
+class IndexedPoint:
+    __slots__ = ("id", "lat", "lon", "map_id", "thrash_types")
+
+    def __init__(self, point_id: int, lat: float, lon: float, map_id: Optional[int], thrash_types: Set[str]):
+        self.id = point_id
+        self.lat = lat
+        self.lon = lon
+        self.map_id = map_id
+        self.thrash_types = thrash_types
+
+
+class SpatialIndex:
+    """
+    Uniform grid over map point coordinates. Point.x is the latitude and Point.y the longitude,
+    distances are great-circle metres.
+    """
+
+    def __init__(self, cell_size: float = SPATIAL_INDEX_CELL_DEGREES, ttl: float = SPATIAL_INDEX_TTL,
+                 max_radius: float = SPATIAL_MAX_RADIUS):
+        self.cell_size = cell_size
+        self.ttl = ttl
+        self.max_radius = max_radius
+        self.points: Dict[int, IndexedPoint] = {}
+        self.cells: Dict[Tuple[int, int], Set[int]] = defaultdict(set)
+        self.loaded_at: Optional[float] = None
+        self._lock: Optional[asyncio.Lock] = None
+        # changes made while a reload is reading the table, replayed on top of what it read
+        self._pending: Optional[list] = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_size)), int(math.floor(lon / self.cell_size))
+
+    def clear(self):
+        self.points.clear()
+        self.cells.clear()
+
+    def invalidate(self):
+        self.loaded_at = None
+
+    def _add(self, point_id: int, coordinates, map_id: Optional[int], thrash_types: Iterable[str]):
+        self._discard(point_id)
+        if not coordinates or len(coordinates) < 2:
+            return
+        lat, lon = float(coordinates[0]), float(coordinates[1])
+        self.points[point_id] = IndexedPoint(point_id, lat, lon, map_id, set(thrash_types))
+        self.cells[self._cell(lat, lon)].add(point_id)
+
+    def _discard(self, point_id: int):
+        point = self.points.pop(point_id, None)
+        if point is None:
+            return
+        cell = self._cell(point.lat, point.lon)
+        self.cells[cell].discard(point_id)
+        if not self.cells[cell]:
+            del self.cells[cell]
+
+    def insert(self, point_id: int, coordinates, map_id: Optional[int] = None, thrash_types: Iterable[str] = ()):
+        thrash_types = set(thrash_types)
+        if self._pending is not None:
+            self._pending.append((point_id, coordinates, map_id, thrash_types))
+        self._add(point_id, coordinates, map_id, thrash_types)
+
+    def update(self, point_id: int, coordinates=None, map_id: Optional[int] = None,
+               thrash_types: Optional[Iterable[str]] = None):
+        point = self.points.get(point_id)
+        if point is None:
+            if coordinates:
+                self.insert(point_id, coordinates, map_id, thrash_types or ())
+            return
+        self.insert(point_id,
+                    coordinates or (point.lat, point.lon),
+                    map_id if map_id is not None else point.map_id,
+                    thrash_types if thrash_types is not None else point.thrash_types)
+
+    def remove(self, point_id: int):
+        if self._pending is not None:
+            self._pending.append((point_id, None, None, ()))
+        self._discard(point_id)
+
+    def _ring(self, center: Tuple[int, int], r: int):
+        ci, cj = center
+        if r == 0:
+            yield center
+            return
+        for j in range(cj - r, cj + r + 1):
+            yield ci - r, j
+            yield ci + r, j
+        for i in range(ci - r + 1, ci + r):
+            yield i, cj - r
+            yield i, cj + r
+
+    def _max_ring(self, center: Tuple[int, int]) -> int:
+        if not self.cells:
+            return 0
+        ci, cj = center
+        return max(max(abs(i - ci), abs(j - cj)) for i, j in self.cells)
+
+    def _matches(self, point: IndexedPoint, thrash_type: Optional[str], map_id: Optional[int]) -> bool:
+        if thrash_type is not None and thrash_type not in point.thrash_types:
+            return False
+        if map_id is not None and point.map_id != map_id:
+            return False
+        return True
+
+    def walk(self, lat: float, lon: float, thrash_type: Optional[str] = None, map_id: Optional[int] = None,
+             radius: Optional[float] = None) -> Iterator[Tuple[int, float]]:
+        """
+        Matching points nearest first, at most radius (and never more than max_radius) metres away.
+        The rings of cells around the centre are scanned lazily, so taking k points costs about k points.
+        """
+        radius = min(radius or self.max_radius, self.max_radius)
+        if not self.points:
+            return
+        center = self._cell(lat, lon)
+        max_ring = self._max_ring(center)
+        cell_metres = self.cell_size * METRES_PER_DEGREE
+        found: List[Tuple[float, int]] = []
+        for r in range(max_ring + 1):
+            for cell in self._ring(center, r):
+                for point_id in self.cells.get(cell, ()):
+                    point = self.points[point_id]
+                    if not self._matches(point, thrash_type, map_id):
+                        continue
+                    distance = haversine(lat, lon, point.lat, point.lon)
+                    if distance <= radius:
+                        heapq.heappush(found, (distance, point_id))
+            # every point outside the rings scanned so far is further than bound, the longitude degrees
+            # are measured at the most poleward latitude those rings reach
+            bound = r * cell_metres * max(math.cos(math.radians(min(abs(lat) + (r + 1) * self.cell_size, 89.9))),
+                                          1e-6)
+            while found and found[0][0] <= bound:
+                distance, point_id = heapq.heappop(found)
+                yield point_id, distance
+            if bound > radius:
+                break
+        while found:
+            distance, point_id = heapq.heappop(found)
+            yield point_id, distance
+
+    def is_stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.ttl
+
+    @staticmethod
+    def points_select():
+        return select(MapPoint.id, MapPoint.coordinates, MapPoint.id_map, ThrashType.thrash_type) \
+            .outerjoin_from(MapPoint, PointThrashLink).outerjoin(ThrashType)
+
+    @staticmethod
+    def group_rows(rows) -> dict:
+        points = {}
+        for point_id, coordinates, map_id, thrash_type in rows:
+            if point_id not in points:
+                points[point_id] = (coordinates, map_id, set())
+            if thrash_type:
+                points[point_id][2].add(thrash_type)
+        return points
+
+    async def ensure_loaded(self):
+        """
+        Reloads from the primary, never from a replica that may not have the write which invalidated the index.
+        """
+        if not self.is_stale():
+            return
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if not self.is_stale():
+                return
+            self._pending = []
+            try:
+                async with async_session() as session:
+                    res = await session.exec(self.points_select())
+                    points = self.group_rows(res.all())
+            finally:
+                pending, self._pending = self._pending, None
+            self.clear()
+            for point_id, (coordinates, map_id, thrash_types) in points.items():
+                self._add(point_id, coordinates, map_id, thrash_types)
+            for point_id, coordinates, map_id, thrash_types in pending:
+                self._add(point_id, coordinates, map_id, thrash_types)
+            self.loaded_at = time.monotonic()
+            logger.debug(f"spatial index loaded with {len(self.points)} points")
+
+    def refresh(self, point_id: str):
+        """
+        A point written by another worker, see point_invalidation(). Only that point is read again.
+        """
+        if self.loaded_at is None:
+            return
+        task = asyncio.get_running_loop().create_task(self.reload_point(int(point_id)))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def reload_point(self, point_id: int):
+        try:
+            async with async_session() as session:
+                res = await session.exec(self.points_select().where(MapPoint.id == point_id))
+                points = self.group_rows(res.all())
+        except Exception as e:
+            logger.error(f"spatial index reload_point exception {e}")
+            self.invalidate()
+            return
+        if point_id in points:
+            self.insert(point_id, *points[point_id])
+        else:
+            self.remove(point_id)
+
+
+map_points_index = SpatialIndex()
+invalidation_channel.subscribe(ThrashType.__tablename__, map_points_index.invalidate)
+invalidation_channel.subscribe(Map.__tablename__, map_points_index.invalidate)
+invalidation_channel.subscribe(MapPoint.__tablename__, map_points_index.invalidate)
+invalidation_channel.subscribe_keys(MapPoint.__tablename__, map_points_index.refresh)
+
+
+def point_invalidation(point_id: int) -> str:
+    return f"{MapPoint.__tablename__}:{point_id}"
@@ -1,10 +1,11 @@
+import asyncio
 import logging
 
 import click
 import uvicorn
 
-from app.main import app
-from settings import BACKEND_HOST, BACKEND_PORT
+from settings import BACKEND_HOST, BACKEND_PORT, WEB_CONCURRENCY, SERVER_MAX_REQUESTS, SERVER_MAX_REQUESTS_JITTER, \
+    SERVER_TIMEOUT, SERVER_GRACEFUL_TIMEOUT, SERVER_KEEPALIVE, SERVER_LOOP, SERVER_HTTP, SEED_CHUNK_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -17,9 +18,161 @@ def group():
 @group.command()
 def run():
     logger.debug(f"starting server")
-    uvicorn.run(app, host=BACKEND_HOST, port=int(BACKEND_PORT), log_level="info")
+    uvicorn.run("app.main:app", host=BACKEND_HOST, port=int(BACKEND_PORT), log_level="info")
     logger.debug("shutting down")
 
 
+@group.command()
+@click.option("--workers", "-w", type=int, default=WEB_CONCURRENCY, help="0 starts one worker per available CPU")
+@click.option("--max-requests", type=int, default=SERVER_MAX_REQUESTS, help="recycle a worker after this many requests")
+@click.option("--max-requests-jitter", type=int, default=SERVER_MAX_REQUESTS_JITTER)
+@click.option("--timeout", type=int, default=SERVER_TIMEOUT)
+@click.option("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT)
+@click.option("--keepalive", type=int, default=SERVER_KEEPALIVE)
+@click.option("--loop", type=click.Choice(["auto", "asyncio", "uvloop"]), default=SERVER_LOOP)
+@click.option("--http", type=click.Choice(["auto", "h11", "httptools"]), default=SERVER_HTTP)
+@click.option("--reload", is_flag=True, help="restart workers when the code changes")
+@click.option("--pidfile", default=None, help="kill -HUP the pid to reload workers gracefully")
+def serve(workers, max_requests, max_requests_jitter, timeout, graceful_timeout, keepalive, loop, http, reload,
+          pidfile):
+    from app.server import available_cpus, serve as serve_app
+
+    try:
+        serve_app(BACKEND_HOST, int(BACKEND_PORT), workers or available_cpus(), max_requests, max_requests_jitter,
+                  timeout, graceful_timeout, keepalive, loop, http, reload, pidfile)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--workers")
+
+
+@group.command()
+@click.option("--max-scans", type=int, default=0, help="report non-unique indexes scanned at most this many times")
+@click.option("--min-rows", type=int, default=1000, help="ignore sequential scans of tables smaller than this")
+def indexes(max_scans, min_rows):
+    from db.maintenance import index_report
+
+    report = asyncio.run(index_report(max_scans, min_rows))
+    click.echo(f"statistics collected since {report['stats_reset'] or 'database creation'}")
+    click.echo("\nunused indexes:")
+    for row in report["unused"]:
+        click.echo(f"  {row['table_name']}.{row['index_name']}: {row['scans']} scans, {row['size']}")
+    click.echo("\ntables read by sequential scans:")
+    for row in report["seq_scanned"]:
+        click.echo(f"  {row['table_name']}: {row['seq_scan']} seq scans reading {row['seq_tup_read']} rows, "
+                   f"{row['idx_scan']} index scans, {row['live_rows']} rows")
+    click.echo("\nforeign keys without an index:")
+    for row in report["unindexed_foreign_keys"]:
+        click.echo(f"  {row['table_name']}.{row['constraint_name']} ({row['columns']})")
+
+
+@group.command()
+def addresses():
+    """
+    Copies the addresses and coordinates of every map point into the address coordinate cache.
+    """
+    from db import crud
+    from db.dispatcher import async_session, engine
+
+    async def sync():
+        async with async_session() as session:
+            saved = await crud.sync_map_point_addresses(session)
+        await engine.dispose()
+        return saved
+
+    saved = asyncio.run(sync())
+    if saved is None:
+        raise click.ClickException("sync failed, see the log")
+    click.echo(f"{saved} addresses saved")
+
+
+@group.command()
+@click.option("--users", type=int, default=100000)
+@click.option("--couriers", type=int, default=2000)
+@click.option("--map-points", type=int, default=10000)
+@click.option("--requests", type=int, default=1000000)
+@click.option("--achievements", type=int, default=20)
+@click.option("--seed", "seed_value", type=int, default=0, help="the same seed gives the same rows")
+@click.option("--until", type=click.DateTime(["%Y-%m-%d"]), default=None,
+              help="requests are dated in the year before it, today by default")
+@click.option("--cities", default="", help='relative weights, "Москва=3,Казань=1", every known city by default')
+@click.option("--courier-skew", type=float, default=1.0,
+              help="Zipf exponent of the requests per courier, 0 is uniform")
+@click.option("--user-skew", type=float, default=0.5, help="Zipf exponent of the requests per user, 0 is uniform")
+@click.option("--unlocked-share", type=float, default=0.3, help="share of the achievements each user unlocked")
+@click.option("--jobs", "-j", type=int, default=0, help="processes generating and copying chunks, 0 is one per CPU")
+@click.option("--chunk-size", type=int, default=SEED_CHUNK_SIZE, help="rows per chunk")
+@click.option("--truncate", is_flag=True, help="empty every table first")
+def seed(users, couriers, map_points, requests, achievements, seed_value, until, cities, courier_skew, user_skew,
+         unlocked_share, jobs, chunk_size, truncate):
+    """
+    Fills an empty database with synthetic data through parallel COPY, see README.
+    """
+    import time
+    from datetime import date
+
+    from app.server import available_cpus
+    from db.seed import SEED_PASSWORD, SeedOptions, SeedSizes, parse_cities, seed as seed_database
+    from src.views.security import get_password_hash
+
+    try:
+        parsed_cities = parse_cities(cities)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--cities")
+    options = SeedOptions(SeedSizes(users, couriers, map_points, requests, achievements), seed_value, parsed_cities,
+                          courier_skew, user_skew, unlocked_share, get_password_hash(SEED_PASSWORD),
+                          until.date() if until else date.today())
+    started = time.monotonic()
+    try:
+        copied = asyncio.run(seed_database(options, truncate, jobs or available_cpus(), chunk_size))
+    except ValueError as e:
+        raise click.ClickException(f"{e}, pass --truncate to empty the database first")
+    for table, count in copied.items():
+        click.echo(f"{table}: {count}")
+    click.echo(f"{sum(copied.values())} rows in {time.monotonic() - started:.1f}s")
+
+
+@group.group()
+def bench():
+    """
+    Load tests a running server against a database filled by the seed command.
+    """
+
+
+@bench.command("run")
+@click.option("--url", default=f"http://127.0.0.1:{BACKEND_PORT}")
+@click.option("--concurrency", "-c", type=int, default=16)
+@click.option("--duration", "-d", type=float, default=30, help="seconds of measured load")
+@click.option("--warmup", type=float, default=5, help="seconds of unmeasured load first")
+@click.option("--mix", default=None, help='relative weights of the scenarios, "token=1,create=2,..."')
+@click.option("--sample", type=int, default=1000, help="users, couriers and points the scenarios pick from")
+@click.option("--seed", "seed_value", type=int, default=0)
+@click.option("--save", type=click.Path(dir_okay=False), default=None, help="write the results as json")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), default=None,
+              help="results saved by an earlier run to compare with")
+@click.option("--tolerance", type=float, default=0.1, help="relative change reported as a regression")
+def bench_run(url, concurrency, duration, warmup, mix, sample, seed_value, save, baseline, tolerance):
+    import json
+
+    from bench.load import DEFAULT_MIX, compare, format_report, parse_mix, run
+
+    try:
+        weights = parse_mix(mix or DEFAULT_MIX)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="--mix")
+    try:
+        result = asyncio.run(run(url, weights, concurrency, duration, warmup, sample, seed_value))
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    comparison = []
+    if baseline:
+        with open(baseline) as f:
+            comparison = compare(result, json.load(f), tolerance)
+    click.echo(format_report(result, comparison))
+    if save:
+        with open(save, "w") as f:
+            json.dump(dict(result, comparison=comparison), f, indent=2, ensure_ascii=False)
+    if any(row["regressed"] for row in comparison):
+        raise click.ClickException("regressions against the baseline")
+
+
 if __name__ == "__main__":
     group()
@@ -0,0 +1,38 @@
+"""search indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:40:12.118504
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+# must stay identical to the expressions in db/search.py, otherwise the planner ignores the indexes
+MAP_POINT_DOCUMENT = "setweight(to_tsvector('russian', coalesce(title, '')), 'A') || " \
+                     "setweight(to_tsvector('russian', coalesce(description, '')), 'B') || " \
+                     "setweight(to_tsvector('russian', coalesce(address, '')), 'C')"
+DELIVERY_ADDRESS_DOCUMENT = "to_tsvector('russian', coalesce(address, ''))"
+
+
+def upgrade():
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    op.execute("CREATE INDEX ix_mappoint_title_trgm ON mappoint USING gin (title gin_trgm_ops)")
+    op.execute("CREATE INDEX ix_mappoint_address_trgm ON mappoint USING gin (address gin_trgm_ops)")
+    op.execute(f"CREATE INDEX ix_mappoint_document ON mappoint USING gin (({MAP_POINT_DOCUMENT}))")
+    op.execute("CREATE INDEX ix_deliveryrequest_address_trgm ON deliveryrequest USING gin (address gin_trgm_ops)")
+    op.execute(f"CREATE INDEX ix_deliveryrequest_document ON deliveryrequest USING gin (({DELIVERY_ADDRESS_DOCUMENT}))")
+
+
+def downgrade():
+    op.drop_index('ix_deliveryrequest_document', table_name='deliveryrequest')
+    op.drop_index('ix_deliveryrequest_address_trgm', table_name='deliveryrequest')
+    op.drop_index('ix_mappoint_document', table_name='mappoint')
+    op.drop_index('ix_mappoint_address_trgm', table_name='mappoint')
+    op.drop_index('ix_mappoint_title_trgm', table_name='mappoint')
@@ -3,6 +3,79 @@ import os
 HASH_ALG = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
 
+SPATIAL_INDEX_CELL_DEGREES = float(os.getenv("SPATIAL_INDEX_CELL_DEGREES") or 0.01)
+SPATIAL_INDEX_TTL = int(os.getenv("SPATIAL_INDEX_TTL") or 60)
+# metres, radius and nearest queries never look further than this
+SPATIAL_MAX_RADIUS = float(os.getenv("SPATIAL_MAX_RADIUS") or 50000)
+GEO_PAGE_SIZE = 50
+
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE") or 50)
+SEARCH_CACHE_SIZE = int(os.getenv("SEARCH_CACHE_SIZE") or 1000)
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL") or 30)
+
+ADDRESS_CACHE_SIZE = int(os.getenv("ADDRESS_CACHE_SIZE") or 50000)
+ADDRESS_CACHE_TTL = int(os.getenv("ADDRESS_CACHE_TTL") or 600)
+
+PASSWORD_HASH_CONCURRENCY = int(os.getenv("PASSWORD_HASH_CONCURRENCY") or min(4, os.cpu_count() or 1))
+
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE") or 10000)
+# a user changed or deleted by another worker keeps authenticating there for up to this many seconds
+# unless REFERENCE_CACHE_NOTIFY broadcasts the invalidation
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL") or 60)
+
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE") or 1000)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE") or 5000)
+# rows past this many failures are counted but left out of the ingestion report
+INGEST_MAX_ERRORS = int(os.getenv("INGEST_MAX_ERRORS") or 1000)
+
+# rows generated and copied per transaction by manage.py seed
+SEED_CHUNK_SIZE = int(os.getenv("SEED_CHUNK_SIZE") or 100000)
+
+PAGE_SIZE = int(os.getenv("PAGE_SIZE") or 100)
+PAGE_SIZE_MAX = int(os.getenv("PAGE_SIZE_MAX") or 1000)
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE") or 500)
+# built statements of the list routes, one per combination of filters and paging
+FILTER_STATEMENT_CACHE_SIZE = int(os.getenv("FILTER_STATEMENT_CACHE_SIZE") or 1000)
+
+ACHIEVEMENT_BACKFILL_CHUNK = int(os.getenv("ACHIEVEMENT_BACKFILL_CHUNK") or 5000)
+# only unlocked achievements are stored as link rows, locked ones are derived from the catalogue
+ACHIEVEMENTS_SPARSE = (os.getenv("ACHIEVEMENTS_SPARSE") or "false").lower() == "true"
+ACHIEVEMENT_CATALOGUE_TTL = int(os.getenv("ACHIEVEMENT_CATALOGUE_TTL") or 300)
+# a pending or running job without progress for this many seconds lost its worker and is resumed on startup
+JOB_STALE_AFTER = int(os.getenv("JOB_STALE_AFTER") or 600)
+
+REFERENCE_CACHE_TTL = int(os.getenv("REFERENCE_CACHE_TTL") or 300)
+# broadcast reference cache invalidations to the other workers over LISTEN/NOTIFY
+REFERENCE_CACHE_NOTIFY = (os.getenv("REFERENCE_CACHE_NOTIFY") or "false").lower() == "true"
+REFERENCE_CACHE_CHANNEL = os.getenv("REFERENCE_CACHE_CHANNEL") or "reference_cache"
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE") or 1000)
+# max-age of the reference routes, clients revalidate with If-None-Match once it passes
+REFERENCE_HTTP_MAX_AGE = int(os.getenv("REFERENCE_HTTP_MAX_AGE") or 0)
+
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY") or 0)  # 0 picks one worker per available CPU
+SERVER_MAX_REQUESTS = int(os.getenv("SERVER_MAX_REQUESTS") or 10000)
+SERVER_MAX_REQUESTS_JITTER = int(os.getenv("SERVER_MAX_REQUESTS_JITTER") or 1000)
+SERVER_TIMEOUT = int(os.getenv("SERVER_TIMEOUT") or 60)
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT") or 30)
+SERVER_KEEPALIVE = int(os.getenv("SERVER_KEEPALIVE") or 5)
+SERVER_LOOP = os.getenv("SERVER_LOOP") or "auto"
+SERVER_HTTP = os.getenv("SERVER_HTTP") or "auto"
+
+# a request executing one statement this many times is logged and counted as an N+1 pattern
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD") or 50)
+
+# seconds between dispatch runs assigning pending requests to couriers, 0 disables the periodic job
+DISPATCH_INTERVAL = int(os.getenv("DISPATCH_INTERVAL") or 0)
+DISPATCH_COURIER_CAPACITY = int(os.getenv("DISPATCH_COURIER_CAPACITY") or 10)
+# larger request x courier slot matrices are assigned greedily instead of optimally
+DISPATCH_HUNGARIAN_MAX_CELLS = int(os.getenv("DISPATCH_HUNGARIAN_MAX_CELLS") or 250000)
+
+READINESS_TIMEOUT = float(os.getenv("READINESS_TIMEOUT") or 2)
+
+
+def replica_urls(user: str, password: str, database: str, hosts: list) -> list:
+    return [f"postgresql+asyncpg://{user}:{password}@{host}/{database}" for host in hosts]
+
 
 class DBConfig:
     DB_USER = os.getenv("POSTGRES_USER") or "postgres"
@@ -11,6 +84,23 @@ class DBConfig:
     DB_PORT = os.getenv("POSTGRES_PORT") or 5432
     DB_DATABASE = os.getenv("POSTGRES_DB") or "ecogram"
     DB_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}:{DB_PORT}/{DB_DATABASE}"
+    DB_ECHO = (os.getenv("DB_ECHO") or "false").lower() == "true"
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE") or 5)
+    DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW") or 10)
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT") or 30)
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE") or 1800)
+    DB_POOL_PRE_PING = (os.getenv("DB_POOL_PRE_PING") or "true").lower() == "true"
+    DB_STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE") or 100)
+    DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS") or 100)
+    # kept free for superuser sessions, migrations and manage.py commands
+    DB_RESERVED_CONNECTIONS = int(os.getenv("DB_RESERVED_CONNECTIONS") or 10)
+    # "host" or "host:port" of streaming replicas serving the read-only GET routes, same credentials and database
+    DB_REPLICA_HOSTS = [host.strip() for host in (os.getenv("POSTGRES_REPLICA_HOSTS") or "").split(",") if host.strip()]
+    DB_REPLICA_URLS = replica_urls(DB_USER, DB_PASSWORD, DB_DATABASE, DB_REPLICA_HOSTS)
+    DB_REPLICA_MAX_LAG = float(os.getenv("DB_REPLICA_MAX_LAG") or 10)
+    DB_REPLICA_CHECK_INTERVAL = float(os.getenv("DB_REPLICA_CHECK_INTERVAL") or 5)
+    # seconds a client keeps reading from the primary after its own write, 0 disables
+    DB_READ_YOUR_WRITES = float(os.getenv("DB_READ_YOUR_WRITES") or 5)
 
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
@@ -1,4 +1,5 @@
-from datetime import datetime
+import time
+from typing import NamedTuple, Optional
 
 from fastapi import APIRouter, Depends, status
 from fastapi.responses import JSONResponse
@@ -6,36 +7,46 @@ from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi_login.exceptions import InvalidCredentialsException
 from jose import JWTError, jwt
 
-from db.models.base_models import TokenData
+from db.cache import principal_cache
 from db.crud import *
 from db.dispatcher import get_session
 from settings import HASH_ALG, HASH_SECRET_KEY
-from src.views.security import get_password_hash, create_access_token, verify_password
+from src.views.security import create_access_token, password_service
 
 auth_router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/token")
 logger = logging.getLogger(__name__)
 
 
-async def get_current_user(session: AsyncSession = Depends(get_session), token: str = Depends(oauth2_scheme)):
+class Principal(NamedTuple):
+    """
+    What the principal cache keeps of a user, plain values so it outlives the session it was read with.
+    """
+    id: int
+    phone_number: str
+    role_id: Optional[int]
+
+
+async def get_current_user(session: AsyncSession = Depends(get_session),
+                           token: str = Depends(oauth2_scheme)) -> Principal:
     try:
         payload = jwt.decode(token, HASH_SECRET_KEY, algorithms=[HASH_ALG])
-        phone: str = payload.get("sub")
-        exp = payload.get("exp")
-        logger.debug(f"current user phone: {phone}")
-        if not phone:
-            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-        token_data = TokenData(phone=phone, expires=exp)
-        logger.debug(f"token_data: {token_data}")
     except JWTError:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    user = await get_user(session, phone=token_data.phone)
-    if user:
-        return user
-    if any([user is None, exp is None, datetime.utcnow() > token_data.expires]):
-        logger.debug(f"{user}, {exp}, {datetime.utcnow() > token_data.expires}")
+    phone: str = payload.get("sub")
+    exp = payload.get("exp")
+    logger.debug(f"current user phone: {phone}")
+    if not phone or exp is None or exp <= time.time():
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    return user
+    principal = principal_cache.get(phone)
+    if principal is not None:
+        return principal
+    user = await get_user(session, phone=phone)
+    if user is None:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    principal = Principal(user.id, user.phone_number, user.role_id)
+    principal_cache.set(phone, principal, expires_at=exp)
+    return principal
 
 
 @auth_router.post("/auth/token")
@@ -49,10 +60,15 @@ async def login(form_data: OAuth2PasswordRequestForm = Depends(), session: Async
     return {"access_token": access_token, "token_type": "bearer"}
 
 
+@auth_router.get("/auth/me")
+async def me(principal: Principal = Depends(get_current_user)):
+    return principal._asdict()
+
+
 async def auth_user(session: AsyncSession, phone: str, password: str):
     user = await get_user(session, phone=phone)
     logger.debug(user)
-    if user and verify_password(password, user.password):
+    if user and await password_service.verify(password, user.password):
         return user
 
 
@@ -62,7 +78,7 @@ async def register(create_data: UserCreate,
     user = await get_user(session, phone=create_data.phone_number)
     if user:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="User already exists")
-    create_data.password = get_password_hash(create_data.password)
+    create_data.password = await password_service.hash(create_data.password)
     user = await create_user(session, create_data)
     if not user:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail="Couldn't create user")
@@ -0,0 +1,69 @@
+import csv
+from typing import AsyncIterator, Optional, Tuple
+
+import orjson
+
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+CSV_LIST_SEPARATOR = ";"
+
+Record = Tuple[int, Optional[dict], Optional[str]]
+
+
+def is_csv(content_type: Optional[str]) -> bool:
+    return (content_type or "").split(";")[0].strip().lower() in CSV_MEDIA_TYPES
+
+
+async def stream_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[Tuple[int, bytes]]:
+    buffer = b""
+    line_no = 0
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_no += 1
+            yield line_no, line
+    if buffer:
+        yield line_no + 1, buffer
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    async for line_no, line in stream_lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            item = orjson.loads(line)
+        except orjson.JSONDecodeError as e:
+            yield line_no, None, f"invalid json: {e}"
+            continue
+        if not isinstance(item, dict):
+            yield line_no, None, "expected a json object"
+            continue
+        yield line_no, item, None
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    """
+    The first line is the header, list columns (thrash_types) are separated by ';'.
+    Quoted values may not span lines.
+    """
+    header = None
+    async for line_no, line in stream_lines(chunks):
+        text = line.decode("utf-8-sig" if line_no == 1 else "utf-8", errors="replace").rstrip("\r")
+        if not text.strip():
+            continue
+        values = next(csv.reader([text]))
+        if header is None:
+            header = [value.strip() for value in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, None, f"expected {len(header)} columns, got {len(values)}"
+            continue
+        item = {key: value if value != "" else None for key, value in zip(header, values)}
+        if "thrash_types" in item:
+            item["thrash_types"] = [name.strip() for name in (item["thrash_types"] or "").split(CSV_LIST_SEPARATOR)
+                                    if name.strip()]
+        yield line_no, item, None
+
+
+def request_records(content_type: Optional[str], chunks: AsyncIterator[bytes]) -> AsyncIterator[Record]:
+    return csv_records(chunks) if is_csv(content_type) else ndjson_records(chunks)
@@ -0,0 +1,91 @@
+import hashlib
+import inspect
+from decimal import Decimal
+from typing import Awaitable, Callable, Sequence
+
+import orjson
+from fastapi import Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from pydantic import BaseModel
+from sqlalchemy.engine import Row
+
+from db.cache import response_cache, table_versions
+from settings import REFERENCE_HTTP_MAX_AGE
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS
+
+
+def orjson_default(value):
+    """
+    Everything orjson does not encode natively. datetime, date and UUID are left to orjson,
+    so they are always written as ISO 8601 strings.
+    """
+    if isinstance(value, Row):
+        return dict(value._mapping)
+    if isinstance(value, BaseModel):
+        return value.dict()
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content) -> bytes:
+    return orjson.dumps(content, default=orjson_default, option=ORJSON_OPTIONS)
+
+
+class ORJSONResponse(JSONResponse):
+    def render(self, content) -> bytes:
+        return dumps(content)
+
+
+def is_stream(query) -> bool:
+    return inspect.isasyncgen(query)
+
+
+async def ndjson_lines(rows):
+    async for row in rows:
+        yield dumps(row) + b"\n"
+
+
+def ndjson_response(rows) -> StreamingResponse:
+    return StreamingResponse(ndjson_lines(rows), media_type="application/x-ndjson")
+
+
+def rows_response(query):
+    """
+    Rows go to bytes directly, without the jsonable_encoder pass FastAPI does on returned values.
+    """
+    if is_stream(query):
+        return ndjson_response(query)
+    return ORJSONResponse(query)
+
+
+def etag_of(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    tags = {tag.strip() for tag in if_none_match.split(",")}
+    tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+    return "*" in tags or etag in tags
+
+
+async def cached_response(request: Request, tables: Sequence[str], produce: Callable[[], Awaitable]) -> Response:
+    """
+    Serialized body and ETag are kept per path, query and version of the tables the route reads.
+    The ETag hashes the body, so it agrees between workers whose version counters differ;
+    a matching If-None-Match gets 304 without running produce().
+    """
+    key = (request.url.path, tuple(sorted(request.query_params.multi_items())), table_versions.get(*tables))
+    cached = response_cache.get(key)
+    if cached is None:
+        body = dumps(await produce())
+        cached = (body, etag_of(body))
+        response_cache.set(key, cached)
+    body, etag = cached
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={REFERENCE_HTTP_MAX_AGE}, must-revalidate"}
+    if etag_matches(request.headers.get("if-none-match", ""), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(body, media_type="application/json", headers=headers)
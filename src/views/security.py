@@ -1,10 +1,17 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import timedelta, datetime
 from typing import Optional
 
 from jose import jwt
 from passlib.context import CryptContext
 
-from settings import HASH_SECRET_KEY, HASH_ALG
+from settings import HASH_SECRET_KEY, HASH_ALG, PASSWORD_HASH_CONCURRENCY
+
+logger = logging.getLogger(__name__)
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -25,4 +32,71 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 
 def verify_password(password, hashed_password):
-    return pwd_context.verify(password, hashed_password)
\ No newline at end of file
+    return pwd_context.verify(password, hashed_password)
+
+
+class PasswordService:
+    """
+    Runs bcrypt on a bounded thread pool so hashing never blocks the event loop.
+    bcrypt releases the GIL, so the pool size is the number of hashes computed in parallel.
+    """
+
+    def __init__(self, concurrency: int = PASSWORD_HASH_CONCURRENCY):
+        self.concurrency = concurrency
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="password")
+        self._lock = threading.Lock()
+        self.pending = 0
+        self.active = 0
+        self.max_queue_depth = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.total_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return self.pending - self.active
+
+    def _run(self, func, submitted: float, *args):
+        started = time.monotonic()
+        with self._lock:
+            self.active += 1
+            self.total_wait += started - submitted
+        try:
+            return func(*args)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.pending -= 1
+                self.completed += 1
+                self.total_time += time.monotonic() - started
+
+    async def _submit(self, func, *args):
+        with self._lock:
+            self.pending += 1
+            self.max_queue_depth = max(self.max_queue_depth, self.queue_depth)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._run, func, time.monotonic(), *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._submit(get_password_hash, password)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        return await self._submit(verify_password, password, hashed_password)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "concurrency": self.concurrency,
+                "active": self.active,
+                "queue_depth": self.queue_depth,
+                "max_queue_depth": self.max_queue_depth,
+                "completed": self.completed,
+                "avg_wait_ms": round(self.total_wait / self.completed * 1000, 2) if self.completed else 0.0,
+                "avg_time_ms": round(self.total_time / self.completed * 1000, 2) if self.completed else 0.0,
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
+
+
+password_service = PasswordService()
@@ -2,16 +2,24 @@ import logging
 from typing import List, Optional
 
 from fastapi import APIRouter, Request, Depends, HTTPException, status
-from fastapi.responses import JSONResponse
+from fastapi.responses import PlainTextResponse
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 import db.crud as crud
+import db.jobs as jobs
+from app.metrics import render_metrics
+from db.cache import principal_cache, achievement_cache, reference_caches, response_cache, statement_cache
 from db.models.base_models import UserAchievementUpdate, RoleUpdate, RoleCreate, RoleDelete, ThrashTypeCreate, \
     ThrashTypeUpdate, ThrashTypeDelete, StatusCreate, StatusUpdate, StatusDelete, MapCreate, MapUpdate, MapDelete, \
     CourierCreate, UserGet, UserDelete, UserUpdate, CourierGet, CourierDelete, CourierUpdate, MapPointCreate, \
     MapPointGet, MapPointDelete, MapPointUpdate, AchievementCreate, AchievementUpdate, PointThrashGet, \
-    DeliveryRequestGet, DeliveryRequestDelete, DeliveryRequestUpdate, DeliveryRequestCreate
-from db.dispatcher import get_session
+    DeliveryRequestGet, DeliveryRequestDelete, DeliveryRequestUpdate, DeliveryRequestCreate, AddressCoordinatesCreate
+from db.models.sql_models import Role, ThrashType, Status, Map, Achievement
+from db.dispatcher import get_session, get_read_session, pool_status, check_schema, ping, schema_state, replica_set
+from settings import ACHIEVEMENTS_SPARSE
+from src.views.ingest import request_records
+from src.views.responses import ORJSONResponse, rows_response, cached_response
+from src.views.security import password_service
 
 logger = logging.getLogger(__name__)
 
@@ -24,11 +32,45 @@ async def healthcheck(request: Request):
     return {"status": "ok"}
 
 
+@router.get("/livez")
+async def livez():
+    return {"status": "alive"}
+
+
+@router.get("/readyz")
+async def readyz():
+    if not await check_schema():
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                              content={"status": "schema not at head", "schema": schema_state.dict()})
+    try:
+        await ping()
+    except Exception as e:
+        logger.error(f"readyz ping exception {e!r}")
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                              content={"status": "database unavailable", "pool": pool_status()})
+    return {"status": "ready"}
+
+
+@router.get("/healthcheck/pool")
+async def healthcheck_pool():
+    return pool_status()
+
+
+@router.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    caches = {"principal": principal_cache.stats(), "achievement": achievement_cache.stats(),
+              "response": response_cache.stats(), "statement": statement_cache.stats()}
+    caches.update({cache.name: cache.stats() for cache in reference_caches})
+    body = render_metrics({"db_pool": pool_status(), "password_hash": password_service.stats()},
+                          {"cache": caches, "db_replica": replica_set.stats()})
+    return PlainTextResponse(body, media_type="text/plain; version=0.0.4")
+
+
 @router.post("/role/create")
 async def create_role(roles: List[RoleCreate], db: AsyncSession = Depends(get_session)):
     roles = await crud.create_role(db, roles)
     if roles is not None:
-        return {"created": roles}
+        return {"created": roles.succeeded, "failed": roles.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't create role")
 
 
@@ -36,7 +78,7 @@ async def create_role(roles: List[RoleCreate], db: AsyncSession = Depends(get_se
 async def update_role(roles: List[RoleUpdate], db: AsyncSession = Depends(get_session)):
     roles = await crud.update_role(db, roles)
     if roles is not None:
-        return {"updated": roles}
+        return {"updated": roles.succeeded, "failed": roles.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update role")
 
 
@@ -44,24 +86,27 @@ async def update_role(roles: List[RoleUpdate], db: AsyncSession = Depends(get_se
 async def delete_role(roles: List[RoleDelete], db: AsyncSession = Depends(get_session)):
     roles = await crud.delete_role(db, roles)
     if roles is not None:
-        return {"deleted": roles}
+        return {"deleted": roles.succeeded, "failed": roles.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete role")
 
 
 @router.get("/roles")
-async def get_role(db: AsyncSession = Depends(get_session), role_id: Optional[int] = None,
+async def get_role(request: Request, db: AsyncSession = Depends(get_read_session), role_id: Optional[int] = None,
                    role_name: Optional[str] = None):
-    roles = await crud.get_role(db, role_id_filter=role_id, role_name_filter=role_name)
-    if roles is not None:
-        return {"roles": roles}
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+    async def roles():
+        found = await crud.get_role(db, role_id_filter=role_id, role_name_filter=role_name)
+        if found is not None:
+            return {"roles": found}
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+    return await cached_response(request, [Role.__tablename__], roles)
 
 
 @router.post("/thrash_type/create")
 async def create_thrash_type(thrash_types: List[ThrashTypeCreate], db: AsyncSession = Depends(get_session)):
     thrash_types = await crud.create_thrash_type(db, thrash_types)
     if thrash_types is not None:
-        return {"created": thrash_types}
+        return {"created": thrash_types.succeeded, "failed": thrash_types.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't create thrash_type")
 
 
@@ -69,7 +114,7 @@ async def create_thrash_type(thrash_types: List[ThrashTypeCreate], db: AsyncSess
 async def update_thrash_type(thrash_types: List[ThrashTypeUpdate], db: AsyncSession = Depends(get_session)):
     thrash_types = await crud.update_thrash_type(db, thrash_types)
     if thrash_types is not None:
-        return {"updated": thrash_types}
+        return {"updated": thrash_types.succeeded, "failed": thrash_types.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update thrash_type")
 
 
@@ -77,25 +122,28 @@ async def update_thrash_type(thrash_types: List[ThrashTypeUpdate], db: AsyncSess
 async def delete_thrash_type(thrash_types: List[ThrashTypeDelete], db: AsyncSession = Depends(get_session)):
     thrash_types = await crud.delete_thrash_type(db, thrash_types)
     if thrash_types is not None:
-        return {"deleted": thrash_types}
+        return {"deleted": thrash_types.succeeded, "failed": thrash_types.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete thrash_type")
 
 
 @router.get("/thrash_types")
-async def get_thrash_type(db: AsyncSession = Depends(get_session), thrash_type_id: Optional[int] = None,
-                          thrash_type_name: Optional[str] = None):
-    thrash_types = await crud.get_thrash_type(db, thrash_type_id_filter=thrash_type_id,
-                                              thrash_type_name_filter=thrash_type_name)
-    if thrash_types is not None:
-        return {"thrash_types": thrash_types}
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+async def get_thrash_type(request: Request, db: AsyncSession = Depends(get_read_session),
+                          thrash_type_id: Optional[int] = None, thrash_type_name: Optional[str] = None):
+    async def thrash_types():
+        found = await crud.get_thrash_type(db, thrash_type_id_filter=thrash_type_id,
+                                           thrash_type_name_filter=thrash_type_name)
+        if found is not None:
+            return {"thrash_types": found}
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+    return await cached_response(request, [ThrashType.__tablename__], thrash_types)
 
 
 @router.post("/status/create")
 async def create_status(statuses: List[StatusCreate], db: AsyncSession = Depends(get_session)):
     created = await crud.create_status(db, statuses)
     if created is not None:
-        return {"created": created}
+        return {"created": created.succeeded, "failed": created.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't create status")
 
 
@@ -103,7 +151,7 @@ async def create_status(statuses: List[StatusCreate], db: AsyncSession = Depends
 async def update_status(statuses: List[StatusUpdate], db: AsyncSession = Depends(get_session)):
     updated = await crud.update_status(db, statuses)
     if updated is not None:
-        return {"updated": updated}
+        return {"updated": updated.succeeded, "failed": updated.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update status")
 
 
@@ -111,25 +159,28 @@ async def update_status(statuses: List[StatusUpdate], db: AsyncSession = Depends
 async def delete_status(statuses: List[StatusDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_status(db, statuses)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete status")
 
 
 @router.get("/statuses")
-async def get_status(db: AsyncSession = Depends(get_session), status_id: Optional[int] = None,
+async def get_status(request: Request, db: AsyncSession = Depends(get_read_session), status_id: Optional[int] = None,
                      status_name: Optional[str] = None):
-    statuses = await crud.get_status(db, status_id_filter=status_id,
-                                     status_name_filter=status_name)
-    if statuses is not None:
-        return {"statuses": statuses}
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+    async def statuses():
+        found = await crud.get_status(db, status_id_filter=status_id,
+                                      status_name_filter=status_name)
+        if found is not None:
+            return {"statuses": found}
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+    return await cached_response(request, [Status.__tablename__], statuses)
 
 
 @router.post("/map/create")
 async def create_map(maps: List[MapCreate], db: AsyncSession = Depends(get_session)):
     created = await crud.create_map(db, maps)
     if created is not None:
-        return {"created": created}
+        return {"created": created.succeeded, "failed": created.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't create map")
 
 
@@ -137,7 +188,7 @@ async def create_map(maps: List[MapCreate], db: AsyncSession = Depends(get_sessi
 async def update_map(maps: List[MapUpdate], db: AsyncSession = Depends(get_session)):
     updated = await crud.update_map(db, maps)
     if updated is not None:
-        return {"updated": updated}
+        return {"updated": updated.succeeded, "failed": updated.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update map")
 
 
@@ -145,18 +196,21 @@ async def update_map(maps: List[MapUpdate], db: AsyncSession = Depends(get_sessi
 async def delete_map(maps: List[MapDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_map(db, maps)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete map")
 
 
 @router.get("/maps")
-async def get_map(db: AsyncSession = Depends(get_session), map_id: Optional[int] = None,
+async def get_map(request: Request, db: AsyncSession = Depends(get_read_session), map_id: Optional[int] = None,
                   map_city: Optional[str] = None):
-    maps = await crud.get_map(db, map_id_filter=map_id,
-                              map_city_filter=map_city)
-    if maps is not None:
-        return {"statuses": maps}
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+    async def maps():
+        found = await crud.get_map(db, map_id_filter=map_id,
+                                   map_city_filter=map_city)
+        if found is not None:
+            return {"statuses": found}
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+    return await cached_response(request, [Map.__tablename__], maps)
 
 
 @router.get("/user/achievements/sync")
@@ -168,7 +222,7 @@ async def user_achievements_sync(user_id: int, session: AsyncSession = Depends(g
 
 
 @router.get("/user/achievements")
-async def user_achievements(user_id: int, session: AsyncSession = Depends(get_session)):
+async def user_achievements(user_id: int, session: AsyncSession = Depends(get_read_session)):
     query = await crud.get_users_achievements(session, user_id)
     return query
 
@@ -178,34 +232,35 @@ async def user_achievement_update(update_data: List[UserAchievementUpdate],
                                   session: AsyncSession = Depends(get_session)):
     query = await crud.update_users_achievements(session, update_data)
     if query:
-        return JSONResponse(status_code=status.HTTP_200_OK, content="updated")
+        return ORJSONResponse(status_code=status.HTTP_200_OK, content="updated")
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
 
 
 @router.post("/courier/create")
 async def courier_create(update_data: CourierCreate,
                          session: AsyncSession = Depends(get_session)):
+    update_data.password = await password_service.hash(update_data.password)
     query = await crud.create_courier(session, update_data)
     if query:
         query = query.dict()
-        return JSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
+        return ORJSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
 
 
 @router.get("/couriers")
 async def couriers_get(filters: CourierGet = Depends(),
-                       session: AsyncSession = Depends(get_session)):
+                       session: AsyncSession = Depends(get_read_session)):
     query = await crud.get_couriers(session, filters)
     if query is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
-    return query
+    return rows_response(query)
 
 
 @router.post("/couriers/delete")
 async def delete_couriers(couriers: List[CourierDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_courier(db, couriers)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete couriers")
 
 
@@ -213,24 +268,24 @@ async def delete_couriers(couriers: List[CourierDelete], db: AsyncSession = Depe
 async def update_couriers(couriers: List[CourierUpdate], db: AsyncSession = Depends(get_session)):
     updated = await crud.update_couriers(db, couriers)
     if updated is not None:
-        return {"updated": updated}
+        return {"updated": updated.succeeded, "failed": updated.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update couriers")
 
 
 @router.get("/users")
 async def users_get(filters: UserGet = Depends(),
-                    session: AsyncSession = Depends(get_session)):
+                    session: AsyncSession = Depends(get_read_session)):
     query = await crud.get_users(session, filters)
     if query is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
-    return query
+    return rows_response(query)
 
 
 @router.post("/users/delete")
 async def delete_users(users: List[UserDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_user(db, users)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete users")
 
 
@@ -247,24 +302,25 @@ async def map_point_create(update_data: MapPointCreate,
                            session: AsyncSession = Depends(get_session)):
     query = await crud.create_map_point(session, update_data)
     if query:
-        return JSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
+        query = query.dict()
+        return ORJSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
 
 
 @router.post("/map/points")
 async def map_points_get(filters: MapPointGet,
-                         session: AsyncSession = Depends(get_session)):
+                         session: AsyncSession = Depends(get_read_session)):
     query = await crud.get_map_points(session, filters)
     if query is None:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
-    return query
+    return rows_response(query)
 
 
 @router.post("/map/points/delete")
 async def delete_map_points(map_points: List[MapPointDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_map_points(db, map_points)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete points")
 
 
@@ -277,22 +333,39 @@ async def update_map_points(map_points: List[MapPointUpdate], db: AsyncSession =
 
 
 @router.get("/achievements")
-async def achievements_get(session: AsyncSession = Depends(get_session), id: Optional[int] = None,
-                           title: Optional[str] = None):
-    query = await crud.get_achievements(session, id_filter=id, title_filter=title)
-    if query is not None:
-        return query
-    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+async def achievements_get(request: Request, session: AsyncSession = Depends(get_session),
+                           id: Optional[int] = None, title: Optional[str] = None):
+    # the body is kept in response_cache under the current table version, so it is read from the primary
+    async def achievements():
+        found = await crud.get_achievements(session, id_filter=id, title_filter=title)
+        if found is not None:
+            return found
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
+
+    return await cached_response(request, [Achievement.__tablename__], achievements)
 
 
 @router.post("/achievements/create")
 async def achievements_create(achievements: List[AchievementCreate], session: AsyncSession = Depends(get_session)):
     created = await crud.create_achievements(session, achievements)
+    if isinstance(created, list) and not ACHIEVEMENTS_SPARSE:
+        job = await jobs.create_job(session, jobs.ACHIEVEMENTS_BACKFILL,
+                                    achievement_ids=[achievement.id for achievement in created])
+        jobs.start_job(job)
+        return {"created": created, "backfill": jobs.job_dict(job)}
     if created is not None:
         return {"created": created}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't create achievements")
 
 
+@router.get("/jobs/{job_id}")
+async def job_get(job_id: str, session: AsyncSession = Depends(get_session)):
+    job = await jobs.get_job(session, job_id)
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+    return jobs.job_dict(job)
+
+
 @router.post("/achievements/update")
 async def achievements_update(achievements: List[AchievementUpdate], session: AsyncSession = Depends(get_session)):
     updated = await crud.update_achievements(session, achievements)
@@ -310,18 +383,18 @@ async def achievements_delete(achievements: List[AchievementUpdate], session: As
 
 
 @router.post("/map/points/thrash")
-async def get_point_thrash(filters: PointThrashGet, session: AsyncSession = Depends(get_session)):
+async def get_point_thrash(filters: PointThrashGet, session: AsyncSession = Depends(get_read_session)):
     sql = await crud.get_point_thrash(session, filters)
     if sql is not None:
-        return sql
+        return rows_response(sql)
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
 
 
 @router.post("/delivery/requests")
-async def get_delivery_request(filters: DeliveryRequestGet, session: AsyncSession = Depends(get_session)):
+async def get_delivery_request(filters: DeliveryRequestGet, session: AsyncSession = Depends(get_read_session)):
     sql = await crud.get_delivery_requests(session, filters)
     if sql is not None:
-        return sql
+        return rows_response(sql)
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Bad request")
 
 
@@ -334,7 +407,52 @@ async def delivery_request_create(data: DeliveryRequestCreate,
         query['create_date'] = query['create_date'].strftime('%d-%m-%Y')
         query['user_phone'] = data.user_phone
         query['courier_phone'] = data.courier_phone
-        return JSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
+        return ORJSONResponse(status_code=status.HTTP_201_CREATED, content={"created": query})
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
+
+
+@router.post("/delivery/requests/ingest")
+async def delivery_requests_ingest(request: Request, session: AsyncSession = Depends(get_session)):
+    """
+    NDJSON body, or CSV with a header line when sent as text/csv; one DeliveryRequestCreate per line.
+    """
+    records = request_records(request.headers.get("content-type"), request.stream())
+    report = await crud.ingest_delivery_requests(session, records)
+    return ORJSONResponse(status_code=status.HTTP_201_CREATED if report["created"] else status.HTTP_200_OK,
+                          content=report)
+
+
+@router.post("/addresses/coordinates")
+async def address_coordinates_create(items: List[AddressCoordinatesCreate],
+                                     session: AsyncSession = Depends(get_session)):
+    saved = await crud.create_address_coordinates(session, items)
+    if saved is not None:
+        return ORJSONResponse(status_code=status.HTTP_201_CREATED, content={"saved": saved})
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
+
+
+@router.post("/addresses/lookup")
+async def address_coordinates_lookup(addresses: List[str], session: AsyncSession = Depends(get_session)):
+    found = await crud.get_address_coordinates(session, addresses)
+    if found is not None:
+        return ORJSONResponse([{"address": address, "coordinates": coordinates}
+                               for address, coordinates in found.items()])
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
+
+
+@router.get("/delivery/dispatch/preview")
+async def delivery_dispatch_preview(session: AsyncSession = Depends(get_read_session)):
+    plan = await crud.plan_dispatch(session)
+    if plan is not None:
+        return ORJSONResponse(plan)
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
+
+
+@router.post("/delivery/dispatch")
+async def delivery_dispatch(session: AsyncSession = Depends(get_session)):
+    result = await crud.apply_dispatch(session)
+    if result is not None:
+        return ORJSONResponse(result)
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="something went wrong")
 
 
@@ -342,7 +460,7 @@ async def delivery_request_create(data: DeliveryRequestCreate,
 async def delete_delivery_request(delete_data: List[DeliveryRequestDelete], db: AsyncSession = Depends(get_session)):
     deleted = await crud.delete_delivery_requests(db, delete_data)
     if deleted is not None:
-        return {"deleted": deleted}
+        return {"deleted": deleted.succeeded, "failed": deleted.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't delete delivery requests")
 
 
@@ -350,6 +468,6 @@ async def delete_delivery_request(delete_data: List[DeliveryRequestDelete], db:
 async def update_delivery_request(update_data: List[DeliveryRequestUpdate], db: AsyncSession = Depends(get_session)):
     updated = await crud.update_delivery_requests(db, update_data)
     if updated is not None:
-        return {"updated": updated}
+        return {"updated": updated.succeeded, "failed": updated.failed}
     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Couldn't update delivery requests")
 
@@ -0,0 +1,61 @@
+"""
+Tests taking the db fixture run against POSTGRES_TEST_DB, a migrated database they empty before every test,
+and are skipped when it is not set. The other tests never connect.
+"""
+import asyncio
+import os
+
+import pytest
+
+TEST_DATABASE = os.getenv("POSTGRES_TEST_DB")
+if TEST_DATABASE:
+    # before settings is imported, so the engine points at the test database
+    os.environ["POSTGRES_DB"] = TEST_DATABASE
+
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import SQLModel  # noqa: E402
+
+from db import cache  # noqa: E402
+from db.dispatcher import async_session, engine  # noqa: E402
+from db.spatial import map_points_index  # noqa: E402
+
+
+def reset_caches():
+    for reference_cache in cache.reference_caches:
+        reference_cache.invalidate()
+        reference_cache._lock = None
+    for lru in [cache.principal_cache, cache.achievement_cache, cache.search_cache, cache.address_cache,
+                cache.response_cache, cache.statement_cache]:
+        lru.clear()
+    map_points_index.clear()
+    map_points_index.invalidate()
+    map_points_index._lock = None
+
+
+@pytest.fixture
+def db():
+    """
+    Runs scenario(session) on an empty database: db(scenario) returns what it returns.
+    """
+    if not TEST_DATABASE:
+        pytest.skip("POSTGRES_TEST_DB is not set")
+
+    async def run(scenario):
+        tables = ", ".join(f'"{table.name}"' for table in SQLModel.metadata.sorted_tables)
+        try:
+            async with engine.begin() as conn:
+                await conn.execute(text(f"TRUNCATE {tables} RESTART IDENTITY CASCADE"))
+            reset_caches()
+            async with async_session() as session:
+                return await scenario(session)
+        finally:
+            reset_caches()
+            await engine.dispose()
+
+    return lambda scenario: asyncio.run(run(scenario))
+
+
+async def execute(session, sql: str, **params):
+    res = await session.execute(text(sql), params)
+    await session.commit()
+    return res
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+from db import crud
+from db.cache import invalidation_channel
+from db.models.base_models import UserAchievementUpdate
+from db.models.sql_models import Achievement
+from tests.conftest import execute
+
+
+async def setup_sparse(session, monkeypatch):
+    monkeypatch.setattr(crud, "ACHIEVEMENTS_SPARSE", True)
+    await execute(session, "INSERT INTO \"user\" (phone_number, password) VALUES ('1', 'x')")
+    await execute(session, "INSERT INTO achievement (title, description) "
+                           "VALUES ('first', 'a'), ('second', 'b'), ('third', NULL)")
+
+
+def test_sparse_mode_merges_link_rows_into_the_catalogue(db, monkeypatch):
+    unlock_date = datetime(2022, 5, 1, 12, 0)
+
+    async def scenario(session):
+        await setup_sparse(session, monkeypatch)
+        # sparse mode stores nothing for a user until an achievement is unlocked
+        assert await crud.sync_users_achievements(session, 1) is None
+        assert [(item["title"], item["unlocked"]) for item in await crud.get_users_achievements(session, 1)] == \
+            [("first", False), ("second", False), ("third", False)]
+
+        stored = await crud.update_users_achievements(session, [
+            UserAchievementUpdate(user_id=1, achievement_id=2, unlocked=True, unlock_date=unlock_date)])
+        assert [(row["achievement_id"], row["unlocked"]) for row in stored] == [(2, True)]
+
+        achievements = await crud.get_users_achievements(session, 1)
+        assert achievements == [
+            {"id": 1, "title": "first", "description": "a", "unlock_date": None, "unlocked": False},
+            {"id": 2, "title": "second", "description": "b", "unlock_date": unlock_date, "unlocked": True},
+            {"id": 3, "title": "third", "description": None, "unlock_date": None, "unlocked": False},
+        ]
+
+    db(scenario)
+
+
+def test_sparse_mode_locking_drops_the_link_row(db, monkeypatch):
+    async def scenario(session):
+        await setup_sparse(session, monkeypatch)
+        await crud.update_users_achievements(session, [
+            UserAchievementUpdate(user_id=1, achievement_id=1, unlocked=True, unlock_date=datetime(2022, 5, 1)),
+            UserAchievementUpdate(user_id=1, achievement_id=3, unlocked=True, unlock_date=datetime(2022, 5, 2))])
+        await crud.update_users_achievements(session, [
+            UserAchievementUpdate(user_id=1, achievement_id=1, unlocked=False, unlock_date=None)])
+
+        res = await execute(session, "SELECT achievement_id FROM userachievementlink")
+        assert res.scalars().all() == [3]
+        assert [item["unlocked"] for item in await crud.get_users_achievements(session, 1)] == [False, False, True]
+
+    db(scenario)
+
+
+def test_catalogue_is_reloaded_after_an_invalidation(db, monkeypatch):
+    async def scenario(session):
+        await setup_sparse(session, monkeypatch)
+        assert len(await crud.get_users_achievements(session, 1)) == 3
+
+        await execute(session, "INSERT INTO achievement (title) VALUES ('fourth')")
+        assert len(await crud.get_users_achievements(session, 1)) == 3
+        await invalidation_channel.invalidate(Achievement.__tablename__)
+        assert [item["title"] for item in await crud.get_users_achievements(session, 1)][-1] == "fourth"
+
+    db(scenario)
@@ -0,0 +1,32 @@
+from db.addresses import normalise_address
+
+
+def test_abbreviations_and_filler_words_share_one_key():
+    key = normalise_address("улица Ленина 5")
+    assert key == "улица ленина 5"
+    assert normalise_address("ул. Ленина, д. 5") == key
+    assert normalise_address("Ул Ленина, дом 5") == key
+    assert normalise_address("пр-т Мира, 10, корп. 2, кв. 7") == "проспект мира 10 корпус 2 квартира 7"
+    assert normalise_address("г. Москва, Кутузовский просп., 1 стр. 3") == \
+        "город москва кутузовский проспект 1 строение 3"
+    assert normalise_address("12 Baker St.") == "12 baker street"
+
+
+def test_case_yo_punctuation_and_whitespace_are_ignored():
+    key = normalise_address("ул. Королёва, 7")
+    assert key == "улица королева 7"
+    assert normalise_address("  УЛ.   КОРОЛЕВА ,7 ") == key
+    assert normalise_address("«ул. Королёва»; №7") == key
+    assert normalise_address("ул.\tКоролёва\n7") == key
+
+
+def test_abbreviations_inside_words_are_kept():
+    # only whole tokens are expanded, "ш" in "шоссейная" or "д" in "дмитровка" are not
+    assert normalise_address("Шоссейная ул., 3") == "шоссейная улица 3"
+    assert normalise_address("Малая Дмитровка, д.5") == "малая дмитровка 5"
+    assert normalise_address("5-й пер.") == "5-й переулок"
+
+
+def test_empty_addresses():
+    assert normalise_address("") == ""
+    assert normalise_address(" ., ") == ""
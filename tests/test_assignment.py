@@ -0,0 +1,93 @@
+import itertools
+from collections import Counter
+
+import numpy as np
+import pytest
+
+from db import assignment
+from db.spatial import haversine
+
+
+def brute_force(cost: np.ndarray, capacities) -> float:
+    """
+    Lowest total cost over every assignment matching as many rows as the capacities allow.
+    """
+    n, m = cost.shape
+    size = min(n, sum(min(capacity, n) for capacity in capacities))
+    best = np.inf
+    for choice in itertools.product([None] + list(range(m)), repeat=n):
+        used = Counter(column for column in choice if column is not None)
+        if sum(used.values()) != size or any(used[column] > capacities[column] for column in used):
+            continue
+        best = min(best, sum(cost[row, column] for row, column in enumerate(choice) if column is not None))
+    return best
+
+
+def check_pairs(pairs, shape, capacities):
+    rows = [row for row, _ in pairs]
+    assert len(rows) == len(set(rows))
+    assert all(0 <= row < shape[0] and 0 <= column < shape[1] for row, column in pairs)
+    assert all(count <= capacities[column] for column, count in Counter(column for _, column in pairs).items())
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_hungarian_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    n = int(rng.integers(1, 6))
+    cost = rng.integers(0, 100, size=(n, n + int(rng.integers(0, 3)))).astype(float)
+    pairs = assignment.hungarian(cost)
+    assert sorted(row for row, _ in pairs) == list(range(n))
+    assert len({column for _, column in pairs}) == n
+    assert sum(cost[row, column] for row, column in pairs) == pytest.approx(brute_force(cost, [1] * cost.shape[1]))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_assign_with_capacities_is_optimal(seed):
+    rng = np.random.default_rng(seed)
+    n, m = int(rng.integers(1, 6)), int(rng.integers(1, 4))
+    cost = rng.random((n, m)) * 1000
+    capacities = [int(capacity) for capacity in rng.integers(0, 3, size=m)]
+    method, pairs = assignment.assign(cost, capacities)
+    check_pairs(pairs, cost.shape, capacities)
+    if not sum(capacities):
+        assert (method, pairs) == ("none", [])
+        return
+    assert method == "hungarian"
+    assert len(pairs) == min(n, sum(capacities))
+    assert sum(cost[row, column] for row, column in pairs) == pytest.approx(brute_force(cost, capacities))
+
+
+def test_greedy_above_the_cell_limit(monkeypatch):
+    rng = np.random.default_rng(1)
+    cost = rng.random((30, 5))
+    capacities = [4, 4, 4, 4, 4]
+    monkeypatch.setattr(assignment, "DISPATCH_HUNGARIAN_MAX_CELLS", 30 * 20 - 1)
+    method, pairs = assignment.assign(cost, capacities)
+    assert method == "greedy"
+    assert len(pairs) == 20
+    check_pairs(pairs, cost.shape, capacities)
+    monkeypatch.setattr(assignment, "DISPATCH_HUNGARIAN_MAX_CELLS", 30 * 20)
+    assert assignment.assign(cost, capacities)[0] == "hungarian"
+
+
+def test_greedy_takes_the_shortest_pair_first():
+    cost = np.array([[1.0, 2.0], [1.5, 10.0]])
+    assert assignment.greedy(cost, [1, 1]) == [(0, 0), (1, 1)]
+    assert assignment.greedy(cost, [2, 0]) == [(0, 0), (1, 0)]
+    assert assignment.assign(np.zeros((0, 2)), [1, 1]) == ("none", [])
+
+
+def test_distance_matrix_matches_haversine():
+    origins = [(55.75, 37.61), (59.93, 30.31), (-33.87, 151.21)]
+    targets = [(55.76, 37.62), (0.0, 0.0)]
+    matrix = assignment.distance_matrix(origins, targets)
+    assert matrix.shape == (3, 2)
+    for i, origin in enumerate(origins):
+        for j, target in enumerate(targets):
+            assert matrix[i, j] == pytest.approx(haversine(*origin, *target), rel=1e-9)
+
+
+def test_solve():
+    cost, method, pairs = assignment.solve([(55.75, 37.61), (55.80, 37.70)], [(55.80, 37.71), (55.75, 37.60)], [1, 1])
+    assert method == "hungarian" and pairs == [(0, 1), (1, 0)]
+    assert cost.shape == (2, 2)
@@ -0,0 +1,117 @@
+from db import bulk, crud
+from db.models.base_models import CourierUpdate, DeliveryRequestUpdate, RoleCreate, RoleDelete, RoleUpdate, \
+    ThrashTypeDelete, UserDelete
+from db.models.sql_models import Courier
+from src.views import views
+from tests.conftest import execute
+
+
+async def scalars(session, sql: str, **params) -> list:
+    return (await execute(session, sql, **params)).scalars().all()
+
+
+def test_create_reports_duplicates_and_existing_names(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO role (name) VALUES ('admin')")
+        result = await views.create_role([RoleCreate(name=name) for name in ["admin", "courier", "user", "courier"]],
+                                         db=session)
+        assert set(result) == {"created", "failed"}
+        assert [row["name"] for row in result["created"]] == ["courier", "user"]
+        assert result["failed"] == [{"item": "courier", "error": "duplicate in request"},
+                                    {"item": "admin", "error": "already exists"}]
+        assert await scalars(session, "SELECT name FROM role ORDER BY id") == ["admin", "courier", "user"]
+
+    db(scenario)
+
+
+def test_update_fails_per_item(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO role (name) VALUES ('admin'), ('courier')")
+        result = await views.update_role([RoleUpdate(old_name="admin", new_name="root"),
+                                          RoleUpdate(old_id=2, old_name="missing", new_name="x"),
+                                          RoleUpdate(old_id=99, new_name="y"),
+                                          RoleUpdate(old_id=2, new_name="carrier")], db=session)
+        assert [row["name"] for row in result["updated"]] == ["root", "carrier"]
+        # the old name wins over the old id, so the second item is not found although id 2 exists
+        assert [failure["item"]["new_name"] for failure in result["failed"]] == ["x", "y"]
+        assert {failure["error"] for failure in result["failed"]} == {"not found"}
+        assert await scalars(session, "SELECT name FROM role ORDER BY id") == ["root", "carrier"]
+
+    db(scenario)
+
+
+def test_null_cells_keep_the_stored_values(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO courier (phone_number, username, name, surname, salary, password, role) "
+                               "VALUES ('8 (900) 000-00-01', 'ivan', 'Иван', 'Петров', 100, 'secret', 'courier'), "
+                               "('8 (900) 000-00-02', 'anna', 'Анна', 'Смирнова', 200, 'secret', 'courier')")
+        result = await crud.update_couriers(session, [
+            CourierUpdate(phone_number="8 (900) 000-00-01", salary=150),
+            CourierUpdate(username="anna", name="Аня"),
+            CourierUpdate(phone_number="8 (900) 000-00-09", name="Никто"),
+        ])
+        assert [(row["username"], row["name"], row["surname"], row["salary"]) for row in result.succeeded] == \
+            [("ivan", "Иван", "Петров", 150), ("anna", "Аня", "Смирнова", 200)]
+        assert all("password" not in row for row in result.succeeded)
+        assert [failure["error"] for failure in result.failed] == ["not found"]
+        assert await scalars(session, "SELECT password FROM courier") == ["secret", "secret"]
+
+    db(scenario)
+
+
+def test_update_from_rows_without_keep_existing_writes_nulls(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO courier (phone_number, name, salary, password, role) "
+                               "VALUES ('8 (900) 000-00-01', 'Иван', 100, 'secret', 'courier')")
+        rows = await bulk.update_from_rows(session, Courier.__table__, [{"id": 1, "name": None, "salary": 120.0}],
+                                           ["id", "name", "salary"], keep_existing=False)
+        await session.commit()
+        assert (rows[0]["name"], rows[0]["salary"]) == (None, 120.0)
+
+    db(scenario)
+
+
+def test_delivery_request_update_resolves_references_per_batch(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO status (status_name) VALUES ('new'), ('done')")
+        await execute(session, "INSERT INTO deliveryrequest (address, price, create_date, status_id) "
+                               "VALUES ('a', 10, '2022-01-01', 1), ('b', 20, '2022-01-02', 1)")
+        result = await crud.update_delivery_requests(session, [
+            DeliveryRequestUpdate(id_req=1, status="done", price=None),
+            DeliveryRequestUpdate(id_req=2, address="c", price="25"),
+            DeliveryRequestUpdate(id_req=3, address="d"),
+        ])
+        assert [(row["id"], row["address"], row["price"], row["status_id"]) for row in result.succeeded] == \
+            [(1, "a", 10.0, 2), (2, "c", 25.0, 1)]
+        assert [failure["item"]["id_req"] for failure in result.failed] == [3]
+
+    db(scenario)
+
+
+def test_delete_detaches_dependents(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO role (name) VALUES ('admin'), ('courier')")
+        await execute(session, "INSERT INTO \"user\" (phone_number, password, role_id) "
+                               "VALUES ('8 (900) 000-00-01', 'x', 1), ('8 (900) 000-00-02', 'x', 2)")
+        await execute(session, "INSERT INTO achievement (title) VALUES ('first')")
+        await execute(session, "INSERT INTO userachievementlink (user_id, achievement_id, unlocked) "
+                               "VALUES (1, 1, true), (2, 1, false)")
+        await execute(session, "INSERT INTO thrashtype (thrash_type) VALUES ('glass'), ('paper')")
+        await execute(session, "INSERT INTO mappoint (title, address, coordinates) VALUES ('p', 'a', '{55, 37}')")
+        await execute(session, "INSERT INTO pointthrashlink (thrash_type_id, map_point_id) VALUES (1, 1), (2, 1)")
+
+        result = await views.delete_role([RoleDelete(name="admin"), RoleDelete(id=42)], db=session)
+        assert [row["name"] for row in result["deleted"]] == ["admin"]
+        assert [failure["error"] for failure in result["failed"]] == ["not found"]
+        assert await scalars(session, "SELECT role_id FROM \"user\" ORDER BY id") == [None, 2]
+
+        deleted = await crud.delete_thrash_type(session, [ThrashTypeDelete(thrash_type="glass")])
+        assert [row["thrash_type"] for row in deleted.succeeded] == ["glass"]
+        assert await scalars(session, "SELECT thrash_type_id FROM pointthrashlink") == [2]
+
+        deleted = await crud.delete_user(session, [UserDelete(phone="8 (900) 000-00-01")])
+        assert [row["phone_number"] for row in deleted.succeeded] == ["8 (900) 000-00-01"]
+        assert all("password" not in row for row in deleted.succeeded)
+        assert await scalars(session, "SELECT user_id FROM userachievementlink") == [2]
+
+    db(scenario)
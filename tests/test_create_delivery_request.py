@@ -0,0 +1,70 @@
+from datetime import datetime, timedelta, timezone
+
+from db import crud
+from db.models.base_models import DeliveryRequestCreate
+from tests.conftest import execute
+
+COURIER_PHONE = "8 (900) 000-00-01"
+USER_PHONE = "8 (900) 000-00-02"
+
+
+async def reference_rows(session):
+    await execute(session, "INSERT INTO status (status_name) VALUES (:name)", name=crud.NEW_REQUEST_STATUS)
+    await execute(session, "INSERT INTO thrashtype (thrash_type) VALUES ('glass'), ('paper')")
+    await execute(session, "INSERT INTO courier (phone_number, password, role) VALUES (:phone, 'x', 'courier')",
+                  phone=COURIER_PHONE)
+    await execute(session, "INSERT INTO \"user\" (phone_number, password) VALUES (:phone, 'x')", phone=USER_PHONE)
+
+
+def request(**changes) -> DeliveryRequestCreate:
+    values = {"courier_phone": COURIER_PHONE, "user_phone": USER_PHONE, "address": "Тверская, 1",
+              "create_date": datetime(2022, 1, 1, 10, tzinfo=timezone(timedelta(hours=3))),
+              "thrash_types": ["glass", "paper", "glass"], "price": 120.5}
+    return DeliveryRequestCreate(**dict(values, **changes))
+
+
+async def links(session, request_id: int) -> list:
+    # DeliveryThrashLink.thrash_type_id references the request and request_id the thrash type
+    res = await execute(session, "SELECT t.thrash_type FROM deliverythrashlink l "
+                                 "JOIN thrashtype t ON t.id = l.request_id WHERE l.thrash_type_id = :id "
+                                 "ORDER BY t.thrash_type", id=request_id)
+    return res.scalars().all()
+
+
+def test_creates_the_request_and_its_links(db):
+    async def scenario(session):
+        await reference_rows(session)
+        created = await crud.create_delivery_request(session, request())
+        assert created.price == 120.5
+        assert created.create_date == datetime(2022, 1, 1, 7)
+        assert created.status_id is not None and created.id_courier is not None and created.id_user is not None
+        assert await links(session, created.id) == ["glass", "paper"]
+
+    db(scenario)
+
+
+def test_unknown_thrash_type_fails_the_create(db):
+    async def scenario(session):
+        await reference_rows(session)
+        assert await crud.create_delivery_request(session, request(thrash_types=["glass", "plutonium"])) is None
+        res = await execute(session, "SELECT count(*) FROM deliveryrequest")
+        assert res.scalar() == 0
+
+    db(scenario)
+
+
+def test_null_price_is_stored_as_zero(db):
+    async def scenario(session):
+        await reference_rows(session)
+        created = await crud.create_delivery_request(session, request(price=None))
+        assert created.price == 0.0
+
+    db(scenario)
+
+
+def test_unknown_courier_fails_the_create(db):
+    async def scenario(session):
+        await reference_rows(session)
+        assert await crud.create_delivery_request(session, request(courier_phone="8 (900) 000-00-09")) is None
+
+    db(scenario)
@@ -0,0 +1,76 @@
+from datetime import date
+
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlmodel import select
+
+from db.cache import statement_cache
+from db.crud import (
+    DELIVERY_REQUEST_FILTERS,
+    USER_FILTERS,
+    delivery_requests_select,
+    filter_statement,
+    filter_values,
+)
+from db.models.base_models import DeliveryRequestGet, UserGet
+from db.models.sql_models import Role, User
+
+
+@pytest.fixture(autouse=True)
+def clear_statements():
+    statement_cache.clear()
+    yield
+    statement_cache.clear()
+
+
+def users_statement(filters: UserGet):
+    return filter_statement("users", lambda: select(User.id, Role.name).outerjoin(Role),
+                            USER_FILTERS, filter_values(filters, USER_FILTERS))
+
+
+def test_mask_follows_the_set_filters():
+    key, _, params = users_statement(UserGet(name_filter="Иван", role_filter="admin"))
+    assert key == ("users", 0b10001)
+    assert params == {"name_filter": "Иван", "role_filter": "admin"}
+    key, _, params = users_statement(UserGet(birthday_filter_from=date(2000, 1, 1)))
+    assert key == ("users", 0b00100)
+    assert params == {"birthday_filter_from": date(2000, 1, 1)}
+    assert users_statement(UserGet())[::2] == (("users", 0), {})
+
+
+def test_values_do_not_change_the_statement():
+    _, first, _ = users_statement(UserGet(name_filter="Иван", last_name_filter="Петров"))
+    _, second, params = users_statement(UserGet(name_filter="Анна", last_name_filter="Смирнова"))
+    assert second is first
+    assert params == {"name_filter": "Анна", "last_name_filter": "Смирнова"}
+    sql = str(first.compile(dialect=postgresql.dialect()))
+    assert "%(name_filter)s" in sql and "%(last_name_filter)s" in sql
+    assert "Иван" not in sql and "Анна" not in sql
+    _, other, _ = users_statement(UserGet(name_filter="Иван"))
+    assert other is not first
+
+
+def test_build_runs_once_per_combination():
+    calls = []
+
+    def build():
+        calls.append(1)
+        return select(User.id)
+
+    for name in ["a", "b", "c"]:
+        filter_statement("counted", build, USER_FILTERS, {"name_filter": name})
+    filter_statement("counted", build, USER_FILTERS, {"role_filter": "admin"})
+    assert len(calls) == 2
+
+
+def test_shape_is_part_of_the_key():
+    filters = DeliveryRequestGet(status_filter="new")
+    values = filter_values(filters, DELIVERY_REQUEST_FILTERS)
+    flat_key, flat, _ = filter_statement("delivery_requests", lambda: delivery_requests_select(False),
+                                         DELIVERY_REQUEST_FILTERS, values, False)
+    grouped_key, grouped, _ = filter_statement("delivery_requests", lambda: delivery_requests_select(True),
+                                               DELIVERY_REQUEST_FILTERS, values, True)
+    status_bit = 1 << [field for field, _ in DELIVERY_REQUEST_FILTERS].index("status_filter")
+    assert flat_key == ("delivery_requests", status_bit, False)
+    assert grouped_key == ("delivery_requests", status_bit, True)
+    assert grouped is not flat
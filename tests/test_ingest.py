@@ -0,0 +1,63 @@
+import asyncio
+
+import orjson
+
+from db import crud
+from src.views.ingest import is_csv, request_records
+
+CSV_HEADER = "courier_phone,user_phone,address,create_date,thrash_types,price\n"
+
+
+async def feed(*chunks: bytes):
+    for chunk in chunks:
+        yield chunk
+
+
+def parse(content_type: str, *chunks: bytes) -> list:
+    async def collect():
+        return [record async for record in request_records(content_type, feed(*chunks))]
+    return asyncio.run(collect())
+
+
+def test_is_csv():
+    assert is_csv("text/csv; charset=utf-8")
+    assert is_csv("Application/CSV")
+    assert not is_csv("application/x-ndjson")
+    assert not is_csv(None)
+
+
+def test_ndjson_errors_and_line_numbers():
+    records = parse("application/x-ndjson",
+                    b'{"address": "a"}\n\n[1, 2]\n{"addr', b'ess": "b"}\nnot json\n  \n{"address": "c"}')
+    assert [(line_no, item) for line_no, item, error in records if error is None] == \
+        [(1, {"address": "a"}), (4, {"address": "b"}), (7, {"address": "c"})]
+    errors = {line_no: error for line_no, _, error in records if error is not None}
+    assert set(errors) == {3, 5}
+    assert errors[3] == "expected a json object"
+    assert errors[5].startswith("invalid json: ")
+
+
+def test_csv_records():
+    records = parse("text/csv", b"\xef\xbb\xbf" + CSV_HEADER.encode(),
+                    "8 900 000-00-01,8 900 000-00-02,\"Тверская, 1\",2022-01-01T10:00:00,стекло; бумага ;,\r\n"
+                    .encode(), b"\n1,2,3\n", "a,b,c,d,,5".encode())
+    line_no, item, error = records[0]
+    assert (line_no, error) == (2, None)
+    assert item == {"courier_phone": "8 900 000-00-01", "user_phone": "8 900 000-00-02", "address": "Тверская, 1",
+                    "create_date": "2022-01-01T10:00:00", "thrash_types": ["стекло", "бумага"], "price": None}
+    assert records[1] == (4, None, "expected 6 columns, got 3")
+    assert records[2][0] == 5 and records[2][1]["thrash_types"] == [] and records[2][1]["price"] == "5"
+    assert len(records) == 3
+
+
+def test_report_lists_failed_lines(monkeypatch):
+    monkeypatch.setattr(crud, "INGEST_MAX_ERRORS", 2)
+    lines = [orjson.dumps({"courier_phone": "1", "user_phone": "2", "address": "a", "thrash_types": []}),
+             b"{", orjson.dumps({"courier_phone": "1"})]
+    records = request_records("application/x-ndjson", feed(b"\n".join(lines)))
+    # every line fails before a batch is loaded, so the session is never used
+    report = asyncio.run(crud.ingest_delivery_requests(None, records))
+    assert report["created"] == 0 and report["failed_count"] == 3
+    assert [failure["line"] for failure in report["failed"]] == [1, 2]
+    assert report["failed"][0]["error"] == "create_date: field required"
+    assert report["failed"][1]["item"] is None and report["failed"][1]["error"].startswith("invalid json")
@@ -0,0 +1,90 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from db import jobs
+from settings import JOB_STALE_AFTER
+from tests.conftest import execute
+
+
+async def insert_job(session, job_id: str, status: str, age: float, kind: str = jobs.ACHIEVEMENTS_BACKFILL):
+    await execute(session, "INSERT INTO job (id, kind, status, done, params, updated_at) "
+                           "VALUES (:id, :kind, :status, 0, CAST(:params AS jsonb), :updated_at)",
+                  id=job_id, kind=kind, status=status, params='{"achievement_ids": [1]}',
+                  updated_at=datetime.utcnow() - timedelta(seconds=age))
+
+
+async def statuses(session) -> dict:
+    res = await execute(session, "SELECT id, status FROM job")
+    return dict(res.all())
+
+
+def test_backfill_job_links_every_user_and_reports_progress(db):
+    async def scenario(session):
+        await execute(session, "INSERT INTO \"user\" (phone_number, password) VALUES ('1', 'x'), ('2', 'x')")
+        await execute(session, "INSERT INTO achievement (title) VALUES ('first')")
+        job = await jobs.create_job(session, jobs.ACHIEVEMENTS_BACKFILL, achievement_ids=[1])
+        jobs.start_job(job)
+        assert job.id in jobs.running
+        await jobs.running[job.id]
+        await asyncio.sleep(0)
+        assert job.id not in jobs.running
+
+        # the runner wrote through its own session
+        session.expunge(job)
+        stored = jobs.job_dict(await jobs.get_job(session, job.id))
+        assert (stored["status"], stored["done"], stored["total"], stored["error"]) == ("done", 2, 2, None)
+        assert stored["started_at"] <= stored["finished_at"]
+        res = await execute(session, "SELECT count(*) FROM userachievementlink WHERE NOT unlocked")
+        assert res.scalar() == 2
+
+    db(scenario)
+
+
+def test_resume_claims_interrupted_and_stale_jobs_once(db, monkeypatch):
+    started = []
+
+    async def runner(job_id, **params):
+        started.append((job_id, params))
+
+    monkeypatch.setitem(jobs.RUNNERS, jobs.ACHIEVEMENTS_BACKFILL, runner)
+
+    async def scenario(session):
+        await insert_job(session, "interrupted", "interrupted", 0)
+        await insert_job(session, "stale", "running", JOB_STALE_AFTER + 60)
+        await insert_job(session, "fresh", "running", 0)
+        await insert_job(session, "finished", "done", JOB_STALE_AFTER + 60)
+        await insert_job(session, "unknown", "interrupted", 0, kind="gone")
+
+        await jobs.resume_jobs()
+        await asyncio.gather(*jobs.running.values())
+        assert sorted(started) == [("interrupted", {"achievement_ids": [1]}), ("stale", {"achievement_ids": [1]})]
+        assert await statuses(session) == {"interrupted": "pending", "stale": "pending", "fresh": "running",
+                                           "finished": "done", "unknown": "interrupted"}
+
+        # claimed jobs are fresh again, so a second worker starting now leaves them alone
+        await jobs.resume_jobs()
+        assert len(started) == 2
+
+    db(scenario)
+
+
+def test_stop_marks_the_running_jobs_interrupted(db, monkeypatch):
+    async def runner(job_id, **params):
+        await asyncio.sleep(60)
+
+    monkeypatch.setitem(jobs.RUNNERS, jobs.ACHIEVEMENTS_BACKFILL, runner)
+
+    async def scenario(session):
+        await insert_job(session, "running", "running", 0)
+        await insert_job(session, "other", "running", 0)
+        jobs.start_job(jobs.Job(id="running", kind=jobs.ACHIEVEMENTS_BACKFILL, params={}))
+        task = jobs.running["running"]
+        await asyncio.sleep(0)
+
+        await jobs.stop_jobs()
+        assert task.cancelled()
+        assert not jobs.running
+        # only the jobs of this worker are interrupted
+        assert await statuses(session) == {"running": "interrupted", "other": "running"}
+
+    db(scenario)
@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import Column, Integer, MetaData, String, Table, select
+
+from db import pagination
+from db.models.base_models import PageGet
+from settings import PAGE_SIZE, PAGE_SIZE_MAX
+
+table = Table("item", MetaData(), Column("id", Integer, primary_key=True), Column("name", String))
+KEYS = [(table.c.name, "name"), (table.c.id, "id")]
+
+
+def rows(count: int):
+    return [SimpleNamespace(id=i, name=f"item {i:03}") for i in range(1, count + 1)]
+
+
+@pytest.mark.parametrize("values", [[1], [42, "ёж"], ["2022-01-01T00:00:00", 7], [None, 0]])
+def test_cursor_round_trip(values):
+    cursor = pagination.encode_cursor(values)
+    assert "=" not in cursor
+    assert pagination.decode_cursor(cursor) == values
+
+
+def test_malformed_cursor():
+    with pytest.raises(ValueError):
+        pagination.decode_cursor(pagination.encode_cursor({"id": 1}).rstrip("="))
+    with pytest.raises(ValueError):
+        pagination.decode_cursor("not a cursor")
+
+
+def test_keyset_params():
+    cursor = pagination.encode_cursor(["item 005", 5])
+    assert pagination.keyset_params(KEYS, cursor, 11) == {"after_0": "item 005", "after_1": 5, "page_limit": 11}
+    assert pagination.keyset_params(KEYS) == {}
+    with pytest.raises(ValueError):
+        pagination.keyset_params(KEYS, pagination.encode_cursor([5]))
+
+
+def test_keyset_binds_cursor_and_limit():
+    sql = str(pagination.keyset(select(table), KEYS, after=True, limit=True))
+    assert "(item.name, item.id) > (:after_0, :after_1)" in sql
+    assert "ORDER BY item.name, item.id" in sql
+    assert "LIMIT :page_limit" in sql
+    sql = str(pagination.keyset(select(table), KEYS[1:], after=True))
+    assert "item.id > :after_0" in sql and "LIMIT" not in sql
+
+
+def test_page_boundaries():
+    result = pagination.page(rows(11), KEYS, 10)
+    assert len(result["items"]) == 10
+    assert pagination.decode_cursor(result["after"]) == ["item 010", 10]
+    assert pagination.page(rows(10), KEYS, 10) == {"items": rows(10), "after": None}
+    assert pagination.page([], KEYS, 10) == {"items": [], "after": None}
+
+
+def test_pages_cover_every_row_once():
+    data = rows(25)
+    seen, after = [], None
+    while True:
+        params = pagination.keyset_params(KEYS, after)
+        start = [(row.name, row.id) for row in data].index((params["after_0"], params["after_1"])) + 1 if after else 0
+        result = pagination.page(data[start:start + 11], KEYS, 10)
+        seen.extend(row.id for row in result["items"])
+        after = result["after"]
+        if after is None:
+            break
+    assert seen == list(range(1, 26))
+
+
+def test_page_size():
+    assert pagination.page_size(PageGet()) == PAGE_SIZE
+    assert pagination.page_size(PageGet(limit=0)) == PAGE_SIZE
+    assert pagination.page_size(PageGet(limit=-5)) == 1
+    assert pagination.page_size(PageGet(limit=PAGE_SIZE_MAX + 1)) == PAGE_SIZE_MAX
+    assert not pagination.is_paged(PageGet())
+    assert pagination.is_paged(PageGet(after=pagination.encode_cursor([1])))
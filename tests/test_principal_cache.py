@@ -0,0 +1,58 @@
+from db import crud
+from db.cache import invalidation_channel, principal_cache, principal_invalidation, role_cache
+from db.models.base_models import UserDelete, UserUpdate
+from tests.conftest import execute
+
+PHONE = "8 (900) 000-00-02"
+OTHER_PHONE = "8 (900) 000-00-03"
+
+
+def fill():
+    principal_cache.clear()
+    principal_cache.set(PHONE, (1, PHONE, None))
+    principal_cache.set(OTHER_PHONE, (2, OTHER_PHONE, None))
+
+
+def test_another_workers_user_write_drops_only_that_principal():
+    fill()
+    invalidation_channel._on_notify(None, 1, invalidation_channel.channel,
+                                    f"other-worker {principal_invalidation(PHONE)}")
+    assert principal_cache.get(PHONE) is None
+    assert principal_cache.get(OTHER_PHONE) is not None
+
+
+def test_role_write_drops_every_principal():
+    fill()
+    invalidation_channel._on_notify(None, 1, invalidation_channel.channel, f"other-worker {role_cache.name}")
+    assert len(principal_cache) == 0
+
+
+def test_own_notifications_are_not_dispatched_twice():
+    fill()
+    invalidation_channel._on_notify(None, 1, invalidation_channel.channel,
+                                    f"{invalidation_channel.origin} {principal_invalidation(PHONE)}")
+    assert principal_cache.get(PHONE) is not None
+
+
+def test_update_and_delete_publish_the_phones(db, monkeypatch):
+    published = []
+
+    async def publish(*names):
+        published.extend(names)
+
+    monkeypatch.setattr(invalidation_channel, "publish", publish)
+
+    async def scenario(session):
+        await execute(session, "INSERT INTO \"user\" (phone_number, password) VALUES (:phone, 'x')", phone=PHONE)
+        fill()
+        assert await crud.update_user(session, [UserUpdate(phone_number=PHONE, phone_number_old=PHONE,
+                                                           phone_number_new=OTHER_PHONE)])
+        assert principal_cache.get(PHONE) is None and principal_cache.get(OTHER_PHONE) is None
+        assert published == [principal_invalidation(PHONE), principal_invalidation(OTHER_PHONE)]
+        published.clear()
+        fill()
+        result = await crud.delete_user(session, [UserDelete(phone=OTHER_PHONE)])
+        assert result and principal_cache.get(OTHER_PHONE) is None and principal_cache.get(PHONE) is not None
+        assert published == [principal_invalidation(OTHER_PHONE)]
+
+    db(scenario)
@@ -0,0 +1,139 @@
+import asyncio
+
+from db import cache
+from db.cache import InvalidationChannel, ReferenceCache
+from db.models.sql_models import Status
+
+
+class FakeSession:
+    """
+    Stands in for async_session(): every execute() returns the current rows, after before_select() when set.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.selects = 0
+        self.before_select = None
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def execute(self, sql):
+        self.selects += 1
+        if self.before_select is not None:
+            await self.before_select()
+        return self
+
+    def all(self):
+        return [Row(row) for row in self.rows]
+
+
+class Row:
+    def __init__(self, mapping):
+        self._mapping = mapping
+
+
+def status_cache(monkeypatch, rows, ttl=60):
+    session = FakeSession(rows)
+    monkeypatch.setattr(cache, "async_session", session)
+    return ReferenceCache(Status, "status_name", ttl=ttl), session
+
+
+def test_lookup_reads_once_until_invalidated(monkeypatch):
+    statuses, session = status_cache(monkeypatch, [{"id": 1, "status_name": "new"}, {"id": 2, "status_name": "done"}])
+
+    async def scenario():
+        assert [row.id for row in await statuses.lookup(name="done")] == [2]
+        assert [row.status_name for row in await statuses.lookup(row_id=1)] == ["new"]
+        assert [row.id for row in await statuses.lookup()] == [1, 2]
+        assert await statuses.lookup(name="missing") == []
+        assert session.selects == 1
+        session.rows = [{"id": 1, "status_name": "new"}]
+        statuses.invalidate()
+        assert await statuses.lookup(name="done") == []
+        assert session.selects == 2
+
+    asyncio.run(scenario())
+    assert statuses.stats() == {"size": 1, "hits": 3, "loads": 2}
+
+
+def test_reloads_after_ttl(monkeypatch):
+    statuses, session = status_cache(monkeypatch, [{"id": 1, "status_name": "new"}])
+
+    async def scenario():
+        await statuses.lookup()
+        statuses.loaded_at -= 61
+        await statuses.lookup()
+
+    asyncio.run(scenario())
+    assert session.selects == 2
+
+
+def test_invalidation_during_a_reload_leaves_the_cache_stale(monkeypatch):
+    statuses, session = status_cache(monkeypatch, [{"id": 1, "status_name": "new"}])
+
+    async def invalidate_midway():
+        # the row is renamed and invalidated after the select started, it read the old name
+        session.before_select = None
+        statuses.invalidate()
+
+    async def scenario():
+        session.before_select = invalidate_midway
+        assert [row.status_name for row in await statuses.lookup(row_id=1)] == ["new"]
+        assert statuses.is_stale()
+        session.rows = [{"id": 1, "status_name": "pending"}]
+        assert [row.status_name for row in await statuses.lookup(row_id=1)] == ["pending"]
+        assert not statuses.is_stale()
+
+    asyncio.run(scenario())
+    assert session.selects == 2
+
+
+def test_concurrent_lookups_share_one_reload(monkeypatch):
+    statuses, session = status_cache(monkeypatch, [{"id": 1, "status_name": "new"}])
+
+    async def scenario():
+        await asyncio.gather(*[statuses.lookup(name="new") for _ in range(10)])
+
+    asyncio.run(scenario())
+    assert session.selects == 1
+
+
+def test_channel_dispatch():
+    channel = InvalidationChannel("test", enabled=False)
+    calls = []
+    channel.subscribe("status", lambda: calls.append("status"))
+    channel.subscribe("status", lambda: calls.append("status again"))
+    channel.subscribe("role", lambda: calls.append("role"))
+    channel.subscribe_keys("user", lambda key: calls.append(("user", key)))
+
+    asyncio.run(channel.invalidate("status", "user:8 (900) 000-00-01", "unknown"))
+    assert calls == ["status", "status again", ("user", "8 (900) 000-00-01")]
+    calls.clear()
+    channel._on_notify(None, 1, "test", "other-worker role")
+    channel._on_notify(None, 1, "test", f"{channel.origin} status")
+    assert calls == ["role"]
+
+
+def test_lost_listen_connection_drops_every_table():
+    channel = InvalidationChannel("test", enabled=False)
+    calls = []
+    channel.subscribe("status", lambda: calls.append("status"))
+    channel.subscribe("role", lambda: calls.append("role"))
+    connection = object()
+    channel._on_terminate(object())
+    assert calls == []
+    channel._conn = connection
+    channel._on_terminate(connection)
+    assert sorted(calls) == ["role", "status"] and channel._conn is None
+
+
+def test_reference_caches_are_subscribed():
+    for reference_cache in cache.reference_caches:
+        assert reference_cache.invalidate in cache.invalidation_channel.subscribers[reference_cache.name]
@@ -0,0 +1,187 @@
+import asyncio
+import random
+from itertools import islice
+
+import pytest
+from pydantic import ValidationError
+
+from db import spatial
+from db.cache import InvalidationChannel
+from db.models.base_models import MapPointGet, PointThrashGet
+from db.spatial import SpatialIndex, haversine, point_invalidation
+
+CENTRE = (55.7558, 37.6173)
+THRASH_TYPES = ["glass", "paper", "metal"]
+
+
+def make_points(count: int, seed: int = 1, spread: float = 0.3):
+    rng = random.Random(seed)
+    return [(point_id, CENTRE[0] + rng.uniform(-spread, spread), CENTRE[1] + rng.uniform(-spread, spread),
+             rng.choice([1, 2]), set(rng.sample(THRASH_TYPES, rng.randint(1, 2))))
+            for point_id in range(1, count + 1)]
+
+
+def make_index(points, **kwargs) -> SpatialIndex:
+    index = SpatialIndex(**kwargs)
+    for point_id, lat, lon, map_id, thrash_types in points:
+        index.insert(point_id, [lat, lon], map_id, thrash_types)
+    return index
+
+
+def nearest(index: SpatialIndex, lat: float, lon: float, k: int, *args, **kwargs):
+    return list(islice(index.walk(lat, lon, *args, **kwargs), k))
+
+
+def brute_force(points, lat, lon, thrash_type=None, map_id=None, radius=float("inf")):
+    found = [(point_id, haversine(lat, lon, p_lat, p_lon)) for point_id, p_lat, p_lon, p_map, p_types in points
+             if (thrash_type is None or thrash_type in p_types) and (map_id is None or p_map == map_id)]
+    return sorted([item for item in found if item[1] <= radius], key=lambda item: item[1])
+
+
+@pytest.mark.parametrize("radius", [100, 1500, 8000, 30000])
+def test_radius_matches_brute_force(radius):
+    points = make_points(2000)
+    index = make_index(points)
+    for lat, lon in [CENTRE, (55.9, 37.4), (55.5, 37.9)]:
+        assert [point_id for point_id, _ in index.walk(lat, lon, radius=radius)] == \
+            [point_id for point_id, _ in brute_force(points, lat, lon, radius=radius)]
+
+
+@pytest.mark.parametrize("k", [1, 5, 37, 500])
+def test_nearest_matches_brute_force(k):
+    points = make_points(2000, seed=2)
+    index = make_index(points)
+    for lat, lon in [CENTRE, (55.95, 37.3), (56.2, 38.2)]:
+        found = nearest(index, lat, lon, k)
+        expected = brute_force(points, lat, lon, radius=index.max_radius)[:k]
+        assert [point_id for point_id, _ in found] == [point_id for point_id, _ in expected]
+        assert [distance for _, distance in found] == pytest.approx([distance for _, distance in expected])
+
+
+def test_filters_by_thrash_type_and_map():
+    points = make_points(1000, seed=3)
+    index = make_index(points)
+    for thrash_type, map_id in [("glass", None), (None, 2), ("metal", 1)]:
+        assert nearest(index, *CENTRE, 20, thrash_type, map_id) == \
+            pytest.approx(brute_force(points, *CENTRE, thrash_type, map_id)[:20])
+        assert list(index.walk(*CENTRE, thrash_type, map_id, 5000)) == \
+            pytest.approx(brute_force(points, *CENTRE, thrash_type, map_id, 5000))
+
+
+def test_walk_is_lazy_and_ordered():
+    points = make_points(3000, seed=4)
+    index = make_index(points)
+    walk = index.walk(*CENTRE)
+    first = [next(walk) for _ in range(10)]
+    assert first == pytest.approx(brute_force(points, *CENTRE)[:10])
+    distances = [distance for _, distance in index.walk(*CENTRE, radius=20000)]
+    assert distances == sorted(distances)
+    assert len(distances) == len(brute_force(points, *CENTRE, radius=20000))
+
+
+def test_radius_is_clamped_to_max_radius():
+    points = make_points(500, seed=5, spread=2)
+    index = make_index(points, max_radius=10000)
+    expected = [point_id for point_id, _ in brute_force(points, *CENTRE, radius=10000)]
+    assert [point_id for point_id, _ in index.walk(*CENTRE, radius=1e9)] == expected
+    assert [point_id for point_id, _ in index.walk(*CENTRE)] == expected
+
+
+def test_update_and_remove():
+    index = SpatialIndex()
+    index.insert(1, [55.0, 37.0], 1, {"glass"})
+    index.insert(2, [55.001, 37.0], 1, {"paper"})
+    index.update(1, coordinates=[55.1, 37.0])
+    assert [point_id for point_id, _ in nearest(index, 55.0, 37.0, 1)] == [2]
+    assert index.points[1].map_id == 1 and index.points[1].thrash_types == {"glass"}
+    index.remove(2)
+    assert [point_id for point_id, _ in nearest(index, 55.0, 37.0, 5)] == [1]
+    assert nearest(index, 55.0, 37.0, 5, radius=1000) == []
+    assert list(SpatialIndex().walk(55.0, 37.0)) == []
+
+
+class FakeSession:
+    """
+    Stands in for async_session(): exec() returns rows, after waiting for release when one is given.
+    """
+
+    def __init__(self, rows, release: asyncio.Event = None):
+        self.rows = rows
+        self.release = release
+        self.statements = []
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def exec(self, sql):
+        self.statements.append(sql)
+        if self.release is not None:
+            await self.release.wait()
+        return self
+
+    def all(self):
+        return self.rows
+
+
+def test_changes_during_a_reload_are_replayed(monkeypatch):
+    index = SpatialIndex()
+    index.insert(1, [55.0, 37.0], 1, {"glass"})
+
+    async def scenario():
+        release = asyncio.Event()
+        # the reload reads points 1 and 2 before point 3 is created and point 2 deleted
+        monkeypatch.setattr(spatial, "async_session", FakeSession(
+            [(1, [55.0, 37.0], 1, "glass"), (1, [55.0, 37.0], 1, "paper"), (2, [55.01, 37.0], 1, None)], release))
+        reload = asyncio.create_task(index.ensure_loaded())
+        await asyncio.sleep(0)
+        index.insert(3, [55.02, 37.0], 2, {"metal"})
+        index.remove(2)
+        release.set()
+        await reload
+
+    asyncio.run(scenario())
+    assert sorted(index.points) == [1, 3]
+    assert index.points[1].thrash_types == {"glass", "paper"}
+    assert not index.is_stale()
+    index.insert(4, [55.03, 37.0])
+    assert index._pending is None
+
+
+def test_other_workers_reload_only_the_written_point(monkeypatch):
+    index = SpatialIndex()
+    index.insert(1, [55.0, 37.0], 1, {"glass"})
+    index.insert(2, [55.01, 37.0], 1, {"glass"})
+    index.loaded_at = 0
+    index.ttl = float("inf")
+    channel = InvalidationChannel("test", enabled=False)
+    channel.subscribe_keys("mappoint", index.refresh)
+
+    async def notify(session, payload):
+        monkeypatch.setattr(spatial, "async_session", session)
+        channel._on_notify(None, 1, "test", payload)
+        await asyncio.gather(*index._tasks)
+
+    moved = FakeSession([(1, [55.5, 37.0], 2, "paper")])
+    asyncio.run(notify(moved, f"other-worker {point_invalidation(1)}"))
+    assert (index.points[1].lat, index.points[1].map_id, index.points[1].thrash_types) == (55.5, 2, {"paper"})
+    assert len(moved.statements) == 1
+    asyncio.run(notify(FakeSession([]), f"other-worker {point_invalidation(2)}"))
+    assert sorted(index.points) == [1]
+    own = FakeSession([])
+    asyncio.run(notify(own, f"{channel.origin} {point_invalidation(1)}"))
+    assert own.statements == [] and sorted(index.points) == [1]
+
+
+@pytest.mark.parametrize("model", [MapPointGet, PointThrashGet])
+def test_radius_filter_is_validated(model):
+    assert model(coordinates_filter=CENTRE, radius_filter=500).radius_filter == 500
+    assert model(coordinates_filter=CENTRE).radius_filter is None
+    for radius in [0, -1, spatial.SPATIAL_MAX_RADIUS + 1]:
+        with pytest.raises(ValidationError, match="radius_filter"):
+            model(coordinates_filter=CENTRE, radius_filter=radius)